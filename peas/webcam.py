@@ -7,6 +7,7 @@ import sys
 from glob import glob
 
 from pocs.utils import current_time
+from pocs.utils import timelapse
 from pocs.utils.logger import get_root_logger
 
 from pocs.utils.config import load_config
@@ -119,11 +120,15 @@ class Webcam(object):
             if today_path != self._today_dir:
                 # If yesterday is not None, archive it
                 if self._today_dir is not None:
-                    self.logger.debug("Making timelapse for webcam")
-                    self.create_timelapse(
-                        self._today_dir, out_file="{}/{}_{}.mp4".format(
-                            self.webcam_dir, today_dir, self.port_name),
-                        remove_after=True)
+                    self.logger.debug("Finishing timelapse for webcam")
+                    video_file = timelapse.close_writer(self._today_dir)
+
+                    # The frames weren't encoded as they were taken, e.g. after a restart
+                    if video_file is None:
+                        self.create_timelapse(
+                            self._today_dir, out_file="{}/{}_{}.mp4".format(
+                                self.webcam_dir, today_dir, self.port_name),
+                            remove_after=True)
 
                 # If today doesn't exist, make it
                 if not os.path.exists(today_path):
@@ -178,18 +183,22 @@ class Webcam(object):
             else:
                 self.logger.debug("Image captured for {}".format(webcam.get('name')))
 
-                # Static files (always points to most recent)
+                # Static files (always the most recent)
                 static_out_file = '{}/{}.jpeg'.format(self.webcam_dir, camera_name)
                 static_tn_out_file = '{}/tn_{}.jpeg'.format(self.webcam_dir, camera_name)
 
-                # Symlink the latest image and thumbnail
+                # Copy the latest image and thumbnail, as the image is removed
+                # once it has been added to the timelapse
                 if os.path.lexists(static_out_file):
                     os.remove(static_out_file)
-                os.symlink(out_file, static_out_file)
+                shutil.copyfile(out_file, static_out_file)
 
                 if os.path.lexists(static_tn_out_file):
                     os.remove(static_tn_out_file)
-                os.symlink(out_file, static_tn_out_file)
+                shutil.copyfile(out_file, static_tn_out_file)
+
+                timelapse.get_writer(today_path, fn_out="{}/{}_{}.mp4".format(
+                    self.webcam_dir, today_dir, self.port_name), fps=12).add_frame(out_file)
 
                 return retcode
         except OSError as e:
@@ -18,6 +18,16 @@ class PanBase(object):
     """
 
     def __init__(self, *args, **kwargs):
+        # Share the config, logger and database of an existing object rather
+        # than setting them up again, for objects that are created in bulk
+        context = kwargs.get('context')
+        if context is not None:
+            self.__version__ = __version__
+            self.config = context.config
+            self.logger = context.logger
+            self.db = context.db
+            return
+
         # Load the default and local config files
         global _config
         if _config is None:
@@ -1,14 +1,16 @@
 from .. import PanBase
 
+from ..utils import current_time
 from ..utils import error
+from ..utils import fits_access
+from ..utils import images
 from ..utils import listify
 from ..utils import load_module
-from ..utils import images
+from ..utils import quality
+from ..utils import timelapse
 
 from ..focuser.focuser import AbstractFocuser
 
-from astropy.io import fits
-
 import re
 import shutil
 import subprocess
@@ -44,6 +46,7 @@ class AbstractCamera(PanBase):
         self._serial_number = 'XXXXXX'
         self._readout_time = kwargs.get('readout_time', 5.0)
         self._file_extension = kwargs.get('file_extension', 'fits')
+        self.pixel_scale = kwargs.get('pixel_scale', None)
         self.filter_type = 'RGGB'
 
         self.properties = None
@@ -227,12 +230,110 @@ class AbstractCamera(PanBase):
         returns a thumbnail from the centre of the iamge.
         """
         self.take_exposure(seconds, filename=file_path, blocking=True)
-        image = fits.getdata(file_path)
+        thumbnail = fits_access.read_crop(file_path, box_width=thumbnail_size)
         if not keep_files:
             os.unlink(file_path)
-        thumbnail = images.crop_data(image, box_width=thumbnail_size)
         return thumbnail
 
+    def take_calibration(self, frame_type='dark', num_frames=10, seconds=0., directory=None,
+                         keep_frames=False, **kwargs):
+        """
+        Takes calibration frames and combines them into a master frame with
+        `pocs.utils.images.make_master_frame`.
+
+        Bias and dark frames are taken with the shutter closed (`dark=True` in
+        `take_exposure`), flat frames with it open, so the camera must support
+        `dark` and `blocking` exposures. The `calibration` section of
+        the config sets the `max_memory` (MB) and `max_workers` used to combine
+        the frames.
+
+        Args:
+            frame_type (str, optional): 'bias', 'dark' (default) or 'flat'
+            num_frames (int, optional): Number of frames to take, default 10
+            seconds (optional): Exposure time, ignored for bias frames
+            directory (str, optional): Directory for the frames and the master,
+                default `<images>/calibration/<camera uid>/<frame_type>/<time>`
+            keep_frames (bool, optional): Keep the frames once combined, default False
+            **kwargs: Options passed to `make_master_frame`, e.g. `bias` or `dark`
+
+        Returns:
+            str: Name of the master frame
+        """
+        assert frame_type in images.CALIBRATION_TYPES, \
+            self.logger.error("frame_type must be one of {}".format(images.CALIBRATION_TYPES))
+
+        if frame_type == 'bias':
+            seconds = 0.
+
+        if directory is None:
+            directory = os.path.join(self._image_dir, 'calibration', self.uid, frame_type,
+                                     current_time(flatten=True))
+        os.makedirs(directory, exist_ok=True)
+
+        fnames = list()
+        for i in range(num_frames):
+            fname = os.path.join(directory, '{}_{:03d}.fits'.format(frame_type, i))
+            self.logger.debug("Taking {} frame {}/{}".format(frame_type, i + 1, num_frames))
+            self.take_exposure(seconds=seconds, filename=fname, dark=(frame_type != 'flat'),
+                               blocking=True)
+            fnames.append(fname)
+
+        calibration_config = self.config.get('calibration', {})
+        kwargs.setdefault('max_memory', calibration_config.get('max_memory', 512))
+        kwargs.setdefault('max_workers', calibration_config.get('max_workers', 2))
+
+        master_file = images.make_master_frame(
+            fnames, os.path.join(directory, 'master_{}.fits'.format(frame_type)),
+            frame_type=frame_type, **kwargs)
+        self.logger.debug("Master {} from {} frames: {}".format(
+            frame_type, num_frames, master_file))
+
+        if not keep_frames:
+            for fname in fnames:
+                os.unlink(fname)
+
+        return master_file
+
+    def _add_timelapse_frame(self, jpg_fname):
+        """ Add a pretty image to the timelapse of its directory, see `pocs.utils.timelapse` """
+        if not self.config.get('timelapse', {}).get('incremental', True):
+            return
+
+        try:
+            timelapse.get_writer(os.path.dirname(jpg_fname)).add_frame(jpg_fname)
+        except Exception as e:
+            self.logger.warning("Can't add {} to timelapse: {}".format(jpg_fname, e))
+
+    def _measure_quality(self, image_id, fits_path):
+        """ Measure the quality of an image in the background, see `pocs.utils.quality`
+
+        The metrics are added as `quality` to the documents of the image in the
+        `observations` collection once they are measured.
+
+        Returns:
+            concurrent.futures.Future: Future for the metrics, or None if the
+                quality isn't measured
+        """
+        quality_config = self.config.get('quality', {})
+        if not quality_config.get('enabled', True):
+            return None
+
+        def save_metrics(metrics):
+            self.db.observations.update_many({'data.image_id': image_id},
+                                             {'$set': {'quality': metrics}})
+            self.logger.debug("Quality of {}: {} stars, FWHM {}".format(
+                image_id, metrics['num_stars'], metrics['fwhm']))
+            return metrics
+
+        try:
+            service = quality.get_service(max_workers=quality_config.get('max_workers', 2),
+                                          logger=self.logger)
+            return service.submit(fits_path, callback=save_metrics,
+                                  box_width=quality_config.get('box_width', 1000),
+                                  bin_factor=quality_config.get('bin_factor', 2))
+        except Exception as e:
+            self.logger.warning("Can't measure quality of {}: {}".format(fits_path, e))
+
     def __str__(self):
         try:
             return "{} ({}) on {} with {}".format(
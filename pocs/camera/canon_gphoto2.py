@@ -5,6 +5,7 @@ from astropy import units as u
 from threading import Event
 from threading import Timer
 
+from ..utils import compression
 from ..utils import current_time
 from ..utils import error
 from ..utils import images
@@ -192,6 +193,18 @@ class Camera(AbstractGPhotoCamera):
         else:
             return proc
 
+    def take_calibration(self, frame_type='dark', *args, **kwargs):
+        """Calibration frames are not supported
+
+        The DSLRs have no shutter that `take_exposure` can keep closed and their
+        exposures are CR2 files converted once the exposure is over, so
+        `Camera.take_calibration` can't take bias or dark frames with them.
+
+        Raises:
+            NotImplementedError: Always
+        """
+        raise NotImplementedError("{} can't take {} frames".format(self.name, frame_type))
+
     def process_exposure(self, info, signal_event, exposure_process=None):
         """Processes the exposure
 
@@ -214,7 +227,9 @@ class Camera(AbstractGPhotoCamera):
 
         try:
             self.logger.debug("Extracting pretty image")
-            images.make_pretty_image(file_path, title=image_id, primary=info['is_primary'])
+            pretty_image = images.make_pretty_image(file_path, title=image_id,
+                                                    primary=info['is_primary'])
+            self._add_timelapse_frame(pretty_image)
         except Exception as e:
             self.logger.warning('Problem with extracting pretty image: {}'.format(e))
 
@@ -229,7 +244,7 @@ class Camera(AbstractGPhotoCamera):
             self.db.insert_current('observations', info, include_collection=False)
         else:
             self.logger.debug('Compressing {}'.format(file_path))
-            images.fpack(fits_path)
+            fits_path = compression.compress(fits_path)
 
         self.logger.debug("Adding image metadata to db: {}".format(image_id))
         self.db.observations.insert_one({
@@ -239,5 +254,7 @@ class Camera(AbstractGPhotoCamera):
             'sequence_id': seq_id,
         })
 
+        self._measure_quality(image_id, fits_path)
+
         # Mark the event as done
         signal_event.set()
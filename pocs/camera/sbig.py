@@ -4,6 +4,7 @@ from threading import Thread
 from astropy import units as u
 from astropy.io import fits
 
+from ..utils import compression
 from ..utils import current_time
 from ..utils import images
 from .camera import AbstractCamera
@@ -291,13 +292,15 @@ class Camera(AbstractCamera):
 
         if info['is_primary']:
             self.logger.debug("Extracting pretty image")
-            images.make_pretty_image(file_path, title=info['field_name'], primary=True)
+            pretty_image = images.make_pretty_image(file_path, title=info['field_name'],
+                                                    primary=True)
+            self._add_timelapse_frame(pretty_image)
 
             self.logger.debug("Adding current observation to db: {}".format(image_id))
             self.db.insert_current('observations', info, include_collection=False)
         else:
             self.logger.debug('Compressing {}'.format(file_path))
-            images.fpack(file_path)
+            file_path = compression.compress(file_path)
 
         self.logger.debug("Adding image metadata to db: {}".format(image_id))
         self.db.observations.insert_one({
@@ -307,5 +310,7 @@ class Camera(AbstractCamera):
             'image_id': image_id,
         })
 
+        self._measure_quality(image_id, file_path)
+
         # Mark the event as done
         signal_event.set()
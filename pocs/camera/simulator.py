@@ -2,15 +2,14 @@ import os
 import random
 
 from threading import Event
-from threading import Timer
 
 import numpy as np
 
 from astropy import units as u
 from astropy.io import fits
-from astropy.time import Time
 
 from ..utils import current_time
+from ..utils.clock import Timer
 
 from .camera import AbstractCamera
 
@@ -105,7 +104,7 @@ class Camera(AbstractCamera):
 
         # Set up a Timer that will wait for the duration of the exposure then copy a dummy FITS file
         # to the specified path and adjust the headers according to the exposure time, type.
-        start_time = Time.now()
+        start_time = current_time()
         exposure_event = Event()
         exposure_thread = Timer(interval=seconds,
                                 function=self._fake_exposure,
@@ -134,6 +133,8 @@ class Camera(AbstractCamera):
         self.logger.debug("Adding image metadata to db: {}".format(image_id))
         self.db.insert_current('observations', info)
 
+        self._measure_quality(image_id, file_path)
+
         # Mark the event as done
         signal_event.set()
 
@@ -1,7 +1,6 @@
 import os
 import sys
 import queue
-import time
 import warnings
 import multiprocessing
 import zmq
@@ -11,6 +10,7 @@ from astropy import units as u
 from pocs import PanBase
 from pocs.observatory import Observatory
 from pocs.state.machine import PanStateMachine
+from pocs.utils import clock
 from pocs.utils import current_time
 from pocs.utils import get_free_space
 from pocs.utils.messaging import PanMessaging
@@ -401,12 +401,12 @@ class POCS(PanStateMachine, PanBase):
         # If delay is greater than 10 seconds check for messages during wait
         if delay >= 10.0:
             while delay >= 10.0:
-                time.sleep(10.0)
+                clock.sleep(10.0)
                 delay -= 10.0
                 self.check_messages()
 
         if delay > 0.0:
-            time.sleep(delay)
+            clock.sleep(delay)
 
     def wait_until_safe(self):
         """ Waits until weather is safe
@@ -532,7 +532,7 @@ class POCS(PanStateMachine, PanBase):
                         if msg_type == 'POCS-CMD':
                             cmd_queue.put(msg_obj)
 
-                    time.sleep(1)
+                    clock.sleep(1)
             except KeyboardInterrupt:
                 pass
 
@@ -10,9 +10,13 @@ from astropy.time import Time
 from collections import namedtuple
 
 from . import PanBase
+from .utils import error
+from .utils import fits_access
 from .utils import images as img_utils
+from .utils import solve_cache
 
 OffsetError = namedtuple('OffsetError', ['delta_ra', 'delta_dec', 'magnitude'])
+RegistrationInfo = namedtuple('RegistrationInfo', ['dx', 'dy', 'confidence'])
 
 
 class Image(PanBase):
@@ -43,8 +47,7 @@ class Image(PanBase):
         else:
             self.wcs_file = fits_file
 
-        with fits.open(self.fits_file, 'readonly') as hdu:
-            self.header = hdu[0].header
+        self.header = fits_access.read_header(self.fits_file)
 
         assert 'DATE-OBS' in self.header, self.logger.warning(
             'FITS file must contain the DATE-OBS keyword')
@@ -83,6 +86,7 @@ class Image(PanBase):
         self._luminance = None
         self._pointing = None
         self._pointing_error = None
+        self._registration_fft = None
 
     @property
     def wcs_file(self):
@@ -164,36 +168,122 @@ class Image(PanBase):
             ra = self.wcs.celestial.wcs.crval[0]
             dec = self.wcs.celestial.wcs.crval[1]
 
-            self.pointing = SkyCoord(ra=ra * u.degree, dec=dec * u.degree)
+            self._set_pointing(SkyCoord(ra=ra * u.degree, dec=dec * u.degree))
 
-            self.ra = self.pointing.ra.to(u.hourangle)
-            self.dec = self.pointing.dec.to(u.degree)
-
-            # Precess to the current equinox otherwise the RA - LST method will be off.
-            self.ha = self.pointing.transform_to(self.FK5_Jnow).ra.to(u.hourangle) - self.sidereal
-
-    def solve_field(self, **kwargs):
+    def solve_field(self, ref_image=None, pixel_scale=None, **kwargs):
         """ Solve field and populate WCS information
 
+        The solve is much faster when the scale and the solution are known, so
+        the WCS of a solved image of the same sequence (`ref_image`) and the
+        pixel scale of the camera are used as hints for the solver, see
+        `~pocs.utils.images.get_solve_hints`. Unless a `cache` is given (None
+        for none) or the `solver` config has `cache: False`, the solution is
+        looked up in and stored to the solve cache of the data directory.
+
         Args:
+            ref_image (`Image`, optional): A solved image of the same sequence
+            pixel_scale (float, optional): Pixel scale of the camera in arcsec/pixel
             **kwargs (dict): Options to be passed to `get_solve_field`
         """
+        if 'cache' not in kwargs and self.config.get('solver', {}).get('cache', True):
+            kwargs['cache'] = solve_cache.get_cache(
+                os.path.join(self.config['directories']['data'], 'solve_cache.sqlite'))
+
         solve_info = img_utils.get_solve_field(self.fits_file,
-                                               ra=self.header_pointing.ra.value,
-                                               dec=self.header_pointing.dec.value,
-                                               **kwargs)
+                                               **self._get_solve_options(ref_image, pixel_scale,
+                                                                         kwargs))
 
-        self.wcs_file = solve_info['solved_fits_file']
-        self.get_wcs_pointing()
+        return self._apply_solve(solve_info)
 
-        # Remove some fields
-        for header in ['COMMENT', 'HISTORY']:
-            try:
-                del solve_info[header]
-            except KeyError:
-                pass
+    def submit_solve(self, solver, priority=None, ref_image=None, pixel_scale=None, **kwargs):
+        """ Submit the image to a `~pocs.utils.solver.SolveService`
 
-        return solve_info
+        The WCS information is populated once the solve has finished, as with
+        `solve_field`.
+
+        Args:
+            solver (`~pocs.utils.solver.SolveService`): The service to solve with
+            priority (int, optional): Priority of the job, defaults to that of
+                `SolveService.submit`
+            ref_image (`Image`, optional): A solved image of the same sequence,
+                see `solve_field`
+            pixel_scale (float, optional): Pixel scale of the camera in arcsec/pixel
+            **kwargs (dict): Options to be passed to `get_solve_field`
+
+        Returns:
+            concurrent.futures.Future: Future for the solve information
+        """
+        if priority is not None:
+            kwargs['priority'] = priority
+
+        return solver.submit(self.fits_file,
+                             callback=self._apply_solve,
+                             **self._get_solve_options(ref_image, pixel_scale, kwargs))
+
+    def register(self, ref_image, min_confidence=10., bin_factor=2):
+        """ Get the pointing by registering the image against a solved reference
+
+        The shift between the image and `ref_image` is measured by phase
+        correlation (see `~pocs.utils.images.register_images`) and the pointing
+        is taken from the WCS of `ref_image` at the shifted centre of the image.
+        This takes a fraction of the time of a solve, so it is enough for the
+        offsets between the frames of an observation, which can then be
+        measured with `compute_offset` as usual.
+
+        Args:
+            ref_image (`Image`): The reference image, which must have a WCS
+            min_confidence (float, optional): Minimum confidence of the
+                registration, defaults to 10
+            bin_factor (int, optional): Binning of the images, defaults to 2
+
+        Returns:
+            RegistrationInfo: The shift (in pixels) and the confidence
+
+        Raises:
+            error.SolveError: If the reference has no WCS or the registration
+                failed, in which case the image should be solved instead
+        """
+        assert isinstance(ref_image, Image), self.logger.warning(
+            "Must pass an Image class for reference")
+
+        if ref_image.wcs is None:
+            raise error.SolveError("Reference image has no WCS: {}".format(ref_image))
+
+        try:
+            dx, dy, confidence = img_utils.register_images(
+                fits.getdata(self.fits_file), None, bin_factor=bin_factor,
+                ref_fft=ref_image._get_registration_fft(bin_factor))
+        except ValueError as e:
+            raise error.SolveError("Can't register {}: {}".format(self, e))
+
+        if confidence < min_confidence:
+            raise error.SolveError("Registration of {} too uncertain: {:.1f} < {:.1f}".format(
+                self, confidence, min_confidence))
+
+        # The centre of the image was at the centre of the reference minus the shift
+        ref_wcs = ref_image.wcs.celestial
+        crpix_x, crpix_y = ref_wcs.wcs.crpix
+        ra, dec = ref_wcs.all_pix2world([[crpix_x - dx, crpix_y - dy]], 1)[0]
+
+        self._set_pointing(SkyCoord(ra=ra * u.degree, dec=dec * u.degree))
+
+        registration_info = RegistrationInfo(dx, dy, confidence)
+        self.logger.debug("Registered {}: {}".format(self, registration_info))
+
+        return registration_info
+
+    def crop(self, box_width=200, center=None):
+        """ A box of the image, reading only its pixels from the file
+
+        Args:
+            box_width (int, optional): Size of box width in pixels, defaults to 200
+            center (tuple(int), optional): Crop around set of coords, defaults to
+                image center.
+
+        Returns:
+            numpy.array: The cropped data
+        """
+        return fits_access.read_crop(self.fits_file, box_width=box_width, center=center)
 
     def compute_offset(self, ref_image):
         assert isinstance(ref_image, Image), self.logger.warning(
@@ -210,5 +300,48 @@ class Image(PanBase):
 # Private Methods
 ##################################################################################################
 
+    def _set_pointing(self, pointing):
+        self.pointing = pointing
+
+        self.ra = self.pointing.ra.to(u.hourangle)
+        self.dec = self.pointing.dec.to(u.degree)
+
+        # Precess to the current equinox otherwise the RA - LST method will be off.
+        self.ha = self.pointing.transform_to(self.FK5_Jnow).ra.to(u.hourangle) - self.sidereal
+
+    def _get_registration_fft(self, bin_factor):
+        """ FFT of the data for registration, kept for the images registered against this one """
+        if self._registration_fft is None or self._registration_fft[0] != bin_factor:
+            self._registration_fft = (bin_factor, img_utils.get_registration_fft(
+                fits.getdata(self.fits_file), bin_factor=bin_factor))
+
+        return self._registration_fft[1]
+
+    def _get_solve_options(self, ref_image, pixel_scale, kwargs):
+        """ Options for the solver, with the hints of `ref_image` and `pixel_scale` """
+        header = None
+        if ref_image is not None and ref_image.wcs is not None:
+            header = fits_access.read_header(ref_image.wcs_file)
+
+        options = img_utils.get_solve_hints(header=header, pixel_scale=pixel_scale)
+        options.update(ra=self.header_pointing.ra.value, dec=self.header_pointing.dec.value)
+        options.update(kwargs)
+
+        return options
+
+    def _apply_solve(self, solve_info):
+        """ Populate the WCS information from the result of a solve """
+        self.wcs_file = solve_info['solved_fits_file']
+        self.get_wcs_pointing()
+
+        # Remove some fields
+        for header in ['COMMENT', 'HISTORY']:
+            try:
+                del solve_info[header]
+            except KeyError:
+                pass
+
+        return solve_info
+
     def __str__(self):
         return "{}: {}".format(self.fits_file, self.header_pointing)
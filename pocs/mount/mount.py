@@ -1,11 +1,10 @@
-import time
-
 from astropy import units as u
 from astropy.coordinates import EarthLocation
 from astropy.coordinates import SkyCoord
 
 from pocs import PanBase
 
+from ..utils import clock
 from ..utils import current_time
 from ..utils import error
 
@@ -352,7 +351,7 @@ class AbstractMount(PanBase):
         if not self.is_parked:
             self.slew_to_home()
             while self.is_slewing:
-                time.sleep(5)
+                clock.sleep(5)
                 self.logger.debug("Slewing to home, sleeping for 5 seconds")
 
             # Reinitialize from home seems to always do the trick of getting us to
@@ -362,7 +361,7 @@ class AbstractMount(PanBase):
             self.park()
 
             while self.is_slewing and not self.is_parked:
-                time.sleep(5)
+                clock.sleep(5)
                 self.logger.debug("Slewing to park, sleeping for 5 seconds")
 
         self.logger.debug("Mount parked")
@@ -440,7 +439,7 @@ class AbstractMount(PanBase):
 
         while not self._at_mount_park:
             self.status()
-            time.sleep(2)
+            clock.sleep(2)
 
         self._is_parked = True
 
@@ -478,7 +477,7 @@ class AbstractMount(PanBase):
             self.logger.debug("Moving {} for {} seconds. ".format(direction, seconds))
             self.query(move_command)
 
-            time.sleep(seconds)
+            clock.sleep(seconds)
 
             self.logger.debug("{} seconds passed before stop".format((current_time() - now).sec))
             self.query('stop_moving')
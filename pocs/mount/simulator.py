@@ -1,5 +1,4 @@
-import time
-
+from ..utils import clock
 from ..utils import current_time
 from .mount import AbstractMount
 
@@ -89,7 +88,7 @@ class Mount(AbstractMount):
 
         """
         self.logger.debug("Mount simulator moving {} for {} seconds".format(direction, seconds))
-        time.sleep(seconds)
+        clock.sleep(seconds)
 
     def slew_to_target(self):
         success = False
@@ -104,7 +103,7 @@ class Mount(AbstractMount):
             self._is_tracking = False
             self._is_home = False
 
-            time.sleep(self._loop_delay)
+            clock.sleep(self._loop_delay)
 
             self.stop_slew()
             self._state = 'Tracking'
@@ -8,8 +8,6 @@ from glob import glob
 from astroplan import Observer
 from astropy import units as u
 from astropy.coordinates import EarthLocation
-from astropy.coordinates import get_moon
-from astropy.coordinates import get_sun
 
 from . import PanBase
 from .images import Image
@@ -17,9 +15,14 @@ from .scheduler.constraint import Duration
 from .scheduler.constraint import MoonAvoidance
 from .utils import current_time
 from .utils import error
-from .utils import images as img_utils
 from .utils import list_connected_cameras
+from .utils.almanac import Almanac
+from .utils.header_index import HeaderIndex
+from .utils.housekeeping import Housekeeper
 from .utils import load_module
+from .utils import solver
+from .utils import timelapse
+from .utils.solve_cache import SolveCache
 
 
 class Observatory(PanBase):
@@ -38,6 +41,7 @@ class Observatory(PanBase):
         self.location = None
         self.earth_location = None
         self.observer = None
+        self.almanac = None
         self._setup_location()
 
         self.logger.info('\tSetting up mount')
@@ -53,6 +57,21 @@ class Observatory(PanBase):
         self.scheduler = None
         self._create_scheduler()
 
+        solver_config = self.config.get('solver', {})
+        solve_cache = None
+        if solver_config.get('cache', True):
+            solve_cache = SolveCache(os.path.join(self.config['directories']['data'],
+                                                  'solve_cache.sqlite'),
+                                     max_entries=solver_config.get('cache_entries', 10000))
+        pixel_scales = {cam.uid: cam.pixel_scale for cam in self.cameras.values()
+                        if cam.pixel_scale is not None}
+        self.solver = solver.SolveService(max_workers=solver_config.get('max_workers', 2),
+                                          timeout=solver_config.get('timeout', 30),
+                                          cache=solve_cache,
+                                          hinted=solver_config.get('hinted', True),
+                                          pixel_scales=pixel_scales,
+                                          logger=self.logger)
+
         self.current_offset_info = None
 
         self._image_dir = self.config['directories']['images']
@@ -64,14 +83,12 @@ class Observatory(PanBase):
 
     @property
     def is_dark(self):
-        horizon = self.location.get('twilight_horizon', -18 * u.degree)
-
         t0 = current_time()
-        is_dark = self.observer.is_night(t0, horizon=horizon)
+        is_dark = self.almanac.is_night(t0)
 
         if not is_dark:
-            sun_pos = self.observer.altaz(t0, target=get_sun(t0)).alt
-            self.logger.debug("Sun {:.02f} > {}".format(sun_pos, horizon))
+            sun_pos = self.almanac.sun_alt(t0)
+            self.logger.debug("Sun {:.02f} > {}".format(sun_pos, self.almanac.twilight_horizon))
 
         return is_dark
 
@@ -105,6 +122,9 @@ class Observatory(PanBase):
         """Power down the observatory. Currently does nothing
         """
         self.logger.debug("Shutting down observatory")
+        self.solver.shutdown(wait=False)
+        if self.scheduler is not None:
+            self.scheduler.close()
         self.mount.disconnect()
 
     def status(self):
@@ -132,14 +152,8 @@ class Observatory(PanBase):
                 'siderealtime': str(self.sidereal_time),
                 'utctime': t,
                 'localtime': local_time,
-                'local_evening_astro_time': self.observer.twilight_evening_astronomical(t, which='next'),
-                'local_morning_astro_time': self.observer.twilight_morning_astronomical(t, which='next'),
-                'local_sun_set_time': self.observer.sun_set_time(t),
-                'local_sun_rise_time': self.observer.sun_rise_time(t),
-                'local_moon_alt': self.observer.moon_altaz(t).alt,
-                'local_moon_illumination': self.observer.moon_illumination(t),
-                'local_moon_phase': self.observer.moon_phase(t),
             }
+            status['observer'].update(self.almanac.status(t))
 
         except Exception as e:  # pragma: no cover
             self.logger.warning("Can't get observatory status: {}".format(e))
@@ -158,8 +172,25 @@ class Observatory(PanBase):
         """
 
         self.logger.debug("Getting observation for observatory")
+
+        previous_observation = self.current_observation
+        previous_seq_time = None
+        if previous_observation is not None:
+            previous_seq_time = previous_observation.seq_time
+
         self.scheduler.get_observation(*args, **kwargs)
 
+        # The sequence of the previous observation has ended, so finish its timelapses
+        current_seq_time = None
+        if self.current_observation is not None:
+            current_seq_time = self.current_observation.seq_time
+
+        if previous_seq_time is not None and current_seq_time != previous_seq_time:
+            for dir_name in self._get_observation_dirs(previous_observation, previous_seq_time):
+                video_file = timelapse.close_writer(dir_name)
+                if video_file is not None:
+                    self.logger.debug("Timelapse created: {}".format(video_file))
+
         if self.scheduler.current_observation is None:
             raise error.NoObservation("No valid observations found")
 
@@ -168,30 +199,41 @@ class Observatory(PanBase):
     def cleanup_observations(self):
         """Cleanup observation list
 
-        Loops through the `observed_list` performing cleanup tasks. Resets
-        `observed_list` when done
+        Runs the housekeeping of the directories of the `observed_list` (and of
+        any directories left unfinished by an earlier run) in parallel with a
+        `~pocs.utils.housekeeping.Housekeeper`, which adds the headers of their
+        files to the `~pocs.utils.header_index.HeaderIndex` of the data
+        directory. Resets `observed_list` when done
 
+        Returns:
+            dict: The housekeeping report
         """
+        dir_names = list()
         for seq_time, observation in self.scheduler.observed_list.items():
             self.logger.debug("Housekeeping for {}".format(observation))
+            dir_names.extend(self._get_observation_dirs(observation, seq_time))
+
+        housekeeping_config = self.config.get('housekeeping', {})
+        header_index = HeaderIndex(
+            os.path.join(self.config['directories']['data'], 'header_index.sqlite'),
+            root=os.path.join(self.config['directories']['images'], 'fields'))
+        housekeeper = Housekeeper(
+            os.path.join(self.config['directories']['data'], 'housekeeping.journal'),
+            max_workers=housekeeping_config.get('max_workers', 4),
+            compress_workers=housekeeping_config.get('compress_workers', 2),
+            header_index=header_index,
+            logger=self.logger)
 
-            for cam_name, camera in self.cameras.items():
-                self.logger.debug('Cleanup for camera {} [{}]'.format(
-                    cam_name, camera.uid))
-
-                dir_name = "{}/fields/{}/{}/{}/".format(
-                    self.config['directories']['images'],
-                    observation.field.field_name,
-                    camera.uid,
-                    seq_time,
-                )
-
-                img_utils.clean_observation_dir(dir_name)
-
-            self.logger.debug('Cleanup finished')
+        try:
+            report = housekeeper.run(dir_names)
+        finally:
+            header_index.close()
+        self.logger.debug('Cleanup finished')
 
         self.scheduler.reset_observed_list()
 
+        return report
+
     def observe(self):
         """Take individual images for the current observation
 
@@ -231,6 +273,13 @@ class Observatory(PanBase):
         Compares the most recent exposure to the reference exposure and determines
         the offset between the two.
 
+        Note:
+            If the exposure can't be registered against the pointing image it is
+            solved with the `solver`, waiting for the result, as the analyzing
+            state needs the offset before the tracking is updated. Only the
+            exposure of the primary camera is analyzed, so there are no other
+            solves to run meanwhile.
+
         Returns:
             dict: Offset information
         """
@@ -245,9 +294,23 @@ class Observatory(PanBase):
 
             current_image = Image(image_path, location=self.earth_location)
 
-            solve_info = current_image.solve_field()
+            # Register against the pointing image, which is much faster than
+            # solving, and only solve if that fails
+            solver_config = self.config.get('solver', {})
+            try:
+                if not solver_config.get('register', True):
+                    raise error.SolveError("Registration disabled")
+
+                current_image.register(pointing_image,
+                                       min_confidence=solver_config.get('min_confidence', 10.))
+            except error.SolveError as e:
+                self.logger.debug("Not registered, solving: {}".format(e))
 
-            self.logger.debug("Solve Info: {}".format(solve_info))
+                solve_info = current_image.submit_solve(
+                    self.solver, priority=solver.PRIORITY_ANALYSIS,
+                    ref_image=pointing_image).result()
+
+                self.logger.debug("Solve Info: {}".format(solve_info))
 
             # Get the offset between the two
             self.current_offset_info = current_image.compute_offset(
@@ -340,7 +403,7 @@ class Observatory(PanBase):
         self.logger.debug("Getting headers for : {}".format(observation))
 
         t0 = current_time()
-        moon = get_moon(t0, self.observer.location)
+        moon = self.almanac.moon(t0)
 
         headers = {
             'airmass': self.observer.altaz(t0, field).secz.value,
@@ -349,7 +412,7 @@ class Observatory(PanBase):
             'ha_mnt': self.observer.target_hour_angle(t0, field).value,
             'latitude': self.location.get('latitude').value,
             'longitude': self.location.get('longitude').value,
-            'moon_fraction': self.observer.moon_illumination(t0),
+            'moon_fraction': self.almanac.moon_illumination(t0),
             'moon_separation': field.coord.separation(moon).value,
             'observer': self.config.get('name', ''),
             'origin': 'Project PANOPTES',
@@ -417,6 +480,14 @@ class Observatory(PanBase):
 # Private Methods
 ##########################################################################
 
+    def _get_observation_dirs(self, observation, seq_time):
+        """ The image directory of each camera for a sequence of an observation """
+        return ["{}/fields/{}/{}/{}/".format(self.config['directories']['images'],
+                                             observation.field.field_name,
+                                             camera.uid,
+                                             seq_time)
+                for camera in self.cameras.values()]
+
     def _setup_location(self):
         """
         Sets up the site and location details for the observatory
@@ -430,6 +501,8 @@ class Observatory(PanBase):
                 * presseure
                 * elevation
                 * horizon
+                * twilight_horizon
+                * almanac_resolution (minutes, see `~pocs.utils.almanac.Almanac`)
 
         """
         self.logger.debug('Setting up site details of observatory')
@@ -450,6 +523,7 @@ class Observatory(PanBase):
             horizon = config_site.get('horizon', 30 * u.degree)
             twilight_horizon = config_site.get(
                 'twilight_horizon', -18 * u.degree)
+            almanac_resolution = config_site.get('almanac_resolution', 10) * u.minute
 
             self.location = {
                 'name': name,
@@ -469,6 +543,9 @@ class Observatory(PanBase):
                 lat=latitude, lon=longitude, height=elevation)
             self.observer = Observer(
                 location=self.earth_location, name=name, timezone=timezone)
+            self.almanac = Almanac(self.observer,
+                                   twilight_horizon=twilight_horizon,
+                                   resolution=almanac_resolution)
         except Exception:
             raise error.PanError(msg='Bad site information')
 
@@ -612,6 +689,7 @@ class Observatory(PanBase):
 
             camera_set_point = camera_config.get('set_point', None)
             camera_filter = camera_config.get('filter_type', None)
+            camera_pixel_scale = camera_config.get('pixel_scale', None)
 
             self.logger.debug('Creating camera: {}'.format(camera_model))
 
@@ -628,7 +706,8 @@ class Observatory(PanBase):
                                     set_point=camera_set_point,
                                     filter_type=camera_filter,
                                     focuser=camera_focuser,
-                                    readout_time=camera_readout)
+                                    readout_time=camera_readout,
+                                    pixel_scale=camera_pixel_scale)
 
                 is_primary = ''
                 if camera_info.get('primary', '') == cam.uid:
@@ -674,7 +753,14 @@ class Observatory(PanBase):
 
                 # Create the Scheduler instance
                 self.scheduler = module.Scheduler(
-                    self.observer, fields_file=fields_path, constraints=constraints)
+                    self.observer,
+                    fields_file=fields_path,
+                    constraints=constraints,
+                    almanac=self.almanac,
+                    visibility_dir=scheduler_config.get('visibility_dir'),
+                    watch_fields_file=scheduler_config.get('watch_fields_file', False),
+                    scoring_processes=scheduler_config.get('scoring_processes'),
+                    scoring_top_n=scheduler_config.get('scoring_top_n'))
                 self.logger.debug("Scheduler created")
             except ImportError as e:
                 raise error.NotFound(msg=e)
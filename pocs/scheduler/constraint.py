@@ -1,7 +1,15 @@
+import numpy as np
+
 from astropy import units as u
+from astropy.coordinates import AltAz
+from astropy.coordinates import SkyCoord
 
 from .. import PanBase
 
+# Slack on the caps of `get_cap` for precession, refraction and the
+# interpolation of the visibility table
+CAP_MARGIN = 1 * u.degree
+
 
 class BaseConstraint(PanBase):
 
@@ -32,6 +40,50 @@ class BaseConstraint(PanBase):
     def get_score(self, time, observer, target):
         raise NotImplementedError
 
+    def get_scores(self, time, observer, observations, **kwargs):
+        """ Score a list of observations in one call
+
+        Batch version of `get_score` that is given all the observations at once
+        so that constraints can work on array-valued coordinates rather than
+        transforming each field separately. Constraints that do not override
+        this method raise `NotImplementedError`, which tells the scheduler to
+        fall back to calling `get_score` for each observation.
+
+        Args:
+            time (astropy.time.Time): Time at which to score the observations
+            observer (astroplan.Observer): The observer
+            observations (list): List of `~pocs.scheduler.observation.Observation`
+            **kwargs: Common properties, e.g. `end_of_night`, `moon`, `visibility`
+                (a `~pocs.scheduler.visibility.VisibilityTable`) and `coords`,
+                the latter being a `~astropy.coordinates.SkyCoord` array of the
+                field centres in the same order as `observations`
+
+        Returns:
+            tuple: Two `numpy.array`s with the veto (bool) and score (float)
+                of each observation
+        """
+        raise NotImplementedError
+
+    def get_cap(self, time, observer, **kwargs):
+        """ Part of the sky outside of which every observation is vetoed
+
+        Used by the scheduler to discard fields with a
+        `~pocs.scheduler.field_index.FieldIndex` before scoring. The cap must be
+        conservative: a field that could pass the constraint must never be
+        excluded. Constraints that can't describe such a cap return None.
+
+        Args:
+            time (astropy.time.Time): Time at which the observations are scored
+            observer (astroplan.Observer): The observer
+            **kwargs: Common properties, as for `get_scores`
+
+        Returns:
+            tuple or None: The centre (`~astropy.coordinates.SkyCoord`), radius
+                (u.degree) and whether the fields must be inside (True) or
+                outside (False) of the cap
+        """
+        return None
+
 
 class Altitude(BaseConstraint):
 
@@ -56,7 +108,11 @@ class Altitude(BaseConstraint):
     def get_score(self, time, observer, observation, **kwargs):
         target = observation.field
 
-        alt = observer.altaz(time, target=target).alt
+        visibility, rows = get_visibility_rows(time, [observation], kwargs)
+        if rows is not None:
+            alt = visibility.altitude(time, rows)[0] * u.degree
+        else:
+            alt = observer.altaz(time, target=target).alt
 
         veto = False
         score = self._score
@@ -69,6 +125,22 @@ class Altitude(BaseConstraint):
 
         return veto, score * self.weight
 
+    def get_scores(self, time, observer, observations, **kwargs):
+        visibility, rows = get_visibility_rows(time, observations, kwargs)
+        if rows is not None:
+            alt = visibility.altitude(time, rows) * u.degree
+        else:
+            coords = get_field_coords(observations, kwargs.get('coords'))
+            alt = observer.altaz(time, target=coords).alt
+
+        veto = np.atleast_1d(alt < self.minimum)
+        score = np.where(veto, self._score, 1.0)
+
+        return veto, score * self.weight
+
+    def get_cap(self, time, observer, **kwargs):
+        return get_zenith(time, observer), 90 * u.degree - self.minimum + CAP_MARGIN, True
+
     def __str__(self):
         return "Altitude {}".format(self.minimum)
 
@@ -81,6 +153,11 @@ class Duration(BaseConstraint):
         self.horizon = horizon
 
     def get_score(self, time, observer, observation, **kwargs):
+        # Look the answer up in the visibility table if there is one
+        if get_visibility_rows(time, [observation], kwargs)[1] is not None:
+            veto, score = self.get_scores(time, observer, [observation], **kwargs)
+            return bool(veto[0]), float(score[0])
+
         veto = False
         score = self._score
 
@@ -128,6 +205,57 @@ class Duration(BaseConstraint):
 
         return veto, score * self.weight
 
+    def get_scores(self, time, observer, observations, **kwargs):
+        visibility, rows = get_visibility_rows(time, observations, kwargs)
+        if rows is not None:
+            veto = ~(visibility.altitude(time, rows) > self.horizon.to(u.degree).value)
+        else:
+            coords = get_field_coords(observations, kwargs.get('coords'))
+            veto = ~np.atleast_1d(observer.target_is_up(time, coords, horizon=self.horizon))
+
+        score = np.full(len(veto), self._score, dtype=float)
+
+        end_of_night = kwargs.get('end_of_night')
+        if end_of_night is None:
+            end_of_night = observer.tonight(time=time, horizon=-18 * u.degree)[1]
+
+        up = np.flatnonzero(~veto)
+        if len(up) > 0:
+            minimum_duration = np.array([observations[i].minimum_duration.to(u.second).value
+                                         for i in up])
+
+            # Seconds until the next meridian flip and until each target sets. Targets
+            # that never set come back as NaN.
+            if rows is not None:
+                meridian_sec = visibility.seconds_to_meridian(time, rows[up])
+                end_sec = visibility.seconds_to_set(time, rows[up], self.horizon)
+            else:
+                target_meridian = observer.target_meridian_transit_time(
+                    time, coords[up], which='next')
+                meridian_sec = _seconds_until(target_meridian, time)
+
+                target_end_time = observer.target_set_time(
+                    time, coords[up], which='next', horizon=self.horizon)
+                end_sec = _seconds_until(target_end_time, time)
+
+            night_sec = (end_of_night - time).sec
+
+            # If it flips before end_of_night the minimum must be met before the flip
+            flip_veto = (meridian_sec < night_sec) & (minimum_duration > meridian_sec)
+
+            # Use end_of_night if it happens before the target sets
+            end_sec = np.where(np.isnan(end_sec) | (end_sec > night_sec), night_sec, end_sec)
+
+            veto[up] = flip_veto | (end_sec < minimum_duration)
+
+            # Normalize the score based on total possible number of seconds
+            score[up] = end_sec / night_sec
+
+        return veto, score * self.weight
+
+    def get_cap(self, time, observer, **kwargs):
+        return get_zenith(time, observer), 90 * u.degree - self.horizon + CAP_MARGIN, True
+
     def __str__(self):
         return "Duration above {}".format(self.horizon)
 
@@ -157,5 +285,84 @@ class MoonAvoidance(BaseConstraint):
 
         return veto, score * self.weight
 
+    def get_scores(self, time, observer, observations, **kwargs):
+        coords = get_field_coords(observations, kwargs.get('coords'))
+
+        try:
+            moon = kwargs['moon']
+        except KeyError:
+            self.logger.error("Moon must be set")
+
+        moon_sep = np.atleast_1d(moon.separation(coords).value)
+
+        # This would potentially be within image
+        veto = moon_sep < 15
+        score = np.where(veto, self._score, moon_sep / 180)
+
+        return veto, score * self.weight
+
+    def get_cap(self, time, observer, **kwargs):
+        moon = kwargs.get('moon')
+        if moon is None:
+            return None
+
+        return moon, 15 * u.degree - CAP_MARGIN, False
+
     def __str__(self):
         return "Moon Avoidance"
+
+
+def get_field_coords(observations, coords=None):
+    """ Get the field centres of a list of observations as a single `SkyCoord`
+
+    Args:
+        observations (list): List of `~pocs.scheduler.observation.Observation`
+        coords (astropy.coordinates.SkyCoord, optional): Precomputed coordinates,
+            returned as-is if given
+
+    Returns:
+        astropy.coordinates.SkyCoord: Array-valued ICRS coordinates in the same
+            order as `observations`
+    """
+    if coords is not None:
+        return coords
+
+    ra = [obs.field.coord.icrs.ra.degree for obs in observations]
+    dec = [obs.field.coord.icrs.dec.degree for obs in observations]
+
+    return SkyCoord(ra=ra * u.degree, dec=dec * u.degree, frame='icrs')
+
+
+def get_zenith(time, observer):
+    """ The zenith of `observer` at `time` in ICRS """
+    zenith = SkyCoord(alt=90 * u.degree, az=0 * u.degree,
+                      frame=AltAz(obstime=time, location=observer.location))
+
+    return zenith.icrs
+
+
+def get_visibility_rows(time, observations, kwargs):
+    """ Rows of the observations in the `visibility` table passed in `kwargs`
+
+    Args:
+        time (astropy.time.Time): Time that the table must cover
+        observations (list): List of `~pocs.scheduler.observation.Observation`
+        kwargs (dict): Keywords passed to the constraint
+
+    Returns:
+        tuple: The `~pocs.scheduler.visibility.VisibilityTable` and the row indices,
+            or None for the rows if there is no table, it doesn't cover `time` or
+            it is missing any of the fields
+    """
+    visibility = kwargs.get('visibility')
+
+    if visibility is None or not visibility.covers(time):
+        return visibility, None
+
+    return visibility, visibility.get_indices([obs.name for obs in observations])
+
+
+def _seconds_until(times, time):
+    """ Seconds from `time` until each of `times`, with NaN for missing values """
+    jd = np.ma.filled(np.ma.masked_invalid(np.atleast_1d(times.jd)).astype(float), np.nan)
+    return (jd - time.jd) * 86400.
@@ -1,6 +1,4 @@
-from astropy import units as u
-
-from astropy.coordinates import get_moon
+import numpy as np
 
 from ..utils import current_time
 from ..utils import listify
@@ -37,31 +35,22 @@ class Scheduler(BaseScheduler):
         if time is None:
             time = current_time()
 
-        valid_obs = {obs: 1.0 for obs in self.observations}
+        self.reload_field_list()
+
         best_obs = []
 
         common_properties = {
-            'end_of_night': self.observer.tonight(time=time, horizon=-18 * u.degree)[-1],
-            'moon': get_moon(time, self.observer.location)
+            'end_of_night': self.almanac.tonight(time)[-1],
+            'moon': self.almanac.moon(time),
+            # The workers of a `ShardedScorer` keep their own tables
+            'visibility': self.get_visibility(time) if self._scorer is None else None,
         }
 
-        for constraint in listify(self.constraints):
-            self.logger.debug("Checking Constraint: {}".format(constraint))
-            for obs_name, observation in self.observations.items():
-                if obs_name in valid_obs:
-                    self.logger.debug("\tObservation: {}".format(obs_name))
-
-                    veto, score = constraint.get_score(
-                        time, self.observer, observation, **common_properties)
-
-                    self.logger.debug("\t\tScore: {}\tVeto: {}".format(score, veto))
-
-                    if veto:
-                        self.logger.debug("\t\t{} vetoed by {}".format(obs_name, constraint))
-                        del valid_obs[obs_name]
-                        continue
-
-                    valid_obs[obs_name] += score
+        try:
+            valid_obs = self._get_batch_scores(time, common_properties)
+        except NotImplementedError:
+            self.logger.debug("Batch scoring not supported by all constraints")
+            valid_obs = self._get_scores(time, common_properties)
 
         for obs_name, score in valid_obs.items():
             valid_obs[obs_name] += self.observations[obs_name].priority
@@ -113,3 +102,83 @@ class Scheduler(BaseScheduler):
 ##########################################################################
 # Private Methods
 ##########################################################################
+
+    def _get_scores(self, time, common_properties):
+        """ Score the observations one at a time with `get_score`
+
+        Args:
+            time (astropy.time.Time): Time at which to score the observations
+            common_properties (dict): Keywords passed along to each constraint
+
+        Returns:
+            dict: Merit of each observation that was not vetoed, keyed by name
+        """
+        names = list(self.observations.keys())
+        valid_obs = {names[i]: 1.0 for i in self._get_candidates(time, common_properties)}
+
+        for constraint in listify(self.constraints):
+            self.logger.debug("Checking Constraint: {}".format(constraint))
+            for obs_name, observation in self.observations.items():
+                if obs_name in valid_obs:
+                    self.logger.debug("\tObservation: {}".format(obs_name))
+
+                    veto, score = constraint.get_score(
+                        time, self.observer, observation, **common_properties)
+
+                    self.logger.debug("\t\tScore: {}\tVeto: {}".format(score, veto))
+
+                    if veto:
+                        self.logger.debug("\t\t{} vetoed by {}".format(obs_name, constraint))
+                        del valid_obs[obs_name]
+                        continue
+
+                    valid_obs[obs_name] += score
+
+        return valid_obs
+
+    def _get_batch_scores(self, time, common_properties):
+        """ Score all the observations at once with `get_scores`
+
+        Each constraint only sees the observations that have not been vetoed by
+        a previous constraint, starting from the candidates of `_get_candidates`.
+
+        Args:
+            time (astropy.time.Time): Time at which to score the observations
+            common_properties (dict): Keywords passed along to each constraint
+
+        Returns:
+            dict: Merit of each observation that was not vetoed, keyed by name
+
+        Raises:
+            NotImplementedError: If any of the constraints has no batch scoring
+        """
+        if self._scorer is not None:
+            return self._scorer.get_scores(time, common_properties)
+
+        names = list(self.observations.keys())
+        observations = list(self.observations.values())
+
+        if len(observations) == 0:
+            return dict()
+
+        coords = self.field_coords
+        merits = np.ones(len(observations))
+        valid = self._get_candidates(time, common_properties)
+
+        for constraint in listify(self.constraints):
+            if len(valid) == 0:
+                break
+
+            self.logger.debug("Checking Constraint: {}".format(constraint))
+
+            veto, score = constraint.get_scores(
+                time, self.observer, [observations[i] for i in valid],
+                coords=coords[valid], **common_properties)
+
+            self.logger.debug("\t{} of {} vetoed by {}".format(
+                np.count_nonzero(veto), len(valid), constraint))
+
+            merits[valid] += score
+            valid = valid[~veto]
+
+        return {names[i]: float(merits[i]) for i in valid}
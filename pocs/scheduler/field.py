@@ -6,7 +6,7 @@ from pocs import PanBase
 
 class Field(FixedTarget, PanBase):
 
-    def __init__(self, name, position, equinox='J2000', **kwargs):
+    def __init__(self, name, position, equinox='J2000', context=None, lazy=False, **kwargs):
         """ An object representing an area to be observed
 
         A `Field` corresponds to an `~astroplan.ObservingBlock` and contains information
@@ -15,12 +15,25 @@ class Field(FixedTarget, PanBase):
         Arguments:
             name {str} -- Name of the field, typically the name of object at center `position`
             position {str} -- Center of field, can be anything accepted by `~astropy.coordinates.SkyCoord`
+            context {`pocs.PanBase`} -- Object whose config, logger and database are
+                shared instead of setting up new ones, e.g. the scheduler (default: {None})
+            lazy {bool} -- Only create the `coord` when it is first used, so that
+                an invalid `position` is not noticed until then, `kwargs` are passed
+                on then too (default: {False})
             **kwargs {dict} -- Additional keywords to be passed to `astroplan.ObservingBlock`
 
         """
-        PanBase.__init__(self)
+        PanBase.__init__(self, context=context)
 
-        super().__init__(SkyCoord(position, equinox=equinox, frame='icrs'), name=name, **kwargs)
+        self._position = position
+        self._equinox = equinox
+        self._coord = None
+        self._target_kwargs = kwargs
+
+        if lazy:
+            self.name = name
+        else:
+            super().__init__(SkyCoord(position, equinox=equinox, frame='icrs'), name=name, **kwargs)
 
         self._field_name = self.name.title().replace(' ', '').replace('-', '')
 
@@ -34,6 +47,19 @@ class Field(FixedTarget, PanBase):
         """ Flattened field name appropriate for paths """
         return self._field_name
 
+    @property
+    def coord(self):
+        """ Center of the field as a `~astropy.coordinates.SkyCoord` """
+        if self._coord is None:
+            coord = SkyCoord(self._position, equinox=self._equinox, frame='icrs')
+            FixedTarget.__init__(self, coord, name=self.name, **self._target_kwargs)
+
+        return self._coord
+
+    @coord.setter
+    def coord(self, coord):
+        self._coord = coord
+
 
 ##################################################################################################
 # Methods
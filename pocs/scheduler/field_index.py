@@ -0,0 +1,91 @@
+import numpy as np
+
+from astropy import units as u
+from astropy.coordinates import ICRS
+from astropy.coordinates import SkyCoord
+from astropy.coordinates import UnitSphericalRepresentation
+from scipy.spatial import cKDTree
+
+
+class FieldIndex(object):
+
+    def __init__(self, coords):
+        """ A spatial index of field centres for fast cone searches
+
+        The field centres are stored as unit vectors in a KD-tree, so that all
+        the fields within an angular radius of a point on the sky are found
+        without looking at every field. An angle on the sky corresponds to the
+        chord length `2 sin(angle / 2)` between the unit vectors.
+
+        Args:
+            coords (astropy.coordinates.SkyCoord): Array-valued field centres, the
+                index of a field is its position in `coords`
+        """
+        self._xyz = _unit_vectors(coords)
+        self._tree = cKDTree(self._xyz) if len(self._xyz) > 0 else None
+
+##########################################################################
+# Methods
+##########################################################################
+
+    @u.quantity_input(radius=u.degree)
+    def query_cap(self, center, radius):
+        """ Fields within `radius` of `center`
+
+        Args:
+            center (astropy.coordinates.SkyCoord): Centre of the cap
+            radius (u.degree): Angular radius of the cap
+
+        Returns:
+            numpy.array: Sorted indices of the fields inside the cap
+        """
+        if self._tree is None:
+            return np.empty(0, dtype=int)
+
+        if radius >= 180 * u.degree:
+            return np.arange(len(self))
+
+        chord = 2 * np.sin(radius.to(u.radian).value / 2)
+        indices = self._tree.query_ball_point(_unit_vectors(center)[0], chord)
+
+        return np.array(sorted(indices), dtype=int)
+
+    @u.quantity_input(radius=u.degree)
+    def filter(self, indices, center, radius, inside=True):
+        """ Keep the fields of `indices` that are inside (or outside) a cap
+
+        Args:
+            indices (numpy.array): Indices of the fields to filter
+            center (astropy.coordinates.SkyCoord): Centre of the cap
+            radius (u.degree): Angular radius of the cap
+            inside (bool, optional): Keep the fields inside the cap, defaults to
+                True, otherwise keep those outside of it
+
+        Returns:
+            numpy.array: The indices that pass the filter
+        """
+        in_cap = np.in1d(indices, self.query_cap(center, radius))
+
+        return indices[in_cap if inside else ~in_cap]
+
+    def __len__(self):
+        return len(self._xyz)
+
+    def __str__(self):
+        return "Index of {} fields".format(len(self))
+
+
+def _unit_vectors(coords):
+    """ ICRS unit vectors of `coords` as an (N, 3) array
+
+    The distance is dropped first, so that the direction of a nearby body given
+    in a topocentric frame (e.g. the Moon from `get_moon`) stays the direction
+    seen from the site rather than from the barycentre.
+    """
+    coords = SkyCoord(coords.frame.realize_frame(
+        coords.represent_as(UnitSphericalRepresentation))).transform_to(ICRS())
+
+    ra = np.atleast_1d(coords.ra.radian)
+    dec = np.atleast_1d(coords.dec.radian)
+
+    return np.column_stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
@@ -37,9 +37,11 @@ class Observation(PanBase):
                 (default: {10})
             priority {int} -- Overall priority for field, with 1.0 being highest
                 (default: {100})
+            context {`pocs.PanBase`} -- Object whose config, logger and database are
+                shared instead of setting up new ones, e.g. the scheduler (default: {None})
 
         """
-        PanBase.__init__(self)
+        PanBase.__init__(self, context=kwargs.get('context'))
 
         assert isinstance(field, Field), self.logger.error("Must be a valid Field instance")
 
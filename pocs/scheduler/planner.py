@@ -0,0 +1,420 @@
+from collections import deque
+from collections import namedtuple
+
+import numpy as np
+
+from astropy import units as u
+from astropy.time import Time
+
+from ..utils import current_time
+from .dispatch import Scheduler as DispatchScheduler
+
+PlanBlock = namedtuple('PlanBlock', ['name', 'start_time', 'end_time', 'merit'])
+
+
+class Scheduler(DispatchScheduler):
+
+    def __init__(self, *args, **kwargs):
+        """ Look-ahead scheduler that plans the whole night
+
+        Rather than ranking the fields for "now" on every call, this scheduler
+        builds an ordered plan of observing blocks from the current time until
+        the end of the night and `get_observation` then simply takes the next
+        block off the front of the plan.
+
+        A block is either the first visit to a field, which lasts for its
+        `minimum_duration` and is preceded by a slew, or another set of
+        `exp_set_size` exposures of the field that was just observed. A block
+        is only planned if the field stays above the horizon, doesn't cross the
+        meridian and the block ends before the end of the night. The plan is
+        found with a dynamic program over time slots of `slot_duration`, keeping
+        the best `beam_width` partial plans for each slot (a beam search), where
+        the value of a block is the merit of the field at its start (as given by
+        the dispatch scheduler) multiplied by the hours of exposure.
+
+        When observations are added or removed, or the plan falls behind (e.g.
+        after bad weather), only the affected part of the plan is replanned.
+
+        Args:
+            *args: Arguments passed to `~pocs.scheduler.dispatch.Scheduler`
+            **kwargs: Keyword args passed to `~pocs.scheduler.dispatch.Scheduler`.
+                The planner options `slot_duration` (u.second), `slew_rate`
+                (degrees per second), `changeover_time` (u.second, time to
+                acquire a new field on top of the slew) and `beam_width` can be
+                given here or in the `scheduler` section of the config.
+        """
+        # Set before the fields are read, which calls `add_observation`
+        self._plan = deque()
+        self._plan_end = None
+        self._slot_merits = dict()
+
+        super().__init__(*args, **kwargs)
+
+        scheduler_config = self.config.get('scheduler', {})
+
+        def get_option(name, default):
+            return kwargs.get(name, scheduler_config.get(name, default))
+
+        self.slot_duration = get_option('slot_duration', 5 * u.minute)
+        self.slew_rate = float(get_option('slew_rate', 1.5))
+        self.changeover_time = get_option('changeover_time', 60 * u.second)
+        self.beam_width = int(get_option('beam_width', 8))
+        self.horizon = get_option('horizon', 30 * u.degree)
+
+        # Config values are plain numbers
+        if not isinstance(self.slot_duration, u.Quantity):
+            self.slot_duration = self.slot_duration * u.second
+        if not isinstance(self.changeover_time, u.Quantity):
+            self.changeover_time = self.changeover_time * u.second
+        if not isinstance(self.horizon, u.Quantity):
+            self.horizon = self.horizon * u.degree
+
+##########################################################################
+# Properties
+##########################################################################
+
+    @property
+    def plan(self):
+        """ The remaining `PlanBlock`s of the night, in order """
+        return list(self._plan)
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def get_observation(self, time=None, show_all=False):
+        """Get the next observation from the plan
+
+        The plan is built on the first call of the night. Blocks that should
+        already have finished are dropped and, if the next block isn't due at
+        `time`, the plan is repaired from `time` before the block is taken off
+        the front of the plan.
+
+        Args:
+            time (astropy.time.Time, optional): Time at which scheduler applies,
+                defaults to time called
+            show_all (bool, optional): Return the remaining plan as a list of
+                (name, merit) tuples, defaults to False to only get the next one
+
+        Returns:
+            tuple or list: A tuple (or list of tuples) with name and merit of the
+                planned observations
+        """
+        if time is None:
+            time = current_time()
+
+        self.reload_field_list()
+
+        start_of_night, end_of_night = self.almanac.tonight(time)
+        if self._plan_end is None or abs((end_of_night - self._plan_end).sec) > 3600:
+            self.build_plan(time)
+
+        # Drop the blocks that were missed
+        while len(self._plan) > 0 and self._plan[0].end_time <= time:
+            self._plan.popleft()
+
+        tolerance = self.slot_duration.to(u.second).value
+        if start_of_night <= time:
+            if len(self._plan) == 0:
+                self.repair_plan(time)
+            elif (self._plan[0].start_time - time).sec > tolerance:
+                self.logger.debug("Ahead of plan, filling gap until {}".format(
+                    self._plan[0].start_time.isot))
+                self.repair_plan(time, self._plan[0].start_time)
+            elif (time - self._plan[0].start_time).sec > tolerance:
+                self.logger.debug("Behind plan, replanning from {}".format(time.isot))
+                self.repair_plan(time, self._plan[0].end_time)
+
+        if len(self._plan) == 0 or self._plan[0].start_time - time > self.slot_duration:
+            self.logger.warning("No valid observations found")
+            self.current_observation = None
+            return []
+
+        block = self._plan.popleft()
+
+        self.current_observation = self.observations[block.name]
+        self.current_observation.merit = block.merit
+
+        if show_all:
+            return [(block.name, block.merit)] + [(b.name, b.merit) for b in self._plan]
+
+        return (block.name, block.merit)
+
+    def build_plan(self, time):
+        """Plan the night from `time`
+
+        Args:
+            time (astropy.time.Time): Time to plan from, the plan starts at the
+                beginning of the night if `time` is during the day
+        """
+        start_of_night, self._plan_end = self.almanac.tonight(time)
+
+        self._plan = deque()
+        self._slot_merits = dict()
+
+        self.repair_plan(max(time, start_of_night))
+        self.logger.debug("Planned {} blocks until {}".format(len(self._plan), self._plan_end.isot))
+
+    def repair_plan(self, start_time, end_time=None):
+        """Replan part of the night
+
+        Blocks that finish before `start_time` are kept, as are the blocks from
+        the first change of field at or after `end_time`. The time in between is
+        planned again, leaving time to slew to the first of the kept blocks.
+
+        Args:
+            start_time (astropy.time.Time): Start of the part to replan
+            end_time (astropy.time.Time, optional): End of the part to replan,
+                defaults to the end of the night
+        """
+        if self._plan_end is None:
+            self.build_plan(start_time)
+            return
+
+        blocks = list(self._plan)
+
+        num_prefix = 0
+        while num_prefix < len(blocks) and blocks[num_prefix].end_time <= start_time:
+            num_prefix += 1
+
+        if num_prefix > 0:
+            previous = blocks[num_prefix - 1].name
+        elif self.current_observation is not None:
+            previous = self.current_observation.name
+        else:
+            previous = None
+
+        num_suffix = 0
+        if end_time is not None:
+            last_name = previous
+            for i, block in enumerate(blocks[num_prefix:]):
+                if block.start_time >= end_time and block.name != last_name:
+                    num_suffix = len(blocks) - num_prefix - i
+                    break
+                last_name = block.name
+
+        suffix = blocks[len(blocks) - num_suffix:]
+
+        if len(suffix) > 0:
+            window_end, next_name = suffix[0].start_time, suffix[0].name
+        else:
+            window_end, next_name = self._plan_end, None
+
+        # Fetched once, as the blocks of every slot are checked against it
+        visibility = self.get_visibility(start_time)
+
+        middle = self._plan_blocks(start_time, window_end, visibility, previous=previous,
+                                   next_name=next_name)
+
+        self._plan = deque(blocks[:num_prefix] + middle + suffix)
+
+    def add_observation(self, field_config):
+        """Adds an `Observation` to the scheduler and to the plan
+
+        Only the part of the night during which the new field is above the
+        horizon is replanned.
+
+        Args:
+            field_config (dict): Configuration items for `Observation`
+        """
+        super().add_observation(field_config)
+        self._slot_merits = dict()
+
+        name = field_config['name']
+        if self._plan_end is None or len(self._plan) == 0 or name not in self.observations:
+            return
+
+        start_time = self._plan[0].start_time
+
+        visibility = self.get_visibility(start_time)
+        rows = visibility.get_indices([name])
+
+        rise, set_, _ = visibility.rise_set_meridian(self.horizon, rows)
+        if np.isnan(rise[0]) and visibility.altitude(start_time, rows)[0] <= self.horizon.value:
+            self.logger.debug("{} not up tonight, plan unchanged".format(name))
+            return
+
+        if not np.isnan(rise[0]):
+            start_time = max(start_time, Time(rise[0], format='jd'))
+
+        end_time = None if np.isnan(set_[0]) else Time(set_[0], format='jd')
+
+        self.repair_plan(start_time, end_time)
+
+    def remove_observation(self, field_name):
+        """Removes an `Observation` from the scheduler and from the plan
+
+        Only the part of the plan between the first and the last block of the
+        removed field is replanned.
+
+        Args:
+            field_name (str): Field name corresponding to entry key in `observations`
+        """
+        super().remove_observation(field_name)
+        self._slot_merits = dict()
+
+        blocks = list(self._plan)
+        removed = [i for i, block in enumerate(blocks) if block.name == field_name]
+        if len(removed) == 0:
+            return
+
+        first, last = removed[0], removed[-1]
+        start_time = blocks[first - 1].end_time if first > 0 else blocks[first].start_time
+
+        # Take the blocks out so they are not kept as prefix of the repair
+        self._plan = deque(blocks[:first] + blocks[last + 1:])
+        self.repair_plan(start_time, blocks[last].end_time)
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _plan_blocks(self, start_time, end_time, visibility, previous=None, next_name=None):
+        """Find the best sequence of blocks between two times
+
+        Args:
+            start_time (astropy.time.Time): Earliest start of the first slew
+            end_time (astropy.time.Time): Time by which the last block must end,
+                including the slew to `next_name`
+            visibility (`~pocs.scheduler.visibility.VisibilityTable`): The table
+                of the night, see `get_visibility`
+            previous (str, optional): Field observed before `start_time`
+            next_name (str, optional): Field observed after `end_time`
+
+        Returns:
+            list: The `PlanBlock`s
+        """
+        slot_sec = self.slot_duration.to(u.second).value
+
+        first_slot = int(np.ceil(start_time.jd * 86400. / slot_sec))
+        num_slots = int(np.floor(end_time.jd * 86400. / slot_sec)) - first_slot
+        if num_slots < 1 or len(self.observations) == 0:
+            return list()
+
+        names = list(self.observations.keys())
+        observations = list(self.observations.values())
+        index = {name: i for i, name in enumerate(names)}
+        rows = visibility.get_indices(names)
+
+        min_sec = np.array([obs.minimum_duration.to(u.second).value for obs in observations])
+        set_sec = np.array([obs.set_duration.to(u.second).value for obs in observations])
+        min_slots = np.ceil(min_sec / slot_sec).astype(int)
+        set_slots = np.ceil(set_sec / slot_sec).astype(int)
+
+        xyz = self.field_coords.cartesian.xyz.value.T
+        changeover_sec = self.changeover_time.to(u.second).value
+
+        def slew_slots(i, j):
+            """ Slots needed to slew from field `i` (or from nowhere) to `j` """
+            seconds = changeover_sec
+            if i is not None:
+                angle = np.degrees(np.arccos(np.clip(np.dot(xyz[i], xyz[j]), -1, 1)))
+                seconds += angle / self.slew_rate
+            return int(np.ceil(seconds / slot_sec))
+
+        next_index = index.get(next_name)
+
+        # Best partial plans ending at each slot, by last field: value and the
+        # chain of blocks as nested (block, previous chain) tuples
+        states = [dict() for _ in range(num_slots + 1)]
+        states[0][index.get(previous)] = (0., None)
+
+        for k in range(num_slots):
+            if len(states[k]) == 0:
+                continue
+
+            if len(states[k]) > self.beam_width:
+                best = sorted(states[k].items(), key=lambda x: x[1][0])[::-1]
+                states[k] = dict(best[:self.beam_width])
+
+            merits = self._get_slot_merits(first_slot + k, slot_sec, visibility)
+
+            candidates = np.flatnonzero(np.isfinite(merits))
+            if len(candidates) > self.beam_width:
+                top = np.argpartition(-merits[candidates], self.beam_width)[:self.beam_width]
+                candidates = candidates[top]
+
+            for last, (value, chain) in states[k].items():
+                # Wait a slot without observing
+                self._relax(states[k + 1], last, value, chain)
+
+                options = set(candidates)
+                if last is not None and np.isfinite(merits[last]):
+                    options.add(last)
+
+                for j in options:
+                    if j == last:
+                        slew, exposure, duration = 0, set_sec[j], set_slots[j]
+                    else:
+                        slew = slew_slots(last, j)
+                        exposure, duration = min_sec[j], slew + min_slots[j]
+
+                    end_slot = k + duration
+                    if next_index is not None and next_index != j:
+                        end_slot += slew_slots(j, next_index)
+                    if end_slot > num_slots:
+                        continue
+
+                    block_start = (first_slot + k + slew) * slot_sec / 86400.
+                    if not self._block_fits(visibility, rows[j:j + 1], block_start, exposure):
+                        continue
+
+                    block = (j, block_start, block_start + exposure / 86400., merits[j])
+                    self._relax(states[k + duration], j,
+                                value + merits[j] * exposure / 3600., (block, chain))
+
+        best = max(states[num_slots].values(), key=lambda x: x[0])
+
+        blocks = list()
+        chain = best[1]
+        while chain is not None:
+            (j, start_jd, end_jd, merit), chain = chain
+            blocks.append(PlanBlock(names[j],
+                                    Time(start_jd, format='jd'),
+                                    Time(end_jd, format='jd'),
+                                    float(merit)))
+
+        return blocks[::-1]
+
+    def _get_slot_merits(self, slot, slot_sec, visibility):
+        """ Merit of every observation at the start of `slot`, -inf if vetoed """
+        if slot not in self._slot_merits:
+            time = Time(slot * slot_sec / 86400., format='jd')
+
+            common_properties = {
+                'end_of_night': self._plan_end,
+                'moon': self.almanac.moon(time),
+                'visibility': visibility,
+            }
+
+            try:
+                valid_obs = self._get_batch_scores(time, common_properties)
+            except NotImplementedError:
+                valid_obs = self._get_scores(time, common_properties)
+
+            merits = np.full(len(self.observations), -np.inf)
+            for i, (name, observation) in enumerate(self.observations.items()):
+                if name in valid_obs:
+                    merits[i] = valid_obs[name] + observation.priority
+
+            self._slot_merits[slot] = merits
+
+        return self._slot_merits[slot]
+
+    def _block_fits(self, visibility, rows, start_jd, exposure):
+        """ If the observation of `rows` stays up and doesn't flip for `exposure` seconds """
+        time = Time(start_jd, format='jd')
+
+        if not visibility.covers(time):
+            return False
+
+        set_sec = visibility.seconds_to_set(time, rows, self.horizon)[0]
+        if set_sec < exposure:
+            return False
+
+        return visibility.seconds_to_meridian(time, rows)[0] >= exposure
+
+    def _relax(self, slot_states, last, value, chain):
+        """ Keep the better of two partial plans ending on the same field """
+        if last not in slot_states or slot_states[last][0] < value:
+            slot_states[last] = (value, chain)
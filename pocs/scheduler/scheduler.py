@@ -1,6 +1,9 @@
+import hashlib
 import os
 import yaml
 
+import numpy as np
+
 from collections import OrderedDict
 
 from astroplan import Observer
@@ -8,8 +11,18 @@ from astropy import units as u
 
 from .. import PanBase
 from ..utils import current_time
+from ..utils import flatten_time
+from ..utils import listify
+from ..utils.almanac import Almanac
+from .constraint import get_field_coords
 from .field import Field
+from .field_index import FieldIndex
 from .observation import Observation
+from .scoring import ShardedScorer
+from .visibility import VisibilityTable
+
+# Use the C YAML parser when PyYAML was built with libyaml
+YAML_LOADER = getattr(yaml, 'CLoader', yaml.Loader)
 
 
 class BaseScheduler(PanBase):
@@ -31,7 +44,14 @@ class BaseScheduler(PanBase):
             constraints (list, optional): List of `Constraints` to apply to each
                 observation
             *args: Arguments to be passed to `PanBase`
-            **kwargs: Keyword args to be passed to `PanBase`
+            **kwargs: Keyword args to be passed to `PanBase`. Can also include
+                `visibility_dir`, a directory in which the nightly `VisibilityTable`
+                is saved so that it survives a restart, `almanac`, a shared
+                `~pocs.utils.almanac.Almanac` for `observer`, `watch_fields_file`
+                to pick up changes to `fields_file` with `reload_field_list`, and
+                `scoring_processes` (with optionally `scoring_top_n`) to score
+                the observations in parallel with a
+                `~pocs.scheduler.scoring.ShardedScorer`.
         """
         PanBase.__init__(self, *args, **kwargs)
 
@@ -40,11 +60,30 @@ class BaseScheduler(PanBase):
         self._fields_file = fields_file
         self._fields_list = fields_list
         self._observations = dict()
+        self._field_coords = None
+        self._field_index = None
+
+        # Configs the observations were created from, to find changed entries
+        self._field_configs = dict()
+        self._updated_fields = set()
+        self._fields_mtime = None
+        self._fields_hash = None
+        self.watch_fields_file = kwargs.get('watch_fields_file', False)
 
         self.observer = observer
+        self.almanac = kwargs.get('almanac') or Almanac(observer)
 
         self.constraints = constraints
 
+        self._scorer = None
+        if kwargs.get('scoring_processes'):
+            self._scorer = ShardedScorer(observer, constraints, kwargs['scoring_processes'],
+                                         top_n=kwargs.get('scoring_top_n'), logger=self.logger)
+
+        self._visibility = None
+        self._visibility_dir = kwargs.get('visibility_dir')
+        self._visibility_file = None
+
         self._current_observation = None
         self.observed_list = OrderedDict()
 
@@ -68,6 +107,33 @@ class BaseScheduler(PanBase):
 
         return self._observations
 
+    @property
+    def field_coords(self):
+        """An array-valued `~astropy.coordinates.SkyCoord` of all field centres
+
+        The coordinates are in the same order as `observations` and are used by the
+        batch scoring of the constraints. They are built once and rebuilt only
+        after observations have been added or removed.
+        """
+        if self._field_coords is None:
+            self._field_coords = get_field_coords(list(self.observations.values()))
+
+        return self._field_coords
+
+    @property
+    def field_index(self):
+        """A `~pocs.scheduler.field_index.FieldIndex` of `field_coords`
+
+        Used to discard the fields that are certainly vetoed before scoring. Like
+        `field_coords` it is rebuilt only after observations have been added or
+        removed, which is cheaper than updating it for each field that is added
+        while a fields file is read.
+        """
+        if self._field_index is None:
+            self._field_index = FieldIndex(self.field_coords)
+
+        return self._field_index
+
     @property
     def current_observation(self):
         """The observation that is currently selected by the scheduler
@@ -89,7 +155,7 @@ class BaseScheduler(PanBase):
             # and add to the list
             if new_observation is not None:
                 # Set the new seq_time for the observation
-                new_observation.seq_time = current_time(flatten=True)
+                new_observation.seq_time = self._get_seq_time()
 
                 # Add the new observation to the list
                 self.observed_list[new_observation.seq_time] = new_observation
@@ -101,7 +167,7 @@ class BaseScheduler(PanBase):
                 # If we have a new observation, check if same as old observation
                 if self.current_observation.name != new_observation.name:
                     self.current_observation.reset()
-                    new_observation.seq_time = current_time(flatten=True)
+                    new_observation.seq_time = self._get_seq_time()
 
                     # Add the new observation to the list
                     self.observed_list[new_observation.seq_time] = new_observation
@@ -130,7 +196,14 @@ class BaseScheduler(PanBase):
     def fields_file(self, new_file):
         # Clear out existing list and observations
         self._fields_list = None
+        if self._scorer is not None:
+            for name in self._observations:
+                self._scorer.remove_observation(name)
+
         self._observations = dict()
+        self._field_configs = dict()
+        self._field_coords = None
+        self._field_index = None
 
         self._fields_file = new_file
         if new_file is not None:
@@ -159,7 +232,14 @@ class BaseScheduler(PanBase):
     def fields_list(self, new_list):
         # Clear out existing list and observations
         self._fields_file = None
+        if self._scorer is not None:
+            for name in self._observations:
+                self._scorer.remove_observation(name)
+
         self._observations = dict()
+        self._field_configs = dict()
+        self._field_coords = None
+        self._field_index = None
 
         self._fields_list = new_list
         self.read_field_list()
@@ -189,6 +269,50 @@ class BaseScheduler(PanBase):
             'current_observation': self.current_observation,
         }
 
+    def get_visibility(self, time):
+        """Get the `~pocs.scheduler.visibility.VisibilityTable` for the night
+
+        The table is built once per night, covering `time` until the end of the
+        night, and then kept in sync with `observations`, only computing rows for
+        fields that have been added since. If `visibility_dir` was given the table
+        is loaded from there when available and saved whenever it changes.
+
+        Args:
+            time (astropy.time.Time): Time the table must cover
+
+        Returns:
+            `~pocs.scheduler.visibility.VisibilityTable`: The table, or None if
+                there are no observations
+        """
+        if len(self.observations) == 0:
+            return None
+
+        changed = False
+        if self._visibility is None or not self._visibility.covers(time):
+            self._visibility, changed = self._get_visibility_table(time)
+
+        table_names = set(self._visibility.names)
+
+        # The rows of fields whose entry was updated may be for their old position
+        removed = table_names.difference(self.observations) | \
+            table_names.intersection(self._updated_fields)
+        self._updated_fields = set()
+        if len(removed) > 0:
+            self._visibility.remove_fields(removed)
+            table_names.difference_update(removed)
+            changed = True
+
+        added = [name for name in self.observations if name not in table_names]
+        if len(added) > 0:
+            self._visibility.add_fields(
+                added, get_field_coords([self.observations[name] for name in added]))
+            changed = True
+
+        if changed and self._visibility_dir is not None:
+            self._visibility.save(self._visibility_file)
+
+        return self._visibility
+
     def reset_observed_list(self):
         """Reset the observed list """
         self.logger.debug('Resetting observed list')
@@ -213,18 +337,26 @@ class BaseScheduler(PanBase):
         assert field_config['name'] not in self._observations.keys(), \
             self.logger.error("Cannot add duplicate field name")
 
+        config = dict(field_config)
+
         if 'exp_time' in field_config:
             field_config['exp_time'] = float(field_config['exp_time']) * u.second
 
-        field = Field(field_config['name'], field_config['position'])
+        field = Field(field_config['name'], field_config['position'], context=self)
 
         try:
-            obs = Observation(field, **field_config)
+            obs = Observation(field, context=self, **field_config)
         except Exception as e:
             self.logger.warning("Skipping invalid field config: {}".format(field_config))
             self.logger.warning(e)
         else:
             self._observations[field.name] = obs
+            self._field_configs[field.name] = config
+            self._field_coords = None
+            self._field_index = None
+
+            if self._scorer is not None:
+                self._scorer.add_observation(obs)
 
     def remove_observation(self, field_name):
         """Removes an `Observation` from the scheduler
@@ -236,6 +368,13 @@ class BaseScheduler(PanBase):
         try:
             obs = self._observations[field_name]
             del self._observations[field_name]
+            self._field_configs.pop(field_name, None)
+            self._field_coords = None
+            self._field_index = None
+
+            if self._scorer is not None:
+                self._scorer.remove_observation(field_name)
+
             self.logger.debug("Observation removed: {}".format(obs))
         except Exception:
             pass
@@ -248,13 +387,108 @@ class BaseScheduler(PanBase):
             if not os.path.exists(self.fields_file):
                 raise FileNotFoundError
 
-            with open(self.fields_file, 'r') as f:
-                self._fields_list = yaml.load(f.read())
+            self._fields_mtime = os.path.getmtime(self.fields_file)
+            with open(self.fields_file, 'rb') as f:
+                contents = f.read()
+
+            self._fields_hash = hashlib.sha1(contents).hexdigest()
+            self._fields_list = yaml.load(contents, Loader=YAML_LOADER)
 
         if self._fields_list is not None:
             for field_config in self._fields_list:
                 self.add_observation(field_config)
 
+    def reload_field_list(self):
+        """Apply any changes made to `fields_file` since it was read
+
+        Only does anything if `watch_fields_file` is set. The file is re-read
+        when its modification time changes and re-parsed only if its contents
+        have changed. The new list is then compared with the configs of the
+        current observations: fields that are gone are removed, new fields are
+        added and fields whose entry changed are replaced, leaving all other
+        `Observation`s untouched. The `current_observation` keeps its progress
+        (exposures taken, `seq_time`) even if its entry changed, and the
+        `observed_list` is not modified. The visibility rows of the changed
+        fields are recomputed by the next `get_visibility`.
+
+        Returns:
+            bool: True if the observations were changed
+        """
+        if not self.watch_fields_file or self._fields_file is None:
+            return False
+
+        try:
+            mtime = os.path.getmtime(self._fields_file)
+            if mtime == self._fields_mtime:
+                return False
+
+            with open(self._fields_file, 'rb') as f:
+                contents = f.read()
+        except OSError as e:
+            self.logger.warning("Cannot read fields file {}: {}".format(self._fields_file, e))
+            return False
+
+        self._fields_mtime = mtime
+
+        fields_hash = hashlib.sha1(contents).hexdigest()
+        if fields_hash == self._fields_hash:
+            return False
+
+        try:
+            fields_list = yaml.load(contents, Loader=YAML_LOADER) or list()
+        except yaml.YAMLError as e:
+            self.logger.warning("Cannot parse fields file, keeping current fields: {}".format(e))
+            return False
+
+        self._fields_hash = fields_hash
+        self._fields_list = fields_list
+
+        new_configs = OrderedDict()
+        for field_config in fields_list:
+            try:
+                new_configs[field_config['name']] = field_config
+            except (KeyError, TypeError):
+                self.logger.warning("Skipping invalid field config: {}".format(field_config))
+
+        removed = [name for name in self._observations if name not in new_configs]
+        for name in removed:
+            self.remove_observation(name)
+
+        added = list()
+        updated = list()
+        for name, field_config in new_configs.items():
+            if name not in self._observations:
+                # Invalid configs are skipped by `add_observation`
+                self.add_observation(field_config)
+                if name in self._observations:
+                    added.append(name)
+            elif self._field_configs.get(name) != field_config:
+                old_observation = self._observations[name]
+
+                self.remove_observation(name)
+                self.add_observation(field_config)
+
+                new_observation = self._observations.get(name)
+                if new_observation is None:
+                    removed.append(name)
+                    continue
+
+                updated.append(name)
+                self._updated_fields.add(name)
+
+                if old_observation is self.current_observation:
+                    self._replace_current_observation(new_observation)
+
+        self.logger.debug("Reloaded {}: {} added, {} removed, {} updated".format(
+            self._fields_file, len(added), len(removed), len(updated)))
+
+        return len(added) + len(removed) + len(updated) > 0
+
+    def close(self):
+        """ Stop the worker processes of the `ShardedScorer`, if any """
+        if self._scorer is not None:
+            self._scorer.close()
+
 ##########################################################################
 # Utility Methods
 ##########################################################################
@@ -262,3 +496,85 @@ class BaseScheduler(PanBase):
 ##########################################################################
 # Private Methods
 ##########################################################################
+
+    def _replace_current_observation(self, new_observation):
+        """Swap in an updated `Observation` for the current one, keeping its progress """
+        old_observation = self._current_observation
+
+        new_observation.seq_time = old_observation.seq_time
+        new_observation.exposure_list = old_observation.exposure_list
+        new_observation.current_exp = old_observation.current_exp
+        new_observation.merit = old_observation.merit
+        new_observation.pointing_image = old_observation.pointing_image
+
+        # Not through the setter, which would treat this as a new observation
+        self._current_observation = new_observation
+
+    def _get_seq_time(self):
+        """ A `seq_time` for a new observation, unique within `observed_list`
+
+        Two observations can be selected within the same second, in which case
+        the microseconds are added so that neither is overwritten in the list.
+        """
+        now = current_time()
+        seq_time = flatten_time(now)
+
+        microsecond = now.datetime.microsecond
+        while seq_time in self.observed_list:
+            seq_time = '{}.{:06d}'.format(flatten_time(now), microsecond)
+            microsecond += 1
+
+        return seq_time
+
+    def _get_candidates(self, time, common_properties):
+        """Indices of the observations that are not certainly vetoed
+
+        The cap of each constraint (see `~pocs.scheduler.constraint.BaseConstraint.get_cap`)
+        is looked up in the `field_index`, so the cost depends on the number of
+        fields inside the caps rather than on the total number of fields.
+
+        Args:
+            time (astropy.time.Time): Time at which the observations are scored
+            common_properties (dict): Keywords passed along to each constraint
+
+        Returns:
+            numpy.array: Indices into `observations`, in order
+        """
+        candidates = np.arange(len(self.observations))
+
+        for constraint in listify(self.constraints):
+            cap = constraint.get_cap(time, self.observer, **common_properties)
+            if cap is None:
+                continue
+
+            center, radius, inside = cap
+            candidates = self.field_index.filter(candidates, center, radius, inside=inside)
+
+            self.logger.debug("{} candidates after {}".format(len(candidates), constraint))
+
+            if len(candidates) == 0:
+                break
+
+        return candidates
+
+    def _get_visibility_table(self, time):
+        """Load or create an empty visibility table for the night of `time`
+
+        Returns:
+            tuple: The `VisibilityTable` and whether it was newly created
+        """
+        end_of_night = self.almanac.tonight(time)[-1]
+
+        if self._visibility_dir is not None:
+            os.makedirs(self._visibility_dir, exist_ok=True)
+            self._visibility_file = os.path.join(
+                self._visibility_dir,
+                'visibility_{}.npz'.format(end_of_night.datetime.strftime('%Y%m%d')))
+
+            table = VisibilityTable.load(self._visibility_file, self.observer)
+            if table is not None and table.covers(time):
+                self.logger.debug("Loaded visibility table: {}".format(self._visibility_file))
+                return table, False
+
+        self.logger.debug("Creating visibility table until {}".format(end_of_night.isot))
+        return VisibilityTable(self.observer, time, end_of_night), True
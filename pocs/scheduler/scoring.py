@@ -0,0 +1,327 @@
+import multiprocessing
+
+from collections import namedtuple
+
+import numpy as np
+
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+from astropy.coordinates import UnitSphericalRepresentation
+from astropy.time import Time
+
+from ..utils import listify
+from .visibility import VisibilityTable
+
+# The parts of an `Observation` that the batch scoring of the constraints uses
+ShardObservation = namedtuple('ShardObservation', ['name', 'minimum_duration'])
+
+
+class ShardedScorer(object):
+
+    def __init__(self, observer, constraints, num_processes, top_n=None, logger=None):
+        """ Score observations in parallel across worker processes
+
+        The observations are split into shards, one per worker process. Each
+        worker is long-lived and keeps its own copy of the names, minimum
+        durations, priorities and coordinates of its shard, along with a
+        `~pocs.scheduler.visibility.VisibilityTable` for them, so that only the
+        time and the position of the Moon are sent for each scoring. Added and
+        removed observations are queued and sent to the workers in one batch
+        before the next scoring.
+
+        Note:
+            Only the batch scoring (`get_scores`) of the constraints is used, a
+            constraint without it makes `get_scores` raise `NotImplementedError`.
+
+        Args:
+            observer (`astroplan.Observer`): The observer
+            constraints (list): The `Constraints` to apply, copied to each worker
+            num_processes (int): Number of worker processes
+            top_n (int, optional): Only return the `top_n` observations with the
+                highest merit plus priority of each shard, defaults to all of the
+                observations that are not vetoed. The priorities are those at the
+                time the observations were added.
+            logger (optional): Logger for the scorer
+        """
+        assert num_processes > 0, "Need at least one worker process"
+
+        self.logger = logger
+        self.top_n = top_n
+
+        self._shard_of = dict()
+        self._shard_sizes = np.zeros(num_processes, dtype=int)
+        self._pending_add = [list() for _ in range(num_processes)]
+        self._pending_remove = [list() for _ in range(num_processes)]
+
+        self._connections = list()
+        self._processes = list()
+        for i in range(num_processes):
+            conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_score_worker,
+                                              args=(worker_conn, observer, listify(constraints)),
+                                              name='ScoringWorker{:02d}'.format(i),
+                                              daemon=True)
+            process.start()
+
+            self._connections.append(conn)
+            self._processes.append(process)
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def add_observation(self, observation):
+        """ Queue an `Observation` to be added to the smallest shard """
+        shard = int(np.argmin(self._shard_sizes))
+
+        self._shard_of[observation.name] = shard
+        self._shard_sizes[shard] += 1
+
+        coord = observation.field.coord.icrs
+        self._pending_add[shard].append((observation.name,
+                                         observation.minimum_duration.to(u.second).value,
+                                         observation.priority,
+                                         coord.ra.degree,
+                                         coord.dec.degree))
+
+    def remove_observation(self, name):
+        """ Queue an observation to be removed from its shard
+
+        An observation whose addition is still queued is dropped from the queue
+        instead, as the removals are sent to the workers before the additions.
+        """
+        shard = self._shard_of.pop(name, None)
+        if shard is None:
+            return
+
+        self._shard_sizes[shard] -= 1
+
+        pending = self._pending_add[shard]
+        for i, entry in enumerate(pending):
+            if entry[0] == name:
+                del pending[i]
+                return
+
+        self._pending_remove[shard].append(name)
+
+    def get_scores(self, time, common_properties):
+        """ Score the observations of all the shards
+
+        Args:
+            time (astropy.time.Time): Time at which to score the observations
+            common_properties (dict): Must include `end_of_night` and `moon`
+
+        Returns:
+            dict: Merit of each observation that was not vetoed, keyed by name
+
+        Raises:
+            NotImplementedError: If any of the constraints has no batch scoring
+        """
+        self._sync()
+
+        # Direction of the Moon, without distance so the ICRS direction stays topocentric
+        moon = common_properties['moon']
+        moon = SkyCoord(moon.frame.realize_frame(
+            moon.represent_as(UnitSphericalRepresentation))).icrs
+
+        request = ('score', time.jd, common_properties['end_of_night'].jd,
+                   float(moon.ra.degree), float(moon.dec.degree), self.top_n)
+
+        for conn in self._connections:
+            conn.send(request)
+
+        valid_obs = dict()
+        for result in self._receive_all():
+            valid_obs.update(result)
+
+        return valid_obs
+
+    def close(self):
+        """ Stop the worker processes """
+        for conn, process in zip(self._connections, self._processes):
+            try:
+                conn.send(('stop',))
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+            process.join(timeout=5)
+
+        self._connections = list()
+        self._processes = list()
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _sync(self):
+        """ Send the queued changes to the workers """
+        for shard, conn in enumerate(self._connections):
+            if len(self._pending_remove[shard]) > 0:
+                conn.send(('remove', self._pending_remove[shard]))
+                self._pending_remove[shard] = list()
+
+            if len(self._pending_add[shard]) > 0:
+                conn.send(('add', self._pending_add[shard]))
+                self._pending_add[shard] = list()
+
+    def _receive_all(self):
+        """ The replies of all the workers
+
+        Every worker's reply is read before an error is raised, so that none
+        is left to be read as the reply to the next request.
+        """
+        replies = [conn.recv() for conn in self._connections]
+
+        results = list()
+        first_error = None
+        for shard, (status, result) in enumerate(replies):
+            if status == 'error':
+                command, e = result
+                if self.logger is not None:
+                    self.logger.warning("Scoring worker {} failed to {}: {}".format(
+                        shard, command, e))
+                if first_error is None:
+                    first_error = e
+            else:
+                results.append(result)
+
+        if first_error is not None:
+            raise first_error
+
+        return results
+
+    def __len__(self):
+        return len(self._shard_of)
+
+    def __str__(self):
+        return "Scoring {} observations in {} processes".format(len(self), len(self._processes))
+
+
+def _score_worker(conn, observer, constraints):
+    """ Main loop of a worker process, see `ShardedScorer` """
+    shard = _Shard(observer, constraints)
+
+    # Changes have no reply, so their first error is the reply to the next scoring
+    change_error = None
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+
+        command = request[0]
+        if command == 'stop':
+            break
+
+        try:
+            if command == 'add':
+                shard.add(request[1])
+            elif command == 'remove':
+                shard.remove(request[1])
+            elif command == 'score':
+                if change_error is not None:
+                    conn.send(('error', change_error))
+                    change_error = None
+                else:
+                    conn.send(('ok', shard.score(*request[1:])))
+        except Exception as e:
+            if command == 'score':
+                conn.send(('error', (command, e)))
+            elif change_error is None:
+                change_error = (command, e)
+
+    conn.close()
+
+
+class _Shard(object):
+
+    def __init__(self, observer, constraints):
+        """ The observations held by one worker process """
+        self.observer = observer
+        self.constraints = constraints
+
+        self.names = list()
+        self._minimum_duration = np.empty(0)
+        self._priority = np.empty(0)
+        self._ra = np.empty(0)
+        self._dec = np.empty(0)
+
+        self._observations = None
+        self._coords = None
+        self._visibility = None
+
+    def add(self, entries):
+        names, *columns = zip(*entries)
+        minimum_duration, priority, ra, dec = [np.array(x, dtype=float) for x in columns]
+
+        self.names.extend(names)
+        self._minimum_duration = np.concatenate([self._minimum_duration, minimum_duration])
+        self._priority = np.concatenate([self._priority, priority])
+        self._ra = np.concatenate([self._ra, ra])
+        self._dec = np.concatenate([self._dec, dec])
+
+        if self._visibility is not None:
+            self._visibility.add_fields(list(names),
+                                        SkyCoord(ra=ra * u.degree, dec=dec * u.degree,
+                                                 frame='icrs'))
+        self._changed()
+
+    def remove(self, names):
+        keep = ~np.in1d(self.names, names)
+
+        self.names = [name for name, k in zip(self.names, keep) if k]
+        self._minimum_duration = self._minimum_duration[keep]
+        self._priority = self._priority[keep]
+        self._ra = self._ra[keep]
+        self._dec = self._dec[keep]
+
+        if self._visibility is not None:
+            self._visibility.remove_fields(names)
+        self._changed()
+
+    def score(self, time_jd, end_jd, moon_ra, moon_dec, top_n):
+        """ Merits of the observations that are not vetoed, as with `_get_batch_scores` """
+        if len(self.names) == 0:
+            return dict()
+
+        time = Time(time_jd, format='jd')
+        end_of_night = Time(end_jd, format='jd')
+
+        if self._observations is None:
+            self._observations = [ShardObservation(name, duration * u.second)
+                                  for name, duration in zip(self.names, self._minimum_duration)]
+            self._coords = SkyCoord(ra=self._ra * u.degree, dec=self._dec * u.degree, frame='icrs')
+
+        if self._visibility is None or not self._visibility.covers(time):
+            self._visibility = VisibilityTable(self.observer, time, end_of_night)
+            self._visibility.add_fields(self.names, self._coords)
+
+        common_properties = {
+            'end_of_night': end_of_night,
+            'moon': SkyCoord(ra=moon_ra * u.degree, dec=moon_dec * u.degree, frame='icrs'),
+            'visibility': self._visibility,
+        }
+
+        merits = np.ones(len(self.names))
+        valid = np.arange(len(self.names))
+
+        for constraint in self.constraints:
+            if len(valid) == 0:
+                break
+
+            veto, score = constraint.get_scores(
+                time, self.observer, [self._observations[i] for i in valid],
+                coords=self._coords[valid], **common_properties)
+
+            merits[valid] += score
+            valid = valid[~veto]
+
+        if top_n is not None and len(valid) > top_n:
+            ranks = merits[valid] + self._priority[valid]
+            valid = valid[np.argsort(ranks)[::-1][:top_n]]
+
+        return {self.names[i]: float(merits[i]) for i in valid}
+
+    def _changed(self):
+        self._observations = None
+        self._coords = None
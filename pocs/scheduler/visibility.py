@@ -0,0 +1,356 @@
+import os
+
+import numpy as np
+
+from astropy import units as u
+from astropy.coordinates import FK5
+from astropy.time import Time
+
+# Ratio of a solar day to a sidereal day
+SIDEREAL_RATE = 1.00273790935
+
+
+class VisibilityTable(object):
+
+    @u.quantity_input(resolution=u.second)
+    def __init__(self, observer, start_time, end_time, resolution=5 * u.minute):
+        """ A precomputed table of field visibility over a night
+
+        Holds the altitude of every field on a regular time grid between `start_time`
+        and `end_time` (usually the end of the night) along with the local sidereal
+        time, from which hour angles, meridian transits and rise/set times are found
+        by interpolation instead of by the iterative searches in `astroplan`.
+
+        Altitudes are computed from the apparent place of each field at the middle
+        of the grid, which is accurate to well under an arcminute over a night.
+
+        Note:
+            Fields are added with `add_fields` and are addressed by name, see
+            `get_indices`.
+
+        Args:
+            observer (`astroplan.Observer`): The location the table is computed for
+            start_time (astropy.time.Time): Start of the time grid
+            end_time (astropy.time.Time): End of the time grid, typically end of night
+            resolution (u.second, optional): Spacing of the time grid, defaults to 5 min
+        """
+        assert end_time > start_time, "end_time must be after start_time"
+
+        self.observer = observer
+        self.start_time = start_time
+        self.end_time = end_time
+
+        num_points = int(np.ceil(((end_time - start_time) / resolution).decompose().value)) + 1
+        self._jd = np.linspace(start_time.jd, end_time.jd, max(num_points, 2))
+
+        lst = observer.local_sidereal_time(Time(self._jd, format='jd')).hour
+        self._lst = np.unwrap(lst * np.pi / 12.) * 12. / np.pi
+
+        self._epoch = Time((self._jd[0] + self._jd[-1]) / 2., format='jd')
+
+        self.names = list()
+        self._index = dict()
+        self._ra = np.empty(0)
+        self._dec = np.empty(0)
+        self._alt = np.empty((0, len(self._jd)), dtype=np.float32)
+
+##########################################################################
+# Properties
+##########################################################################
+
+    @property
+    def times(self):
+        """ The time grid of the table as an `astropy.time.Time` array """
+        return Time(self._jd, format='jd')
+
+    @property
+    def altitudes(self):
+        """ Altitude grid in degrees with one row per field and one column per time """
+        return self._alt
+
+    @property
+    def hour_angles(self):
+        """ Hour angle grid in hours (-12 to 12), same shape as `altitudes` """
+        return _wrap_hours(self._lst[np.newaxis, :] - self._ra[:, np.newaxis] / 15.)
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def covers(self, time):
+        """ If `time` falls inside the time grid of the table """
+        return self._jd[0] <= time.jd <= self._jd[-1]
+
+    def get_indices(self, names):
+        """ Row of each of the named fields
+
+        Args:
+            names (list): Field names
+
+        Returns:
+            numpy.array: Row indices, or None if any of the fields is not in the table
+        """
+        try:
+            return np.array([self._index[name] for name in names], dtype=int)
+        except KeyError:
+            return None
+
+    def add_fields(self, names, coords):
+        """ Compute and add rows for new fields
+
+        Args:
+            names (list): Names of the fields, must not already be in the table
+            coords (astropy.coordinates.SkyCoord): Array-valued field centres in
+                the same order as `names`
+        """
+        if len(names) == 0:
+            return
+
+        assert not any(name in self._index for name in names), "Field already in table"
+
+        apparent = coords.transform_to(FK5(equinox=self._epoch))
+        ra = np.atleast_1d(apparent.ra.degree)
+        dec = np.atleast_1d(apparent.dec.degree)
+
+        self._ra = np.concatenate([self._ra, ra])
+        self._dec = np.concatenate([self._dec, dec])
+        self._alt = np.concatenate([self._alt, self._compute_altitudes(ra, dec)])
+
+        self._reindex(self.names + list(names))
+
+    def remove_fields(self, names):
+        """ Remove the rows of the named fields from the table
+
+        Args:
+            names (list): Names of the fields, unknown names are ignored
+        """
+        keep = np.ones(len(self.names), dtype=bool)
+        for name in names:
+            if name in self._index:
+                keep[self._index[name]] = False
+
+        self._ra = self._ra[keep]
+        self._dec = self._dec[keep]
+        self._alt = self._alt[keep]
+
+        self._reindex([name for name, k in zip(self.names, keep) if k])
+
+    def altitude(self, time, indices):
+        """ Altitude (degrees) of the fields at `time`, interpolated from the grid
+
+        Args:
+            time (astropy.time.Time): Time within the table
+            indices (numpy.array): Rows of the fields, see `get_indices`
+
+        Returns:
+            numpy.array: Altitude of each field
+        """
+        k, frac = self._locate(time)
+        alt = self._alt[indices]
+
+        return alt[:, k] + frac * (alt[:, k + 1] - alt[:, k])
+
+    def hour_angle(self, time, indices):
+        """ Hour angle (hours, -12 to 12) of the fields at `time`
+
+        Args:
+            time (astropy.time.Time): Time within the table
+            indices (numpy.array): Rows of the fields, see `get_indices`
+
+        Returns:
+            numpy.array: Hour angle of each field
+        """
+        k, frac = self._locate(time)
+        lst = self._lst[k] + frac * (self._lst[k + 1] - self._lst[k])
+
+        return _wrap_hours(lst - self._ra[indices] / 15.)
+
+    def seconds_to_meridian(self, time, indices):
+        """ Seconds from `time` until the next meridian transit of each field
+
+        Args:
+            time (astropy.time.Time): Time within the table
+            indices (numpy.array): Rows of the fields, see `get_indices`
+
+        Returns:
+            numpy.array: Seconds until transit
+        """
+        hours = np.mod(-self.hour_angle(time, indices), 24.)
+
+        return hours * 3600. / SIDEREAL_RATE
+
+    def seconds_to_set(self, time, indices, horizon):
+        """ Seconds from `time` until each field next drops below `horizon`
+
+        Fields that are already below `horizon` at `time` get zero, fields that
+        stay above it until the end of the table get NaN.
+
+        Args:
+            time (astropy.time.Time): Time within the table
+            indices (numpy.array): Rows of the fields, see `get_indices`
+            horizon (u.degree): Altitude defining the horizon
+
+        Returns:
+            numpy.array: Seconds until set
+        """
+        horizon = horizon.to(u.degree).value
+
+        k, frac = self._locate(time)
+
+        # Start the search from the interpolated altitude at `time`
+        alts = np.column_stack([self.altitude(time, indices), self._alt[indices, k + 1:]])
+        jds = np.concatenate([[time.jd], self._jd[k + 1:]])
+
+        below = alts <= horizon
+        first = np.argmax(below, axis=1)
+        rows = np.arange(len(alts))
+
+        # Linear interpolation of the crossing between the two bracketing points
+        prev = np.maximum(first - 1, 0)
+        alt0 = alts[rows, prev]
+        alt1 = alts[rows, first]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = np.where(alt0 > alt1, (alt0 - horizon) / (alt0 - alt1), 0.)
+        set_jd = jds[prev] + crossing * (jds[first] - jds[prev])
+
+        seconds = (set_jd - time.jd) * 86400.
+        seconds[first == 0] = 0.
+        seconds[~below[rows, first]] = np.nan
+
+        return seconds
+
+    def rise_set_meridian(self, horizon, indices=None):
+        """ Rise, set and meridian transit times of the fields within the table
+
+        Args:
+            horizon (u.degree): Altitude defining the horizon
+            indices (numpy.array, optional): Rows of the fields, see
+                `get_indices`, defaults to every field
+
+        Returns:
+            tuple: Three arrays of Julian dates (rise, set, meridian) with one
+                entry per field, NaN where the event does not happen inside the table
+        """
+        horizon = horizon.to(u.degree).value
+
+        alt = self._alt
+        ra = self._ra
+        if indices is not None:
+            alt = alt[indices]
+            ra = ra[indices]
+
+        above = alt > horizon
+        rise = _crossing_jd(self._jd, alt, horizon, above[:, 1:] & ~above[:, :-1])
+        set_ = _crossing_jd(self._jd, alt, horizon, ~above[:, 1:] & above[:, :-1])
+
+        ha = self._lst[np.newaxis, :] - ra[:, np.newaxis] / 15.
+        meridian = _crossing_jd(self._jd, _wrap_hours(ha), 0.,
+                                (np.floor(ha[:, 1:] / 24.) != np.floor(ha[:, :-1] / 24.)))
+
+        return rise, set_, meridian
+
+    def save(self, filename):
+        """ Save the table as a compressed numpy file
+
+        Args:
+            filename (str): Name of the `.npz` file to write
+        """
+        location = self.observer.location
+        np.savez_compressed(filename,
+                            names=np.array(self.names, dtype=str),
+                            ra=self._ra,
+                            dec=self._dec,
+                            alt=self._alt,
+                            jd=self._jd,
+                            lst=self._lst,
+                            epoch=self._epoch.jd,
+                            location=[location.lat.degree,
+                                      location.lon.degree,
+                                      location.height.to(u.meter).value])
+
+    @classmethod
+    def load(cls, filename, observer):
+        """ Load a table saved with `save`
+
+        Args:
+            filename (str): Name of the `.npz` file
+            observer (`astroplan.Observer`): The observer the table is for
+
+        Returns:
+            VisibilityTable: The table, or None if the file doesn't exist or was
+                computed for a different location
+        """
+        if not os.path.exists(filename):
+            return None
+
+        with np.load(filename) as data:
+            location = observer.location
+            if not np.allclose(data['location'], [location.lat.degree,
+                                                  location.lon.degree,
+                                                  location.height.to(u.meter).value]):
+                return None
+
+            table = cls.__new__(cls)
+            table.observer = observer
+            table._jd = data['jd']
+            table._lst = data['lst']
+            table._epoch = Time(float(data['epoch']), format='jd')
+            table._ra = data['ra']
+            table._dec = data['dec']
+            table._alt = data['alt']
+            table.start_time = Time(table._jd[0], format='jd')
+            table.end_time = Time(table._jd[-1], format='jd')
+            table._reindex(data['names'].tolist())
+
+        return table
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _reindex(self, names):
+        self.names = list(names)
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    def _locate(self, time):
+        """ Grid interval containing `time` and the fraction of the way through it """
+        k = np.searchsorted(self._jd, time.jd, side='right') - 1
+        k = int(np.clip(k, 0, len(self._jd) - 2))
+        frac = (time.jd - self._jd[k]) / (self._jd[k + 1] - self._jd[k])
+
+        return k, frac
+
+    def _compute_altitudes(self, ra, dec):
+        lat = self.observer.location.lat.radian
+        ha = np.radians(15. * self._lst[np.newaxis, :] - ra[:, np.newaxis])
+        dec = np.radians(dec)[:, np.newaxis]
+
+        sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(ha)
+
+        return np.degrees(np.arcsin(np.clip(sin_alt, -1, 1))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __str__(self):
+        return "Visibility of {} fields from {} to {}".format(
+            len(self), self.start_time.isot, self.end_time.isot)
+
+
+def _wrap_hours(hours):
+    """ Wrap an angle in hours to the range -12 to 12 """
+    return np.mod(hours + 12., 24.) - 12.
+
+
+def _crossing_jd(jd, values, level, crossed):
+    """ Interpolated Julian date of the first grid interval flagged in `crossed` """
+    has_crossing = crossed.any(axis=1)
+    k = np.argmax(crossed, axis=1)
+    rows = np.arange(len(values))
+
+    v0 = values[rows, k]
+    v1 = values[rows, k + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = np.where(v1 != v0, (level - v0) / (v1 - v0), 0.)
+
+    return np.where(has_crossing, jd[k] + frac * (jd[k + 1] - jd[k]), np.nan)
@@ -1,5 +1,5 @@
 from ....utils import error
-from time import sleep
+from ....utils.clock import sleep
 
 wait_interval = 15.
 timeout = 150.
@@ -1,7 +1,8 @@
-from time import sleep
+from ....utils.clock import sleep
 
 from ....images import Image
 from ....utils import error
+from ....utils.solver import PRIORITY_POINTING
 
 wait_interval = 3.
 timeout = 150.
@@ -69,7 +70,20 @@ def on_enter(event_data):
                 pointing_id, pointing_path = pocs.observatory.current_observation.last_exposure
                 pointing_image = Image(
                     pointing_path, location=pocs.observatory.earth_location)
-                pointing_image.solve_field()
+                solve_future = pointing_image.submit_solve(pocs.observatory.solver,
+                                                           priority=PRIORITY_POINTING)
+
+                # The solve is needed before tracking, but keep handling the
+                # messages while it runs so that it can be interrupted
+                while not solve_future.done():
+                    pocs.check_messages()
+                    if pocs.interrupted:
+                        pocs.observatory.solver.cancel(solve_future)
+                        raise error.SolveError("Pointing solve interrupted")
+
+                    sleep(wait_interval)
+
+                solve_future.result()
 
                 observation.pointing_image = pointing_image
 
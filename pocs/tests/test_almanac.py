@@ -0,0 +1,95 @@
+import pytest
+
+from astroplan import Observer
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from astropy.coordinates import SkyCoord
+from astropy.coordinates import get_moon
+from astropy.time import Time
+
+from pocs.utils.almanac import Almanac
+
+
+@pytest.fixture
+def observer(config):
+    loc = config['location']
+    location = EarthLocation(lon=loc['longitude'], lat=loc['latitude'], height=loc['elevation'])
+    return Observer(location=location, name="Test Observer", timezone=loc['timezone'])
+
+
+@pytest.fixture
+def almanac(observer):
+    return Almanac(observer)
+
+
+@pytest.mark.parametrize('time', ['2016-08-13 05:00:00', '2016-08-13 10:00:00'])
+def test_events(almanac, observer, time):
+    time = Time(time)
+    horizon = -18 * u.degree
+
+    assert almanac.is_night(time) == observer.is_night(time, horizon=horizon)
+
+    for t1, t2 in zip(almanac.tonight(time), observer.tonight(time, horizon=horizon)):
+        assert (t1 - t2).sec == pytest.approx(0, abs=60)
+
+    sun_set = almanac.sun_set_time(time)
+    assert (sun_set - observer.sun_set_time(time)).sec == pytest.approx(0, abs=60)
+
+    sun_rise = almanac.sun_rise_time(time, which='next')
+    assert (sun_rise - observer.sun_rise_time(time, which='next')).sec == \
+        pytest.approx(0, abs=60)
+
+    twilight = almanac.twilight_evening(time, which='previous')
+    expected = observer.twilight_evening_astronomical(time, which='previous')
+    assert (twilight - expected).sec == pytest.approx(0, abs=60)
+
+
+def test_moon(almanac, observer):
+    time = Time('2016-08-13 10:00:00')
+    field = SkyCoord('17h10m23s -15d43m30s')
+
+    moon = get_moon(time, observer.location)
+
+    assert almanac.moon(time).separation(field).degree == \
+        pytest.approx(moon.separation(field).degree, abs=0.01)
+    assert almanac.moon_alt(time).value == \
+        pytest.approx(observer.moon_altaz(time).alt.degree, abs=0.01)
+    assert almanac.moon_illumination(time) == \
+        pytest.approx(observer.moon_illumination(time), abs=1e-3)
+
+
+def test_status(almanac):
+    status = almanac.status(Time('2016-08-13 10:00:00'))
+
+    assert 'local_evening_astro_time' in status
+    assert 'local_moon_phase' in status
+
+
+def test_grid_rebuild(almanac):
+    time = Time('2016-08-13 10:00:00')
+
+    almanac.sun_alt(time)
+    grid = almanac._jd
+
+    almanac.sun_alt(time + 12 * u.hour)
+    assert almanac._jd is grid
+
+    almanac.sun_alt(time + 2 * u.day)
+    assert almanac._jd is not grid
+
+    with pytest.raises(ValueError):
+        almanac.sun_set_time(time, which='tomorrow')
+
+
+def test_no_event():
+    # The Sun doesn't set near the pole in summer
+    location = EarthLocation(lon=15 * u.degree, lat=80 * u.degree, height=0 * u.meter)
+    almanac = Almanac(Observer(location=location))
+    time = Time('2016-06-21 12:00:00')
+
+    for which in ['next', 'previous', 'nearest']:
+        with pytest.raises(ValueError):
+            almanac.get_event(time, '_sun_set', which=which)
+
+    with pytest.raises(ValueError):
+        almanac.get_event(time, '_sun_set', which='last')
@@ -3,6 +3,7 @@ import yaml
 
 from astropy import units as u
 from astropy.coordinates import EarthLocation
+from astropy.time import Time
 
 from astroplan import Observer
 
@@ -208,3 +209,102 @@ def test_remove_field(scheduler):
 
     scheduler.remove_observation('HD 189733')
     assert orig_keys != list(scheduler.observations.keys())
+
+
+def test_reload_fields_file(field_list, observer, constraints, tmpdir):
+    fields_file = tmpdir.join('fields.yaml')
+    fields_file.write(yaml.dump(field_list))
+
+    scheduler = Scheduler(observer, fields_file=str(fields_file),
+                          constraints=constraints, watch_fields_file=True)
+
+    # Nothing to do until the file changes
+    assert scheduler.reload_field_list() is False
+
+    unchanged = scheduler.observations['HD 209458']
+    current = scheduler.observations['HD 189733']
+    scheduler.current_observation = current
+    current.current_exp = 5
+
+    field_list = [config for config in field_list if config['name'] != 'M44']
+    field_list[0]['priority'] = 500
+    field_list.append({'name': 'Hat-P-16', 'position': '00h38m17.59s +42d27m47.2s'})
+
+    fields_file.write(yaml.dump(field_list))
+    fields_file.setmtime(fields_file.mtime() + 10)
+
+    assert scheduler.reload_field_list() is True
+
+    assert 'M44' not in scheduler.observations
+    assert 'Hat-P-16' in scheduler.observations
+    assert scheduler.observations['HD 209458'] is unchanged
+
+    # The current observation is updated but keeps its progress
+    assert scheduler.current_observation is scheduler.observations['HD 189733']
+    assert scheduler.current_observation.priority == 500
+    assert scheduler.current_observation.current_exp == 5
+    assert len(scheduler.observed_list) == 1
+
+
+def test_reload_moved_field(field_list, observer, constraints, tmpdir):
+    fields_file = tmpdir.join('fields.yaml')
+    fields_file.write(yaml.dump(field_list))
+
+    scheduler = Scheduler(observer, fields_file=str(fields_file), constraints=constraints,
+                          watch_fields_file=True, visibility_dir=str(tmpdir))
+
+    time = Time('2016-08-13 10:00:00')
+    visibility = scheduler.get_visibility(time)
+    row = visibility.get_indices(['HD 189733'])
+    old_altitude = visibility.altitude(time, row)[0]
+
+    # Same name, another position
+    field_list[0]['position'] = '05h35m17.3s -05d23m28s'
+    fields_file.write(yaml.dump(field_list))
+    fields_file.setmtime(fields_file.mtime() + 10)
+    assert scheduler.reload_field_list() is True
+
+    visibility = scheduler.get_visibility(time)
+    row = visibility.get_indices(['HD 189733'])
+    new_altitude = visibility.altitude(time, row)[0]
+    assert abs(new_altitude - old_altitude) > 1
+
+    expected = scheduler.observer.altaz(time, scheduler.observations['HD 189733'].field).alt
+    assert new_altitude == pytest.approx(expected.degree, abs=0.5)
+
+    # The saved table has the new row too
+    scheduler._visibility = None
+    visibility = scheduler.get_visibility(time)
+    row = visibility.get_indices(['HD 189733'])
+    assert visibility.altitude(time, row)[0] == pytest.approx(new_altitude)
+
+
+def test_reload_invalid_field(field_list, observer, constraints, tmpdir):
+    fields_file = tmpdir.join('fields.yaml')
+    fields_file.write(yaml.dump(field_list))
+
+    scheduler = Scheduler(observer, fields_file=str(fields_file), constraints=constraints,
+                          watch_fields_file=True)
+
+    # Rejected by `add_observation`
+    fields_file.write(yaml.dump(field_list + [{'name': 'Hat-P-16',
+                                               'position': '00h38m17.59s +42d27m47.2s',
+                                               'priority': 0}]))
+    fields_file.setmtime(fields_file.mtime() + 10)
+
+    assert scheduler.reload_field_list() is False
+    assert 'Hat-P-16' not in scheduler.observations
+    assert len(scheduler.observations) == len(field_list)
+
+
+def test_reload_not_watched(field_list, observer, constraints, tmpdir):
+    fields_file = tmpdir.join('fields.yaml')
+    fields_file.write(yaml.dump(field_list))
+
+    scheduler = Scheduler(observer, fields_file=str(fields_file), constraints=constraints)
+
+    fields_file.write(yaml.dump(field_list[:2]))
+    fields_file.setmtime(fields_file.mtime() + 10)
+
+    assert scheduler.reload_field_list() is False
+    assert len(scheduler.observations) == len(field_list)
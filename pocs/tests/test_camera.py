@@ -230,6 +230,19 @@ def test_exposure(camera, tmpdir):
     assert header['IMAGETYP'] == 'Light Frame'
 
 
+def test_take_calibration(camera, tmpdir):
+    """
+    Tests taking bias frames and combining them into a master bias
+    """
+    directory = str(tmpdir.mkdir('bias'))
+    master_file = camera.take_calibration('bias', num_frames=3, directory=directory)
+    assert os.path.exists(master_file)
+    assert os.listdir(directory) == [os.path.basename(master_file)]
+    header = fits.getheader(master_file)
+    assert header['IMAGETYP'] == 'Master Bias'
+    assert header['NCOMBINE'] == 3
+
+
 def test_exposure_blocking(camera, tmpdir):
     """
     Tests blocking take_exposure functionality. At least for now only SBIG cameras do this.
@@ -0,0 +1,72 @@
+import os
+import pytest
+import shutil
+
+import numpy as np
+
+from astropy.io import fits
+
+from pocs.utils import compression
+from pocs.utils import error
+
+
+@pytest.fixture
+def fits_file(data_dir, tmpdir):
+    fname = str(tmpdir.join('solved.fits'))
+    shutil.copyfile('{}/solved.fits'.format(data_dir), fname)
+    return fname
+
+
+def test_compress_decompress(fits_file):
+    data = fits.getdata(fits_file)
+    header = fits.getheader(fits_file)
+    size = os.path.getsize(fits_file)
+
+    compressed = compression.compress(fits_file)
+    assert compressed == fits_file.replace('.fits', '.fits.fz')
+    assert not os.path.exists(fits_file)
+    assert os.path.getsize(compressed) < size
+
+    uncompressed = compression.decompress(compressed)
+    assert uncompressed == fits_file
+    assert not os.path.exists(compressed)
+
+    assert np.array_equal(fits.getdata(uncompressed), data)
+    assert fits.getheader(uncompressed)['DATE-OBS'] == header['DATE-OBS']
+
+
+def test_compress_keep(fits_file):
+    compressed = compression.compress(fits_file, compression_type='HCOMPRESS_1', remove=False)
+
+    assert os.path.exists(fits_file)
+    assert np.array_equal(fits.getdata(compressed, ext=1), fits.getdata(fits_file))
+
+
+def test_compress_bad_type(fits_file):
+    with pytest.raises(AssertionError):
+        compression.compress(fits_file, compression_type='FOO')
+
+
+def test_compress_no_data(data_dir, tmpdir):
+    fname = str(tmpdir.join('empty.fits'))
+    fits.PrimaryHDU().writeto(fname)
+
+    with pytest.raises(error.PanError):
+        compression.compress(fname)
+
+
+def test_compress_dir(fits_file, tmpdir):
+    for i in range(3):
+        shutil.copyfile(fits_file, str(tmpdir.join('copy{}.fits'.format(i))))
+    fits.PrimaryHDU().writeto(str(tmpdir.join('empty.fits')))
+
+    stats = compression.compress_dir(str(tmpdir), max_workers=2)
+
+    assert len(stats['compressed']) == 4
+    assert list(stats['failed']) == [str(tmpdir.join('empty.fits'))]
+    assert stats['bytes_out'] < stats['bytes_in']
+    assert stats['ratio'] > 1
+
+    # Only the files that were compressed count towards the throughput
+    bytes_compressed = stats['bytes_in'] - os.path.getsize(str(tmpdir.join('empty.fits')))
+    assert stats['mb_per_second'] * stats['seconds'] == pytest.approx(bytes_compressed / 1e6)
@@ -197,3 +197,41 @@ def test_moon_avoidance(observer):
 
     assert veto1 is False and veto2 is False
     assert score2 > score1
+
+
+def test_base_get_scores_not_implemented(observer, observation):
+    c = BaseConstraint()
+
+    time = Time('2016-08-13 10:00:00')
+
+    with pytest.raises(NotImplementedError):
+        c.get_scores(time, observer, [observation])
+
+
+def test_get_scores_matches_get_score(observer):
+    time = Time('2016-08-13 10:00:00')
+
+    end_of_night = observer.tonight(time=time, horizon=-18 * u.degree)[-1]
+    moon = get_moon(time, observer.location)
+
+    observations = list()
+    for field_config in field_list:
+        field_config = dict(field_config)
+        if 'exp_time' in field_config:
+            field_config['exp_time'] = field_config['exp_time'] * u.second
+
+        observations.append(Observation(Field(**field_config), **field_config))
+
+    for constraint in [Altitude(18 * u.degree), Duration(30 * u.degree), MoonAvoidance()]:
+        vetoes, scores = constraint.get_scores(time, observer, observations,
+                                               end_of_night=end_of_night, moon=moon)
+
+        assert len(vetoes) == len(scores) == len(observations)
+
+        for observation, veto, score in zip(observations, vetoes, scores):
+            veto1, score1 = constraint.get_score(time, observer, observation,
+                                                 end_of_night=end_of_night, moon=moon)
+
+            assert veto == veto1
+            if not veto1:
+                assert score == pytest.approx(score1)
@@ -4,12 +4,14 @@ import yaml
 
 from astropy import units as u
 from astropy.coordinates import EarthLocation
+from astropy.coordinates import get_moon
 from astropy.time import Time
 
 from astroplan import Observer
 
 from pocs.scheduler.dispatch import Scheduler
 
+from pocs.scheduler.constraint import BaseConstraint
 from pocs.scheduler.constraint import Duration
 from pocs.scheduler.constraint import MoonAvoidance
 
@@ -201,3 +203,175 @@ def test_observed_list(scheduler):
     scheduler.reset_observed_list()
 
     assert len(scheduler.observed_list) == 0
+
+
+def test_batch_scores_match(scheduler):
+    time = Time('2016-08-13 10:00:00')
+
+    common_properties = {
+        'end_of_night': scheduler.observer.tonight(time=time, horizon=-18 * u.degree)[-1],
+        'moon': get_moon(time, scheduler.observer.location)
+    }
+
+    scores = scheduler._get_scores(time, common_properties)
+    batch_scores = scheduler._get_batch_scores(time, common_properties)
+
+    assert scores.keys() == batch_scores.keys()
+    for obs_name, score in scores.items():
+        assert batch_scores[obs_name] == pytest.approx(score)
+
+
+def test_fallback_without_batch_scores(field_list, observer):
+    class SimpleConstraint(BaseConstraint):
+
+        def get_score(self, time, observer, observation, **kwargs):
+            return False, 1.0
+
+    scheduler = Scheduler(observer, fields_list=field_list,
+                          constraints=[SimpleConstraint()])
+
+    time = Time('2016-08-13 10:00:00')
+    best = scheduler.get_observation(time=time, show_all=True)
+
+    assert len(best) == len(field_list)
+
+
+def test_field_coords(scheduler):
+    assert len(scheduler.field_coords) == len(scheduler.observations)
+
+    scheduler.remove_observation('HD 189733')
+    assert len(scheduler.field_coords) == len(scheduler.observations)
+
+    scheduler.add_observation({'name': 'HD 189733', 'position': '20h00m43.7135s +22d42m39.0645s'})
+    assert len(scheduler.field_coords) == len(scheduler.observations)
+
+
+def test_visibility_scores_match(scheduler):
+    time = Time('2016-08-13 10:00:00')
+
+    common_properties = {
+        'end_of_night': scheduler.observer.tonight(time=time, horizon=-18 * u.degree)[-1],
+        'moon': get_moon(time, scheduler.observer.location)
+    }
+
+    scores = scheduler._get_batch_scores(time, common_properties)
+
+    common_properties['visibility'] = scheduler.get_visibility(time)
+    visibility_scores = scheduler._get_batch_scores(time, common_properties)
+
+    assert scores.keys() == visibility_scores.keys()
+    for obs_name, score in scores.items():
+        assert visibility_scores[obs_name] == pytest.approx(score, abs=1e-2)
+
+
+def test_visibility_follows_observations(scheduler, tmpdir):
+    scheduler._visibility_dir = str(tmpdir)
+
+    time = Time('2016-08-13 10:00:00')
+    visibility = scheduler.get_visibility(time)
+    assert set(visibility.names) == set(scheduler.observations)
+    assert len(tmpdir.listdir()) == 1
+
+    scheduler.remove_observation('HD 189733')
+    scheduler.add_observation({'name': 'Hat-P-16', 'position': '00h38m17.59s +42d27m47.2s'})
+
+    visibility = scheduler.get_visibility(time + 1 * u.hour)
+    assert set(visibility.names) == set(scheduler.observations)
+
+    # A restart loads the saved table
+    scheduler._visibility = None
+    assert scheduler.get_visibility(time + 2 * u.hour).names == visibility.names
+
+
+def test_candidates_keep_valid_observations(scheduler):
+    time = Time('2016-08-13 10:00:00')
+
+    common_properties = {
+        'end_of_night': scheduler.observer.tonight(time=time, horizon=-18 * u.degree)[-1],
+        'moon': get_moon(time, scheduler.observer.location)
+    }
+
+    names = list(scheduler.observations.keys())
+    candidates = [names[i] for i in scheduler._get_candidates(time, common_properties)]
+
+    # Fields below the horizon are dropped but nothing that can be scheduled
+    assert len(candidates) < len(names)
+    assert set(scheduler._get_batch_scores(time, common_properties)).issubset(candidates)
+
+    scheduler.remove_observation(candidates[0])
+    assert len(scheduler.field_index) == len(scheduler.observations)
+
+
+def test_sharded_scores_match(field_list, observer, constraints):
+    scheduler = Scheduler(observer, fields_list=field_list, constraints=constraints,
+                          scoring_processes=2)
+
+    time = Time('2016-08-13 10:00:00')
+
+    common_properties = {
+        'end_of_night': scheduler.observer.tonight(time=time, horizon=-18 * u.degree)[-1],
+        'moon': get_moon(time, scheduler.observer.location)
+    }
+
+    try:
+        scores = scheduler._get_scores(time, common_properties)
+        sharded_scores = scheduler._get_batch_scores(time, common_properties)
+
+        assert scores.keys() == sharded_scores.keys()
+        for obs_name, score in scores.items():
+            assert sharded_scores[obs_name] == pytest.approx(score, abs=1e-2)
+
+        # Changes are sent to the workers before the next scoring
+        scheduler.remove_observation('HD 189733')
+        assert 'HD 189733' not in scheduler._get_batch_scores(time, common_properties)
+    finally:
+        scheduler.close()
+
+
+def test_sharded_scorer_errors(field_list, observer, constraints):
+    scheduler = Scheduler(observer, fields_list=field_list, constraints=constraints,
+                          scoring_processes=2)
+
+    time = Time('2016-08-13 10:00:00')
+
+    common_properties = {
+        'end_of_night': scheduler.observer.tonight(time=time, horizon=-18 * u.degree)[-1],
+        'moon': get_moon(time, scheduler.observer.location)
+    }
+
+    try:
+        scores = scheduler._get_batch_scores(time, common_properties)
+
+        # A change that fails in one worker is raised by the next scoring
+        scheduler._scorer._pending_add[0].append(('Bad field', 60., 100., 'nan?', 0.))
+        with pytest.raises(ValueError):
+            scheduler._get_batch_scores(time, common_properties)
+
+        # The replies of the other workers were read, the next scoring is in step
+        assert scheduler._get_batch_scores(time, common_properties) == scores
+    finally:
+        scheduler.close()
+
+
+def test_sharded_changes_before_scoring(field_list, observer, constraints):
+    scheduler = Scheduler(observer, fields_list=field_list, constraints=constraints,
+                          scoring_processes=2)
+
+    time = Time('2016-08-13 10:00:00')
+
+    common_properties = {
+        'end_of_night': scheduler.observer.tonight(time=time, horizon=-18 * u.degree)[-1],
+        'moon': get_moon(time, scheduler.observer.location)
+    }
+
+    try:
+        # Added, removed and added again before the workers were sent anything
+        scheduler.remove_observation('HD 189733')
+        scheduler.remove_observation('KIC 8462852')
+        scheduler.add_observation(field_list[0])
+
+        sharded_scores = scheduler._get_batch_scores(time, common_properties)
+        assert 'KIC 8462852' not in sharded_scores
+        assert sharded_scores.keys() == scheduler._get_scores(time, common_properties).keys()
+    finally:
+        scheduler.close()
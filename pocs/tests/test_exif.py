@@ -0,0 +1,64 @@
+import pytest
+import shutil
+import threading
+
+from pocs.utils import error
+from pocs.utils.exif import ExifTool
+from pocs.utils.exif import get_exiftool
+
+pytestmark = pytest.mark.skipif(shutil.which('exiftool') is None,
+                                reason="exiftool is not installed")
+
+
+@pytest.fixture
+def solved_fits_file(data_dir):
+    return '{}/solved.fits'.format(data_dir)
+
+
+@pytest.fixture
+def exiftool():
+    session = ExifTool()
+    yield session
+    session.close()
+
+
+def test_get_metadata(exiftool, solved_fits_file):
+    metadata = exiftool.get_metadata(solved_fits_file)
+    assert metadata['FileName'] == 'solved.fits'
+    assert exiftool.is_running
+
+    batch = exiftool.get_metadata([solved_fits_file] * 3)
+    assert len(batch) == 3
+    assert all(m['FileName'] == 'solved.fits' for m in batch)
+
+
+def test_restart(exiftool, solved_fits_file):
+    exiftool.get_metadata(solved_fits_file)
+    exiftool.close()
+    assert not exiftool.is_running
+
+    assert exiftool.get_metadata(solved_fits_file)['FileName'] == 'solved.fits'
+
+
+def test_threads(exiftool, solved_fits_file):
+    results = list()
+
+    def read():
+        results.append(exiftool.get_metadata(solved_fits_file)['FileName'])
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['solved.fits'] * 8
+
+
+def test_missing_executable(solved_fits_file):
+    with pytest.raises(error.InvalidSystemCommand):
+        ExifTool('not-exiftool').get_metadata(solved_fits_file)
+
+
+def test_shared_session():
+    assert get_exiftool() is get_exiftool()
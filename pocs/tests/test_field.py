@@ -1,5 +1,7 @@
 import pytest
 
+from astroplan import FixedTarget
+
 from pocs.scheduler.field import Field
 
 
@@ -21,3 +23,37 @@ def test_create_field_name():
 def test_create_field_Observation_name():
     field = Field('Test Field - 32b', '20h00m43.7135s +22d42m39.0645s')
     assert field.field_name == 'TestField32B'
+
+
+def test_create_field_lazy():
+    field = Field('Test Field', 'Bad Position', lazy=True)
+    assert field.name == 'Test Field'
+
+    with pytest.raises(ValueError):
+        field.coord
+
+
+def test_create_field_lazy_kwargs(monkeypatch):
+    target_kwargs = list()
+    init = FixedTarget.__init__
+
+    def record_init(self, coord, name=None, **kwargs):
+        target_kwargs.append(kwargs)
+        init(self, coord, name=name, **kwargs)
+
+    monkeypatch.setattr(FixedTarget, '__init__', record_init)
+
+    field = Field('Test Field', '20h00m43.7135s +22d42m39.0645s', lazy=True, priority=10)
+    assert target_kwargs == []
+
+    # Passed on once the coordinates are made
+    assert field.coord.ra.degree == pytest.approx(300.182, abs=1e-3)
+    assert target_kwargs == [{'priority': 10}]
+
+
+def test_create_field_context():
+    context = Field('Context Field', '20h00m43.7135s +22d42m39.0645s')
+    field = Field('Test Field', '20h00m43.7135s +22d42m39.0645s', context=context, lazy=True)
+
+    assert field.db is context.db
+    assert field.coord.separation(context.coord).value == pytest.approx(0)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from astropy.coordinates import SkyCoord
+from astropy.coordinates import get_moon
+from astropy.time import Time
+
+from pocs.scheduler.field_index import FieldIndex
+
+
+@pytest.fixture
+def coords():
+    rng = np.random.RandomState(42)
+    ra = rng.uniform(0, 360, 1000)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, 1000)))
+
+    return SkyCoord(ra=ra * u.degree, dec=dec * u.degree, frame='icrs')
+
+
+@pytest.fixture
+def field_index(coords):
+    return FieldIndex(coords)
+
+
+def test_query_cap(field_index, coords):
+    center = SkyCoord('12h00m00s +30d00m00s')
+    radius = 40 * u.degree
+
+    expected = np.flatnonzero(center.separation(coords) <= radius)
+
+    assert len(field_index) == len(coords)
+    np.testing.assert_array_equal(field_index.query_cap(center, radius), expected)
+
+
+def test_query_whole_sky(field_index, coords):
+    center = SkyCoord('12h00m00s +30d00m00s')
+
+    assert len(field_index.query_cap(center, 180 * u.degree)) == len(coords)
+
+
+def test_filter_outside(field_index, coords):
+    center = SkyCoord('02h00m00s -10d00m00s')
+    radius = 15 * u.degree
+
+    indices = np.arange(0, len(coords), 2)
+    outside = field_index.filter(indices, center, radius, inside=False)
+
+    expected = indices[center.separation(coords[indices]) > radius]
+    np.testing.assert_array_equal(outside, expected)
+
+
+def test_empty_index():
+    field_index = FieldIndex(SkyCoord(ra=[] * u.degree, dec=[] * u.degree))
+
+    assert len(field_index) == 0
+    assert len(field_index.query_cap(SkyCoord('0d 0d'), 10 * u.degree)) == 0
+
+
+def test_query_cap_moon(field_index, coords):
+    # `get_moon` has a distance, the cap must be around the Moon seen from the site
+    location = EarthLocation(lon=-155.5761 * u.degree, lat=19.5362 * u.degree,
+                             height=3400 * u.meter)
+    moon = get_moon(Time('2016-08-13 10:00:00'), location)
+    radius = 20 * u.degree
+
+    expected = np.flatnonzero(moon.separation(coords) <= radius)
+    assert len(expected) > 0
+
+    np.testing.assert_array_equal(field_index.query_cap(moon, radius), expected)
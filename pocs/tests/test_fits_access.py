@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import shutil
+
+from astropy.io import fits
+
+from pocs.utils import compression
+from pocs.utils import error
+from pocs.utils import fits_access
+from pocs.utils import images
+
+
+@pytest.fixture
+def solved_fits_file(data_dir):
+    return '{}/solved.fits'.format(data_dir)
+
+
+def test_header(solved_fits_file):
+    header = fits_access.read_header(solved_fits_file)
+
+    assert header == fits.getheader(solved_fits_file)
+
+
+def test_crop(solved_fits_file):
+    data = fits.getdata(solved_fits_file)
+
+    for center in [None, (120, 80)]:
+        crop = fits_access.read_crop(solved_fits_file, box_width=100, center=center)
+        assert np.array_equal(crop, images.crop_data(data, box_width=100, center=center))
+
+
+def test_fits_file(solved_fits_file):
+    data = fits.getdata(solved_fits_file)
+
+    with fits_access.FitsFile(solved_fits_file) as f:
+        assert f.shape == data.shape
+        assert np.array_equal(f.section[10:20, 30:40], data[10:20, 30:40])
+        assert np.array_equal(f.data, data)
+
+
+def test_unsigned(tmpdir):
+    # Camera frames are uint16, stored with BZERO = 32768
+    data = np.random.RandomState(0).randint(0, 65536, size=(300, 200)).astype(np.uint16)
+    fname = str(tmpdir.join('unsigned.fits'))
+    fits.PrimaryHDU(data).writeto(fname)
+    assert fits.getheader(fname)['BZERO'] == 32768
+
+    with fits_access.FitsFile(fname) as f:
+        assert f.section[10:20, 30:40].dtype == np.uint16
+        assert np.array_equal(f.section[10:20, 30:40], data[10:20, 30:40])
+        assert np.array_equal(f.crop(box_width=100), images.crop_data(data, box_width=100))
+        assert np.array_equal(f.data, data)
+
+
+def test_compressed(solved_fits_file, tmpdir):
+    fname = str(tmpdir.join('solved.fits'))
+    shutil.copyfile(solved_fits_file, fname)
+    fz_fname = compression.compress(fname)
+
+    assert fits_access.read_header(fz_fname)['DATE-OBS'] == \
+        fits.getheader(solved_fits_file)['DATE-OBS']
+    assert np.array_equal(fits_access.read_crop(fz_fname, box_width=50),
+                          images.crop_data(fits.getdata(solved_fits_file), box_width=50))
+
+
+def test_no_image(tmpdir):
+    fname = str(tmpdir.join('empty.fits'))
+    fits.PrimaryHDU().writeto(fname)
+
+    with pytest.raises(error.PanError):
+        fits_access.FitsFile(fname)
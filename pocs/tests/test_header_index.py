@@ -0,0 +1,112 @@
+import os
+import pytest
+import shutil
+
+from astropy.io import fits
+
+from pocs.utils import compression
+from pocs.utils.header_index import HeaderIndex
+
+
+def make_frame(root, data_dir, field, camera, seq_time, num, date_obs, imagetyp='Light Frame'):
+    dir_name = os.path.join(root, field, camera, seq_time)
+    os.makedirs(dir_name, exist_ok=True)
+
+    fname = os.path.join(dir_name, '{:03d}.fits'.format(num))
+    shutil.copyfile(os.path.join(data_dir, 'solved.fits'), fname)
+    with fits.open(fname, 'update') as hdu_list:
+        header = hdu_list[0].header
+        header.set('SEQID', 'PAN000_{}_{}'.format(camera, seq_time))
+        header.set('IMAGEID', 'PAN000_{}_{:03d}'.format(camera, num))
+        header.set('IMAGETYP', imagetyp)
+        header.set('DATE-OBS', date_obs)
+        header.set('EXPTIME', 120.)
+
+    return fname
+
+
+@pytest.fixture
+def archive(data_dir, tmpdir):
+    root = str(tmpdir.mkdir('fields'))
+
+    make_frame(root, data_dir, 'Wasp33', 'ee04d1', '20180101T120000', 0, '2018-01-01T12:00:00')
+    make_frame(root, data_dir, 'Wasp33', 'ee04d1', '20180101T120000', 1, '2018-01-01T12:02:00')
+    make_frame(root, data_dir, 'Wasp33', '14d3bd', '20180101T120000', 0, '2018-01-01T12:00:00')
+    fname = make_frame(root, data_dir, 'M42', 'ee04d1', '20180102T120000', 0,
+                       '2018-01-02T12:00:00', imagetyp='Dark Frame')
+    compression.compress(fname)
+
+    return root
+
+
+@pytest.fixture
+def header_index(archive, tmpdir):
+    index = HeaderIndex(str(tmpdir.join('header_index.sqlite')), root=archive)
+    yield index
+    index.close()
+
+
+def test_update(header_index, archive):
+    stats = header_index.update()
+    assert stats['added'] == 4
+    assert stats['updated'] == 0
+    assert stats['failed'] == {}
+    assert len(header_index) == 4
+
+    # Only new and changed files are read
+    stats = header_index.update()
+    assert stats['added'] == 0
+    assert stats['unchanged'] == 4
+
+    fname = os.path.join(archive, 'Wasp33', 'ee04d1', '20180101T120000', '001.fits')
+    fits.setval(fname, 'IMAGETYP', value='Flat Frame')
+    os.utime(fname, (0, 0))
+    os.remove(os.path.join(archive, 'Wasp33', '14d3bd', '20180101T120000', '000.fits'))
+
+    stats = header_index.update()
+    assert stats['updated'] == 1
+    assert stats['removed'] == 1
+    assert stats['unchanged'] == 2
+    assert len(header_index) == 3
+    assert header_index.query(imagetyp='Flat Frame')[0]['path'] == fname
+
+
+def test_update_directory(header_index, archive):
+    stats = header_index.update(os.path.join(archive, 'M42'))
+    assert stats['added'] == 1
+    assert len(header_index) == 1
+
+    # Files outside the directory are left alone
+    stats = header_index.update(os.path.join(archive, 'Wasp33'))
+    assert stats['added'] == 3
+    assert stats['removed'] == 0
+    assert len(header_index) == 4
+
+
+def test_query(header_index):
+    header_index.update()
+
+    frames = header_index.query(field='Wasp33')
+    assert len(frames) == 3
+    assert [f['date_obs'] for f in frames] == sorted(f['date_obs'] for f in frames)
+    assert frames[0]['header']['EXPTIME'] == 120.
+
+    frames = header_index.query(field='Wasp33', camera='ee04d1')
+    assert [f['imageid'] for f in frames] == ['PAN000_ee04d1_000', 'PAN000_ee04d1_001']
+    assert frames[0]['seq_time'] == '20180101T120000'
+
+    assert len(header_index.query(seqid='PAN000_14d3bd_20180101T120000')) == 1
+    assert len(header_index.query(start='2018-01-01T12:01:00', end='2018-01-02')) == 1
+    assert len(header_index.query(limit=2)) == 2
+
+    # Compressed files are indexed from the header of the image
+    frames = header_index.query(imagetyp='Dark Frame')
+    assert len(frames) == 1
+    assert frames[0]['path'].endswith('.fits.fz')
+    assert frames[0]['field'] == 'M42'
+
+    assert header_index.distinct('field') == ['M42', 'Wasp33']
+    assert header_index.distinct('camera', field='Wasp33') == ['14d3bd', 'ee04d1']
+
+    with pytest.raises(AssertionError):
+        header_index.distinct('header')
@@ -0,0 +1,136 @@
+import json
+import os
+import pytest
+import shutil
+
+from pocs.utils import housekeeping
+from pocs.utils.header_index import HeaderIndex
+
+
+@pytest.fixture
+def observation_dirs(data_dir, tmpdir):
+    dir_names = list()
+    for i in range(3):
+        dir_name = str(tmpdir.mkdir('field{}'.format(i)).mkdir('cam').mkdir('20160813T050000'))
+        shutil.copyfile(os.path.join(data_dir, 'solved.fits'),
+                        os.path.join(dir_name, 'image.fits'))
+        open(os.path.join(dir_name, 'image.solved'), 'w').close()
+        dir_names.append(dir_name)
+
+    return dir_names
+
+
+@pytest.fixture
+def housekeeper(tmpdir):
+    return housekeeping.Housekeeper(str(tmpdir.join('housekeeping.journal')), max_workers=2,
+                                    compress_workers=1)
+
+
+def test_run(housekeeper, observation_dirs):
+    progress = list()
+    report = housekeeper.run(observation_dirs,
+                             progress=lambda *args: progress.append(args))
+
+    num_tasks = len(observation_dirs) * len(housekeeping.STAGES)
+    assert report['run'] == num_tasks
+    assert report['skipped'] == 0
+    assert report['failed'] == {}
+    assert set(report['stage_seconds']) == set(housekeeping.STAGES)
+    assert len(progress) == num_tasks
+    assert progress[-1][:2] == (num_tasks, num_tasks)
+
+    for dir_name in observation_dirs:
+        assert set(os.listdir(dir_name)) == {'image.fits.fz', housekeeping.INDEX_FILE}
+
+        with open(os.path.join(dir_name, housekeeping.INDEX_FILE)) as f:
+            index = json.load(f)
+        assert 'DATE-OBS' in index['files']['image.fits.fz']
+
+    assert housekeeper.pending_directories() == []
+
+    # Nothing left to do
+    report = housekeeper.run(observation_dirs)
+    assert report['run'] == 0
+    assert report['skipped'] == num_tasks
+
+
+def test_header_index(observation_dirs, tmpdir):
+    header_index = HeaderIndex(str(tmpdir.join('header_index.sqlite')), root=str(tmpdir))
+    housekeeper = housekeeping.Housekeeper(str(tmpdir.join('housekeeping.journal')),
+                                           header_index=header_index)
+    housekeeper.run(observation_dirs)
+
+    frames = header_index.query()
+    assert [os.path.dirname(f['path']) for f in frames] == sorted(observation_dirs)
+    assert frames[0]['field'] == 'field0'
+    header_index.close()
+
+
+def test_resume(housekeeper, observation_dirs):
+    dir_name = observation_dirs[0]
+
+    # An interrupted run, which only compressed the files
+    housekeeper._record(dir_name, None, 'queued')
+    housekeeper._record(dir_name, 'compress', 'done')
+    assert housekeeper.pending_directories() == [dir_name]
+
+    # The pending directory is included without being given
+    report = housekeeper.run()
+    assert report['skipped'] == 1
+    assert report['run'] == len(housekeeping.STAGES) - 1
+
+    # Not compressed by this run
+    assert os.path.exists(os.path.join(dir_name, 'image.fits'))
+    assert not os.path.exists(os.path.join(dir_name, 'image.solved'))
+    assert housekeeper.pending_directories() == []
+
+
+def test_failed_stage(housekeeper, observation_dirs, monkeypatch):
+    def fail(dir_name, **kwargs):
+        raise OSError("Disk full")
+
+    monkeypatch.setattr(housekeeping.img_utils, 'compress_observation_dir', fail)
+
+    report = housekeeper.run(observation_dirs[:1])
+    task = (observation_dirs[0], 'compress')
+    assert report['failed'][task] == "Disk full"
+    assert (observation_dirs[0], 'index') in report['failed']
+    assert housekeeper.pending_directories() == observation_dirs[:1]
+
+
+def test_failed_compression(housekeeper, observation_dirs):
+    dir_name = observation_dirs[0]
+    with open(os.path.join(dir_name, 'broken.fits'), 'w') as f:
+        f.write('Not a FITS file')
+
+    report = housekeeper.run([dir_name])
+    assert (dir_name, 'compress') in report['failed']
+    assert 'compress' not in housekeeper.get_done()[dir_name]
+    assert housekeeper.pending_directories() == [dir_name]
+
+
+def test_given_up(housekeeper, observation_dirs, monkeypatch):
+    def fail(dir_name, **kwargs):
+        raise OSError("Disk full")
+
+    monkeypatch.setattr(housekeeping.img_utils, 'compress_observation_dir', fail)
+
+    task = (observation_dirs[0], 'compress')
+    for _ in range(housekeeper.max_attempts):
+        report = housekeeper.run(observation_dirs[:1])
+        assert task in report['failed']
+
+    # Not queued again, nor run when given
+    assert housekeeper.pending_directories() == []
+    report = housekeeper.run(observation_dirs[:1])
+    assert report['given_up'] == [(observation_dirs[0], 'compress'),
+                                  (observation_dirs[0], 'index')]
+    assert report['failed'] == {}
+    assert report['run'] == 0
+
+    # One entry for each stage
+    with open(housekeeper.journal_file) as f:
+        entries = [json.loads(line) for line in f]
+    assert len(entries) == len(housekeeping.STAGES)
+    assert {entry['stage']: entry.get('attempts') for entry in entries
+            if entry['status'] == 'failed'} == {'compress': 3, 'index': 3}
@@ -3,6 +3,7 @@ import pytest
 
 from pocs.images import Image
 from pocs.images import OffsetError
+from pocs.images import RegistrationInfo
 from pocs.utils.error import SolveError
 from pocs.utils.error import Timeout
 
@@ -132,6 +133,35 @@ def test_pointing_error(solved_fits_file):
     assert (perr.magnitude.to(u.degree).value - 1.9445870862060288) < 1e-5
 
 
+def test_register_self(solved_fits_file):
+    im0 = Image(solved_fits_file)
+    im1 = Image(solved_fits_file)
+
+    info = im1.register(im0)
+    assert isinstance(info, RegistrationInfo)
+    assert abs(info.dx) < 0.5 and abs(info.dy) < 0.5
+    assert info.confidence > 10
+
+    offset = im1.compute_offset(im0)
+    assert offset.magnitude.to(u.arcsec).value < 60
+
+
+def test_register_no_wcs(solved_fits_file, unsolved_fits_file):
+    im0 = Image(unsolved_fits_file)
+    im1 = Image(solved_fits_file)
+
+    with pytest.raises(SolveError):
+        im1.register(im0)
+
+
+def test_register_too_uncertain(solved_fits_file):
+    im0 = Image(solved_fits_file)
+    im1 = Image(solved_fits_file)
+
+    with pytest.raises(SolveError):
+        im1.register(im0, min_confidence=1e9)
+
+
 # def test_compute_offset_arcsec(solved_fits_file, unsolved_fits_file):
 #     img0 = Image(solved_fits_file)
 #     img1 = Image(unsolved_fits_file)
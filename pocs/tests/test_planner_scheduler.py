@@ -0,0 +1,138 @@
+import pytest
+import yaml
+
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from astropy.time import Time
+
+from astroplan import Observer
+
+from pocs.scheduler.planner import Scheduler
+
+from pocs.scheduler.constraint import Duration
+from pocs.scheduler.constraint import MoonAvoidance
+
+
+@pytest.fixture
+def constraints():
+    return [MoonAvoidance(), Duration(30 * u.deg)]
+
+
+@pytest.fixture
+def observer(config):
+    loc = config['location']
+    location = EarthLocation(lon=loc['longitude'], lat=loc['latitude'], height=loc['elevation'])
+    return Observer(location=location, name="Test Observer", timezone=loc['timezone'])
+
+
+@pytest.fixture()
+def field_list():
+    return yaml.load("""
+    -
+        name: HD 189733
+        position: 20h00m43.7135s +22d42m39.0645s
+        priority: 100
+    -
+        name: HD 209458
+        position: 22h03m10.7721s +18d53m03.543s
+        priority: 100
+    -
+        name: Tres 3
+        position: 17h52m07.02s +37d32m46.2012s
+        priority: 100
+        exp_set_size: 15
+        min_nexp: 240
+    -
+        name: M5
+        position: 15h18m33.2201s +02d04m51.7008s
+        priority: 50
+    -
+        name: Wasp 33
+        position: 02h26m51.0582s +37d33m01.733s
+        priority: 100
+    """)
+
+
+@pytest.fixture
+def scheduler(field_list, observer, constraints):
+    return Scheduler(observer, fields_list=field_list, constraints=constraints,
+                     slot_duration=10 * u.minute)
+
+
+def test_build_plan(scheduler):
+    time = Time('2016-08-13 10:00:00')
+
+    scheduler.build_plan(time)
+    plan = scheduler.plan
+
+    assert len(plan) > 0
+    assert plan[0].start_time >= time
+    assert plan[-1].end_time <= scheduler.almanac.tonight(time)[-1]
+
+    # Blocks are in order and don't overlap
+    for block, next_block in zip(plan[:-1], plan[1:]):
+        assert block.end_time <= next_block.start_time
+
+
+def test_get_observation(scheduler):
+    time = Time('2016-08-13 10:00:00')
+
+    best = scheduler.get_observation(time=time)
+
+    assert best[0] in scheduler.observations
+    assert isinstance(best[1], float)
+    assert scheduler.current_observation.name == best[0]
+
+
+def test_get_observation_pops_plan(scheduler):
+    time = Time('2016-08-13 10:00:00')
+
+    scheduler.build_plan(time)
+    plan = scheduler.plan
+
+    best = scheduler.get_observation(time=plan[0].start_time)
+    assert best[0] == plan[0].name
+    assert scheduler.plan == plan[1:]
+
+
+def test_no_valid_observation(scheduler):
+    time = Time('2016-08-13 15:00:00')
+    scheduler.get_observation(time=time)
+    assert scheduler.current_observation is None
+
+
+def test_replan_when_behind(scheduler):
+    time = Time('2016-08-13 10:00:00')
+
+    scheduler.build_plan(time)
+
+    # E.g. after waiting out bad weather
+    later = time + 2 * u.hour
+    scheduler.get_observation(time=later)
+
+    assert all(block.start_time >= later for block in scheduler.plan)
+
+
+def test_remove_observation(scheduler):
+    time = Time('2016-08-13 10:00:00')
+
+    scheduler.build_plan(time)
+    name = scheduler.plan[0].name
+
+    scheduler.remove_observation(name)
+
+    assert name not in [block.name for block in scheduler.plan]
+    assert len(scheduler.plan) > 0
+
+
+def test_add_observation(scheduler):
+    time = Time('2016-08-13 10:00:00')
+
+    scheduler.build_plan(time)
+
+    scheduler.add_observation({'name': 'Kepler 1100',
+                               'position': '19h27m29.10s +44d05m15.00s',
+                               'priority': 1000})
+
+    names = [block.name for block in scheduler.plan]
+    assert 'Kepler 1100' in names
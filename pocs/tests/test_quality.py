@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from astropy.io import fits
+
+from pocs.utils import quality
+
+
+def make_star_field(positions, sigma=(2., 2.), flux=5000., background=100., noise=3.,
+                    shape=(200, 200)):
+    rng = np.random.RandomState(42)
+    data = rng.normal(background, noise, shape)
+
+    y, x = np.indices(shape)
+    for x0, y0 in positions:
+        data += flux / (2 * np.pi * sigma[0] * sigma[1]) * np.exp(
+            -0.5 * (((x - x0) / sigma[0]) ** 2 + ((y - y0) / sigma[1]) ** 2))
+
+    return data
+
+
+@pytest.fixture
+def positions():
+    return [(x, y) for x in range(20, 200, 40) for y in range(20, 200, 40)]
+
+
+@pytest.fixture
+def solved_fits_file(data_dir):
+    return '{}/solved.fits'.format(data_dir)
+
+
+def test_measure_quality(positions):
+    data = make_star_field(positions)
+
+    metrics = quality.measure_quality(data, bin_factor=1)
+    assert metrics['num_stars'] == len(positions)
+    assert metrics['background'] == pytest.approx(100., abs=1.)
+    assert metrics['background_std'] == pytest.approx(3., rel=0.2)
+    assert metrics['fwhm'] == pytest.approx(quality.SIGMA_TO_FWHM * 2., rel=0.15)
+    assert metrics['ellipticity'] < 0.1
+
+
+def test_measure_quality_binned(positions):
+    data = make_star_field(positions, sigma=(3., 3.))
+
+    metrics = quality.measure_quality(data, bin_factor=2)
+    assert metrics['num_stars'] == len(positions)
+    assert metrics['background'] == pytest.approx(100., abs=1.)
+    assert metrics['fwhm'] == pytest.approx(quality.SIGMA_TO_FWHM * 3., rel=0.2)
+
+
+def test_measure_quality_elongated(positions):
+    data = make_star_field(positions, sigma=(3., 1.5))
+
+    metrics = quality.measure_quality(data, bin_factor=1)
+    assert metrics['ellipticity'] == pytest.approx(0.5, abs=0.1)
+
+
+def test_measure_quality_no_stars():
+    data = make_star_field([])
+
+    # Hot pixels are not stars
+    data[50, 50] = 10000
+    data[100, 120] = 10000
+
+    metrics = quality.measure_quality(data, bin_factor=1)
+    assert metrics['num_stars'] == 0
+    assert metrics['fwhm'] is None
+    assert metrics['ellipticity'] is None
+
+
+def test_measure_quality_saturated(positions):
+    data = make_star_field(positions)
+
+    metrics = quality.measure_quality(data, bin_factor=1, saturation=100.)
+    assert metrics['num_stars'] == len(positions)
+    assert metrics['fwhm'] is None
+
+
+def test_measure_quality_saturated_binned(positions):
+    data = make_star_field(positions)
+
+    # The binned peaks are above the level, but no pixel is
+    saturation = data.max() + 1
+    assert quality._bin(data, 2).min() > saturation
+
+    metrics = quality.measure_quality(data, bin_factor=2, saturation=saturation)
+    assert metrics['fwhm'] is not None
+
+    metrics = quality.measure_quality(data, bin_factor=2, saturation=250.)
+    assert metrics['num_stars'] == len(positions)
+    assert metrics['fwhm'] is None
+
+
+def test_measure_file(solved_fits_file):
+    metrics = quality.measure_file(solved_fits_file, box_width=100)
+    assert metrics['file_path'] == solved_fits_file
+    assert metrics['box_width'] == 100
+    assert metrics['num_stars'] >= 0
+    assert metrics['seconds'] > 0
+
+    # Box larger than the image
+    metrics = quality.measure_file(solved_fits_file, box_width=10000)
+    assert metrics['box_width'] is None
+
+
+def test_measure_file_unsigned(tmpdir, positions):
+    # Camera frames are uint16, stored with BZERO
+    fname = str(tmpdir.join('unsigned.fits'))
+    fits.PrimaryHDU(make_star_field(positions).astype(np.uint16)).writeto(fname)
+
+    metrics = quality.measure_file(fname, box_width=150, bin_factor=1)
+    assert metrics['box_width'] == 150
+    assert metrics['num_stars'] > 0
+    assert metrics['background'] == pytest.approx(100., abs=1.)
+
+
+def test_service(solved_fits_file):
+    service = quality.QualityService(max_workers=1)
+
+    results = list()
+
+    def callback(metrics):
+        results.append(metrics)
+        return metrics['num_stars']
+
+    future = service.submit(solved_fits_file, callback=callback)
+    assert future.result(timeout=30) == results[0]['num_stars']
+
+    future = service.submit('does_not_exist.fits')
+    with pytest.raises(Exception):
+        future.result(timeout=30)
+
+    service.shutdown()
+
+
+def test_shared_service():
+    assert quality.get_service() is quality.get_service(max_workers=4)
@@ -0,0 +1,142 @@
+import os
+import pytest
+import shutil
+
+from astropy.io import fits
+
+import numpy as np
+
+from pocs.images import Image
+from pocs.utils import images as img_utils
+from pocs.utils import solve_cache
+from pocs.utils.solve_cache import SolveCache
+
+
+@pytest.fixture
+def solved_fits_file(data_dir):
+    return '{}/solved.fits'.format(data_dir)
+
+
+@pytest.fixture
+def unsolved_fits_file(data_dir, tmpdir):
+    fname = str(tmpdir.join('unsolved.fits'))
+    shutil.copyfile('{}/unsolved.fits'.format(data_dir), fname)
+    return fname
+
+
+@pytest.fixture
+def cache(tmpdir):
+    cache = SolveCache(str(tmpdir.join('solve_cache.sqlite')))
+    yield cache
+    cache.close()
+
+
+def test_put_get(cache, solved_fits_file):
+    assert cache.get(solved_fits_file, radius=15) is None
+
+    cache.put(solved_fits_file, fits.getheader(solved_fits_file), metadata={'solve_time': 1.},
+              radius=15)
+    assert len(cache) == 1
+
+    header, metadata = cache.get(solved_fits_file, radius=15, verbose=True)
+    assert 'CRVAL1' in header
+    assert 'OBJECT' not in header
+    assert metadata['solve_time'] == 1.
+    assert metadata['fname'] == solved_fits_file
+
+    # Different solver options
+    assert cache.get(solved_fits_file, radius=5) is None
+
+
+def test_persistent(tmpdir, solved_fits_file):
+    filename = str(tmpdir.join('solve_cache.sqlite'))
+
+    cache = SolveCache(filename)
+    cache.put(solved_fits_file, fits.getheader(solved_fits_file))
+    cache.close()
+
+    cache = SolveCache(filename)
+    assert cache.get(solved_fits_file) is not None
+    cache.close()
+
+
+def test_invalidate(cache, solved_fits_file):
+    cache.put(solved_fits_file, fits.getheader(solved_fits_file), radius=15)
+    cache.put(solved_fits_file, fits.getheader(solved_fits_file), radius=5)
+    assert len(cache) == 2
+
+    cache.invalidate(solved_fits_file)
+    assert len(cache) == 0
+
+
+def test_prune(tmpdir, solved_fits_file, data_dir):
+    cache = SolveCache(str(tmpdir.join('solve_cache.sqlite')), max_entries=2)
+
+    for radius in range(4):
+        cache.put(solved_fits_file, fits.getheader(solved_fits_file), radius=radius)
+
+    assert len(cache) == 2
+    assert cache.get(solved_fits_file, radius=0) is None
+    assert cache.get(solved_fits_file, radius=3) is not None
+
+    cache.max_age = -1
+    cache.prune()
+    assert len(cache) == 0
+
+    cache.close()
+
+
+def test_no_data(cache, data_dir):
+    assert cache.get_data_hash(os.path.join(data_dir, 'solved.solved')) is None
+
+
+def test_data_hash_unsigned(cache, tmpdir):
+    # Camera frames are uint16, stored with BZERO = 32768
+    data = np.arange(10000, dtype=np.uint16).reshape(100, 100)
+    fname = str(tmpdir.join('unsigned.fits'))
+    fits.PrimaryHDU(data).writeto(fname)
+
+    data_hash = cache.get_data_hash(fname)
+    assert data_hash is not None
+
+    # The header doesn't change the hash
+    fits.setval(fname, 'OBJECT', value='Test')
+    assert cache.get_data_hash(fname) == data_hash
+
+    cache.put(fname, fits.Header([('CRVAL1', 10.)]))
+    assert cache.get(fname, data_hash=data_hash) is not None
+
+
+def test_shared_cache(tmpdir):
+    filename = str(tmpdir.join('solve_cache.sqlite'))
+    assert solve_cache.get_cache(filename) is solve_cache.get_cache(filename, max_entries=1)
+    assert solve_cache.get_cache(filename).max_entries == 10000
+
+
+def test_get_solve_field_cached(cache, solved_fits_file, unsolved_fits_file):
+    # Store the solution of the solved file under the data of the unsolved one
+    cache.put(unsolved_fits_file, fits.getheader(solved_fits_file), radius=15)
+
+    solve_info = img_utils.get_solve_field(unsolved_fits_file, cache=cache)
+
+    assert solve_info['solved_fits_file'] == unsolved_fits_file
+    assert 'CRVAL1' in fits.getheader(unsolved_fits_file)
+    assert os.path.exists(unsolved_fits_file.replace('.fits', '.solved'))
+
+
+def test_image_solve_field_cached(solved_fits_file, unsolved_fits_file, config):
+    # `Image.solve_field` uses the solve cache of the data directory by default
+    cache = solve_cache.get_cache(os.path.join(config['directories']['data'],
+                                               'solve_cache.sqlite'))
+
+    im0 = Image(unsolved_fits_file)
+    assert im0.wcs is None
+
+    # Stored with the options the image is solved with
+    cache.put(unsolved_fits_file, fits.getheader(solved_fits_file), radius=15,
+              **im0._get_solve_options(None, None, {}))
+
+    im0.solve_field(skip_solved=False)
+    assert im0.wcs is not None
+
+    cache.invalidate(unsolved_fits_file)
@@ -0,0 +1,141 @@
+import pytest
+import shutil
+import threading
+import time
+
+from astropy.io import fits
+
+from pocs.images import Image
+from pocs.utils import solver
+from pocs.utils.error import SolveError
+from pocs.utils.error import Timeout
+
+
+@pytest.fixture
+def solved_fits_file(data_dir):
+    return '{}/solved.fits'.format(data_dir)
+
+
+@pytest.fixture
+def tiny_fits_file(data_dir):
+    return '{}/tiny.fits'.format(data_dir)
+
+
+@pytest.fixture
+def solve_service():
+    service = solver.SolveService(max_workers=1, timeout=10)
+    yield service
+    service.shutdown()
+
+
+def test_submit_solved(solve_service, solved_fits_file):
+    future = solve_service.submit(solved_fits_file)
+
+    assert future.result(timeout=30)['solved_fits_file'] == solved_fits_file
+
+
+def test_image_submit_solve(solve_service, solved_fits_file):
+    image = Image(solved_fits_file)
+
+    future = image.submit_solve(solve_service, priority=solver.PRIORITY_POINTING)
+    future.result(timeout=30)
+
+    assert image.wcs is not None
+
+
+def test_priority_and_cancel(solve_service, solved_fits_file):
+    # Keep the only worker busy until all the jobs are queued
+    release = threading.Event()
+    order = []
+
+    def record(name):
+        def callback(result):
+            release.wait()
+            order.append(name)
+            return result
+        return callback
+
+    first = solve_service.submit(solved_fits_file, callback=record('first'))
+    while not first.running():
+        time.sleep(0.01)
+
+    backfill = solve_service.submit(solved_fits_file, priority=solver.PRIORITY_BACKFILL,
+                                    callback=record('backfill'))
+    cancelled = solve_service.submit(solved_fits_file, callback=record('cancelled'))
+    pointing = solve_service.submit(solved_fits_file, priority=solver.PRIORITY_POINTING,
+                                    callback=record('pointing'))
+
+    assert solve_service.cancel(cancelled)
+    release.set()
+
+    for future in [first, backfill, pointing]:
+        future.result(timeout=30)
+
+    assert cancelled.cancelled()
+    assert order == ['first', 'pointing', 'backfill']
+
+
+def test_solve_timeout(solve_service, tiny_fits_file):
+    future = solve_service.submit(tiny_fits_file, replace=False, radius=4, timeout=1)
+
+    with pytest.raises(Timeout):
+        future.result(timeout=30)
+
+
+def test_solve_hints(solve_service, solved_fits_file, tmpdir):
+    fname = str(tmpdir.join('solved.fits'))
+    shutil.copyfile(solved_fits_file, fname)
+    fits.setval(fname, 'SEQID', value='PAN000_ee04d1_20180101T120000')
+    fits.setval(fname, 'INSTRUME', value='ee04d1')
+
+    assert solve_service.get_hints('PAN000_ee04d1_20180101T120000') == {}
+
+    solve_service.submit(fname).result(timeout=30)
+
+    hints = solve_service.get_hints('PAN000_ee04d1_20180101T120000')
+    assert hints['parity'] in ['pos', 'neg']
+    assert hints['scale_low'] < hints['scale_high']
+
+    # Hints for the next frames of the sequence, the options given take precedence
+    options = solve_service._add_hints(fname, {'radius': 3, 'pixel_scale': 10.})
+    assert options['parity'] == hints['parity']
+    assert options['scale_low'] == hints['scale_low']
+    assert options['radius'] == 3
+    assert 'pixel_scale' not in options
+
+    # Only the scale for a camera with a known pixel scale
+    fits.setval(fname, 'SEQID', value='PAN000_ee04d1_20180102T120000')
+    solve_service.pixel_scales['ee04d1'] = 10.
+    options = solve_service._add_hints(fname, {})
+    assert options == {'scale_low': 9.5, 'scale_high': 10.5}
+
+
+def test_solve_hints_retry(solve_service, solved_fits_file, tmpdir, monkeypatch):
+    fname = str(tmpdir.join('solved.fits'))
+    shutil.copyfile(solved_fits_file, fname)
+    fits.setval(fname, 'SEQID', value='PAN000_ee04d1_20180101T120000')
+    solve_service._hints['PAN000_ee04d1_20180101T120000'] = {
+        'parity': 'neg', 'radius': 0.5, 'scale_low': 9.5, 'scale_high': 10.5}
+
+    calls = list()
+
+    def get_solve_field(fname, on_start=None, **kwargs):
+        calls.append(kwargs)
+        if 'radius' in kwargs:
+            raise SolveError("Pointing further off than the radius")
+        return {'solved_fits_file': fname}
+
+    monkeypatch.setattr(solver.img_utils, 'get_solve_field', get_solve_field)
+
+    # Retried without the search hints, but with the scale
+    solve_service.submit(fname, ra=10., dec=20.).result(timeout=30)
+    assert len(calls) == 2
+    assert 'parity' not in calls[1]
+    assert calls[1]['scale_low'] == 9.5
+    assert calls[1]['ra'] == 10.
+
+    # Not retried with the search options given
+    calls.clear()
+    with pytest.raises(SolveError):
+        solve_service.submit(fname, radius=1., parity='neg').result(timeout=30)
+    assert len(calls) == 1
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from astropy.io import fits
+
+from pocs.utils import sources
+
+
+def make_star_field(positions, sigma=(2., 2.), flux=5000., background=100., noise=3.,
+                    shape=(256, 256)):
+    rng = np.random.RandomState(42)
+    data = rng.normal(background, noise, shape)
+
+    y, x = np.indices(shape)
+    for x0, y0 in positions:
+        data += flux / (2 * np.pi * sigma[0] * sigma[1]) * np.exp(
+            -0.5 * (((x - x0) / sigma[0]) ** 2 + ((y - y0) / sigma[1]) ** 2))
+
+    return data
+
+
+@pytest.fixture
+def positions():
+    return [(x + 0.3, y + 0.6) for x in range(20, 256, 40) for y in range(20, 256, 40)]
+
+
+def test_estimate_background():
+    data = make_star_field([], shape=(300, 200))
+    data += np.indices(data.shape)[1] * 0.1
+
+    background, rms = sources.estimate_background(data, mesh_size=50)
+    assert background.shape == data.shape
+    assert rms.shape == data.shape
+    assert background[150, 25] == pytest.approx(102.5, abs=1.)
+    assert background[150, 175] == pytest.approx(117.5, abs=1.)
+    assert np.median(rms) == pytest.approx(3., rel=0.1)
+
+
+def test_detect_sources(positions):
+    data = make_star_field(positions)
+
+    stars = sources.detect_sources(data)
+    assert len(stars) == len(positions)
+    assert stars.dtype.names == tuple(name for name, _ in sources.SOURCE_DTYPE)
+
+    # Brightest first
+    assert (np.diff(stars['flux']) <= 0).all()
+
+    # Each star is found close to its position
+    found = np.column_stack([stars['x'], stars['y']])
+    for position in positions:
+        assert np.hypot(*(found - position).T).min() < 0.1
+
+    assert np.median(stars['fwhm']) == pytest.approx(2 * np.sqrt(2 * np.log(2)) * 2., rel=0.15)
+    assert np.median(stars['ellipticity']) < 0.1
+    assert not stars['saturated'].any()
+
+
+def test_detect_sources_elongated(positions):
+    data = make_star_field(positions, sigma=(3., 1.5))
+
+    stars = sources.detect_sources(data)
+    assert len(stars) == len(positions)
+    assert np.median(stars['ellipticity']) == pytest.approx(0.5, abs=0.1)
+    assert np.median(np.abs(stars['theta'])) == pytest.approx(0., abs=0.1)
+
+
+def test_detect_sources_no_stars():
+    data = make_star_field([])
+
+    # Hot pixels are not stars
+    data[50, 50] = 10000
+    data[100, 120] = 10000
+
+    stars = sources.detect_sources(data)
+    assert len(stars) == 0
+    assert stars.dtype.names == tuple(name for name, _ in sources.SOURCE_DTYPE)
+
+
+def test_detect_sources_saturated(positions):
+    data = make_star_field(positions)
+    x, y = positions[0]
+    data[int(y), int(x)] = 65535
+
+    stars = sources.detect_sources(data, saturation=65535, max_sources=10)
+    assert len(stars) == 10
+    assert stars['saturated'][0]
+    assert not stars['saturated'][1:].any()
+
+    # Mask of the saturated pixels
+    mask = np.zeros(data.shape, dtype=bool)
+    mask[int(y), int(x)] = True
+
+    masked = sources.detect_sources(data, saturation=mask, max_sources=10)
+    np.testing.assert_array_equal(masked['saturated'], stars['saturated'])
+
+
+def test_detect_sources_uint16(positions):
+    data = make_star_field(positions).astype(np.uint16)
+
+    background, rms = sources.estimate_background(data)
+    stars = sources.detect_sources(data, background=background, rms=rms)
+    assert len(stars) == len(positions)
+
+
+def test_detect_sources_file(data_dir):
+    data = fits.getdata('{}/solved.fits'.format(data_dir))
+
+    stars = sources.detect_sources(data)
+    assert len(stars) > 0
+    assert (stars['x'] >= 0).all() and (stars['x'] < data.shape[1]).all()
+    assert (stars['y'] >= 0).all() and (stars['y'] < data.shape[0]).all()
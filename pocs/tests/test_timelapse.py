@@ -0,0 +1,113 @@
+import os
+import pytest
+import shutil
+import sys
+
+from pocs.utils import timelapse
+
+
+def test_timelapse_name():
+    name = timelapse.get_timelapse_name(
+        '/var/panoptes/images/fields/Wasp33/ee04d1/20160813T050000/')
+    assert name.endswith('/images/timelapse/Wasp33_ee04d1_20160813T050000.mp4')
+
+
+def test_writer_registry(tmpdir):
+    directory = str(tmpdir)
+    writer = timelapse.get_writer(directory, fn_out=str(tmpdir.join('timelapse.mp4')))
+
+    assert timelapse.has_writer(directory)
+    assert timelapse.get_writer(directory + '/') is writer
+
+    # No frames, so no video
+    assert timelapse.close_writer(directory) is None
+    assert not timelapse.has_writer(directory)
+    assert timelapse.close_writer(directory) is None
+
+
+def test_closed_writer(tmpdir):
+    directory = str(tmpdir)
+    timelapse.get_writer(directory, fn_out=str(tmpdir.join('timelapse.mp4')))
+    timelapse.close_writer(directory)
+
+    # A late frame doesn't start a new video over the finished one
+    with pytest.raises(AssertionError):
+        timelapse.get_writer(directory)
+    assert not timelapse.has_writer(directory)
+
+    # Only the last directories are remembered
+    for i in range(timelapse.MAX_CLOSED_DIRECTORIES):
+        other = str(tmpdir.join('other{}'.format(i)))
+        timelapse.get_writer(other, fn_out=other + '.mp4')
+        timelapse.close_writer(other)
+    timelapse.get_writer(directory)
+    timelapse.close_writer(directory)
+
+
+@pytest.fixture
+def fake_ffmpeg(tmpdir):
+    """ Writes what it is piped to the output file, the last argument """
+    script = tmpdir.join('ffmpeg')
+    script.write('#!{}\n'
+                 'import shutil\n'
+                 'import sys\n'
+                 'with open(sys.argv[-1], "wb") as f:\n'
+                 '    shutil.copyfileobj(sys.stdin.buffer, f)\n'.format(sys.executable))
+    script.chmod(0o755)
+
+    return str(script)
+
+
+def test_writer_encoding(tmpdir, fake_ffmpeg):
+    fn_out = str(tmpdir.join('timelapse', 'timelapse.mp4'))
+    writer = timelapse.TimelapseWriter(fn_out, ffmpeg=fake_ffmpeg)
+
+    frames = list()
+    for i in range(3):
+        fname = tmpdir.join('frame{}.jpg'.format(i))
+        fname.write_binary('frame{}'.format(i).encode())
+        writer.add_frame(str(fname))
+        frames.append(str(fname))
+
+    assert writer.close(timeout=30) == fn_out
+    assert writer.num_frames == 3
+    assert not any(os.path.exists(f) for f in frames)
+
+    with open(fn_out, 'rb') as f:
+        assert f.read() == b'frame0frame1frame2'
+
+
+def test_missing_frame(tmpdir):
+    writer = timelapse.TimelapseWriter(str(tmpdir.join('timelapse.mp4')), frame_timeout=1)
+
+    with pytest.warns(UserWarning):
+        writer.add_frame(str(tmpdir.join('missing.jpg')))
+        assert writer.close() is None
+
+    assert writer.num_frames == 0
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg is not installed")
+def test_writer(tmpdir, data_dir):
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+
+    fn_out = str(tmpdir.join('timelapse.mp4'))
+    writer = timelapse.TimelapseWriter(fn_out, size='320x240')
+
+    frames = list()
+    for i in range(3):
+        fname = str(tmpdir.join('frame{}.jpg'.format(i)))
+        plt.figure(figsize=(3.2, 2.4))
+        plt.plot([0, i])
+        plt.savefig(fname)
+        plt.close()
+
+        writer.add_frame(fname)
+        frames.append(fname)
+
+    assert writer.close() == fn_out
+    assert writer.num_frames == 3
+    assert os.path.getsize(fn_out) > 0
+    assert not any(os.path.exists(f) for f in frames)
@@ -1,17 +1,21 @@
 import numpy as np
 import os
 import pytest
+import sys
 
 from datetime import datetime as dt
 
 from astropy.io import fits
 
+from pocs.utils import clock
 from pocs.utils import current_time
 from pocs.utils import images
 from pocs.utils import list_connected_cameras
 from pocs.utils import listify
 from pocs.utils import load_module
+from pocs.utils.error import InvalidSystemCommand
 from pocs.utils.error import NotFound
+from pocs.utils.error import PanError
 
 
 @pytest.fixture
@@ -44,6 +48,136 @@ def test_crop_data():
     assert cropped02.sum() == 100.
 
 
+def test_register_images(solved_fits_file):
+    ref_data = fits.getdata(solved_fits_file)
+    data = np.roll(ref_data, (-4, 6), axis=(0, 1))
+
+    dx, dy, confidence = images.register_images(data, ref_data)
+    assert dx == pytest.approx(6, abs=1)
+    assert dy == pytest.approx(-4, abs=1)
+    assert confidence > 10
+
+    ref_fft = images.get_registration_fft(ref_data)
+    assert images.register_images(data, None, ref_fft=ref_fft) == (dx, dy, confidence)
+
+    with pytest.raises(ValueError):
+        images.register_images(data[:100, :100], ref_data)
+
+
+def test_get_solve_hints(solved_fits_file):
+    header = fits.getheader(solved_fits_file)
+
+    hints = images.get_solve_hints(header=header, scale_tolerance=0.1)
+    assert hints['parity'] in ['pos', 'neg']
+    assert hints['scale_low'] == pytest.approx(hints['scale_high'] * 0.9 / 1.1)
+    assert hints['ra'] == pytest.approx(header['CRVAL1'])
+    assert hints['dec'] == pytest.approx(header['CRVAL2'])
+    assert hints['radius'] > 0
+
+    assert images.get_solve_hints(header=header, radius=2)['radius'] == 2
+
+    assert images.get_solve_hints(pixel_scale=10.) == {'scale_low': 9.5, 'scale_high': 10.5}
+    assert images.get_solve_hints() == {}
+
+
+def test_make_master_frame(tmpdir):
+    rng = np.random.RandomState(0)
+    level = rng.uniform(900, 1100, (60, 40)).astype(np.float32)
+
+    fnames = list()
+    for i in range(7):
+        data = level + rng.normal(0, 1, level.shape).astype(np.float32)
+        if i == 0:
+            # Cosmic ray
+            data[10, 10] = 60000
+        header = fits.Header({'EXPTIME': 10., 'DATE-OBS': '2018-01-0{}T00:00:00'.format(i + 1),
+                              'IMAGETYP': 'Dark Frame'})
+        fname = str(tmpdir.join('dark_{}.fits'.format(i)))
+        fits.writeto(fname, data, header)
+        fnames.append(fname)
+
+    # Force many blocks of rows
+    out_file = str(tmpdir.join('master_dark.fits'))
+    master_file = images.make_master_frame(fnames, out_file, frame_type='dark',
+                                           max_memory=0.01, max_workers=3)
+    assert master_file == out_file
+
+    master = fits.getdata(master_file)
+    assert master.shape == level.shape
+    assert np.abs(master - level).max() < 5
+
+    header = fits.getheader(master_file)
+    assert header['IMAGETYP'] == 'Master Dark'
+    assert header['NCOMBINE'] == 7
+    assert header['EXPTIME'] == 10.
+    assert header['DATE-BEG'] == '2018-01-01T00:00:00'
+    assert header['DATE-END'] == '2018-01-07T00:00:00'
+    assert len(header['HISTORY']) == 7
+
+    # Flats are normalized after subtracting the dark
+    flat_fnames = list()
+    for i in range(3):
+        fname = str(tmpdir.join('flat_{}.fits'.format(i)))
+        fits.writeto(fname, level + 1000. * (i + 1))
+        flat_fnames.append(fname)
+
+    master_flat = images.make_master_frame(flat_fnames, str(tmpdir.join('master_flat.fits')),
+                                           frame_type='flat', combine='mean', sigma=None,
+                                           dark=master_file)
+    flat = fits.getdata(master_flat)
+    assert np.allclose(flat, 1., atol=0.01)
+    assert fits.getheader(master_flat)['MASTDARK'] == 'master_dark.fits'
+
+    # A flat without light cannot be normalized
+    fits.writeto(flat_fnames[0], master, overwrite=True)
+    with pytest.raises(PanError):
+        images.make_master_frame(flat_fnames, str(tmpdir.join('master_flat.fits')),
+                                 frame_type='flat', dark=master_file)
+
+    with pytest.raises(AssertionError):
+        images.make_master_frame(fnames, out_file, frame_type='sky')
+
+
+@pytest.fixture
+def fake_dcraw(tmpdir):
+    """ Writes the contents of `pgm_file` to stdout, whatever the arguments """
+    pgm_file = tmpdir.join('dcraw.pgm')
+    script = tmpdir.join('dcraw')
+    script.write('#!{}\n'
+                 'import sys\n'
+                 'with open("{}", "rb") as f:\n'
+                 '    sys.stdout.buffer.write(f.read())\n'.format(sys.executable, pgm_file))
+    script.chmod(0o755)
+
+    return str(script), pgm_file
+
+
+def test_read_cr2_data(tmpdir, fake_dcraw):
+    dcraw, pgm_file = fake_dcraw
+
+    cr2_fname = tmpdir.join('image.cr2')
+    cr2_fname.write('')
+
+    pgm_data = (np.arange(12 * 5).reshape(5, 12) * 1000).astype('>u2')
+    pgm_file.write(b'P5\n12 5\n65535\n' + pgm_data.tobytes(), mode='wb')
+
+    data = images.read_cr2_data(str(cr2_fname), dcraw=dcraw)
+    assert data.shape == (5, 12)
+    assert data.dtype == np.dtype('>u2')
+    # Flipped to the FITS orientation
+    np.testing.assert_array_equal(data, pgm_data[::-1])
+
+    # Truncated output
+    pgm_file.write(b'P5\n12 5\n65535\n' + pgm_data.tobytes()[:-10], mode='wb')
+    with pytest.raises(InvalidSystemCommand):
+        images.read_cr2_data(str(cr2_fname), dcraw=dcraw)
+
+    # Not a PGM
+    pgm_file.write(b'P6\n12 5\n65535\n' + pgm_data.tobytes(), mode='wb')
+    with pytest.raises(InvalidSystemCommand):
+        images.read_cr2_data(str(cr2_fname), dcraw=dcraw)
+
+
 def test_wcsinfo(solved_fits_file):
     wcsinfo = images.get_wcsinfo(solved_fits_file)
 
@@ -129,3 +263,95 @@ def test_focus_metric_bad_string(data_dir):
     data = fits.getdata(os.path.join(data_dir, 'unsolved.fits'))
     with pytest.raises(KeyError):
         images.focus_metric(data, merit_function='NOTAMERITFUNCTION')
+
+
+def test_vollath_f4_saturated():
+    data = np.arange(100, dtype=np.uint16).reshape(10, 10) * 100
+    data[3, 4] = 65535
+
+    masked = images.mask_saturated(data)
+    expected = ((masked[1:] * masked[:-1]).mean() - (masked[2:] * masked[:-2]).mean())
+    assert images.vollath_F4(data, axis='Y') == pytest.approx(expected)
+
+
+def test_focus_metrics_sharper():
+    # The same star field in and out of focus, with the same noise
+    rng = np.random.RandomState(42)
+    positions = rng.uniform(10, 190, (50, 2))
+    fluxes = rng.uniform(1000, 20000, 50)
+    noise = rng.normal(0, 10, (200, 200))
+
+    y, x = np.indices((200, 200))
+
+    def star_field(sigma):
+        data = 1000 + noise
+        for (x0, y0), flux in zip(positions, fluxes):
+            data += flux / (2 * np.pi * sigma ** 2) * np.exp(
+                -((x - x0) ** 2 + (y - y0) ** 2) / (2 * sigma ** 2))
+        return data
+
+    focused = star_field(1.5)
+    defocused = star_field(3.)
+
+    for merit_function in ['vollath_F4', 'brenner', 'laplacian_variance']:
+        assert images.focus_metric(focused, merit_function) > \
+            images.focus_metric(defocused, merit_function)
+
+
+def test_focus_metrics_float32(data_dir):
+    data = fits.getdata(os.path.join(data_dir, 'unsolved.fits'))[:200, :200]
+    data32 = data.astype(np.float32)
+    data32[10, 10] = 65535
+    original = data32.copy()
+
+    for merit_function in images.FOCUS_METRICS:
+        metric = images.focus_metric(data32, merit_function)
+        assert metric == pytest.approx(
+            images.focus_metric(data32.astype(np.float64), merit_function), rel=1e-5)
+
+    # The saturated pixels are zeroed in a copy
+    np.testing.assert_array_equal(data32, original)
+
+
+def test_half_flux_diameter():
+    y, x = np.indices((51, 51))
+    narrow = 1000 * np.exp(-((x - 25) ** 2 + (y - 25) ** 2) / (2 * 2 ** 2))
+    wide = 1000 * np.exp(-((x - 25) ** 2 + (y - 25) ** 2) / (2 * 4 ** 2))
+
+    assert images.half_flux_diameter(narrow) < images.half_flux_diameter(wide)
+
+
+def test_focus_metric_batch(data_dir):
+    data = fits.getdata(os.path.join(data_dir, 'unsolved.fits'))[:200, :200]
+    stack = np.array([data, data[::-1], data[:, ::-1]])
+
+    for merit_function in images.FOCUS_METRICS + [images.vollath_F4]:
+        batch = images.focus_metric_batch(stack, merit_function)
+        assert batch.shape == (3,)
+        for metric, thumbnail in zip(batch, stack):
+            assert metric == pytest.approx(images.focus_metric(thumbnail, merit_function))
+
+    with pytest.raises(AssertionError):
+        images.focus_metric_batch(data)
+
+
+def test_virtual_clock():
+    virtual_clock = clock.set_virtual_clock('2016-08-13 05:00:00', speedup=3600)
+
+    try:
+        assert clock.get_virtual_clock() is virtual_clock
+        assert current_time().isot.startswith('2016-08-13T05:00')
+
+        # An hour of virtual time passes in a second
+        clock.sleep(600)
+        assert (current_time() - virtual_clock.start_time).sec == pytest.approx(600, abs=60)
+
+        event = []
+        timer = clock.Timer(600, event.append, args=[True])
+        timer.start()
+        timer.join()
+        assert event == [True]
+    finally:
+        clock.clear_virtual_clock()
+
+    assert clock.get_virtual_clock() is None
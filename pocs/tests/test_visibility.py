@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from astroplan import Observer
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from astropy.coordinates import SkyCoord
+from astropy.time import Time
+
+from pocs.scheduler.visibility import VisibilityTable
+
+
+names = ['HD 189733', 'HD 209458', 'Tres 3', 'Wasp 33']
+positions = [
+    '20h00m43.7135s +22d42m39.0645s',
+    '22h03m10.7721s +18d53m03.543s',
+    '17h52m07.02s +37d32m46.2012s',
+    '02h26m51.0582s +37d33m01.733s',
+]
+
+
+@pytest.fixture
+def observer(config):
+    loc = config['location']
+    location = EarthLocation(lon=loc['longitude'], lat=loc['latitude'], height=loc['elevation'])
+    return Observer(location=location, name="Test Observer", timezone=loc['timezone'])
+
+
+@pytest.fixture
+def coords():
+    return SkyCoord(positions, frame='icrs')
+
+
+@pytest.fixture
+def time():
+    return Time('2016-08-13 08:00:00')
+
+
+@pytest.fixture
+def table(observer, coords, time):
+    end_of_night = observer.tonight(time=time, horizon=-18 * u.degree)[-1]
+    table = VisibilityTable(observer, time, end_of_night)
+    table.add_fields(names, coords)
+    return table
+
+
+def test_covers(table, time):
+    assert table.covers(time)
+    assert table.covers(time + 1 * u.hour)
+    assert not table.covers(time - 1 * u.hour)
+    assert not table.covers(time + 1 * u.day)
+
+
+def test_altitude(table, observer, coords, time):
+    later = time + 95 * u.minute
+    rows = table.get_indices(names)
+
+    alt = table.altitude(later, rows)
+
+    assert alt == pytest.approx(observer.altaz(later, coords).alt.degree, abs=0.05)
+
+
+def test_meridian_and_set(table, observer, coords, time):
+    rows = table.get_indices(names)
+
+    meridian = observer.target_meridian_transit_time(time, coords, which='next')
+    assert table.seconds_to_meridian(time, rows) == pytest.approx((meridian - time).sec, abs=60)
+
+    # Tres 3 sets during the night, Wasp 33 is not up yet
+    set_sec = table.seconds_to_set(time, rows[[2, 3]], 30 * u.degree)
+    set_time = observer.target_set_time(time, coords[2], which='next', horizon=30 * u.degree)
+    assert set_sec[0] == pytest.approx((set_time - time).sec, abs=30)
+    assert set_sec[1] == 0.
+
+    # HD 209458 is still up at the end of the night
+    assert np.isnan(table.seconds_to_set(time, rows[[1]], 30 * u.degree)[0])
+
+
+def test_rise_set_meridian(table):
+    rise, set_, meridian = table.rise_set_meridian(30 * u.degree)
+
+    assert np.isnan(rise[0]) and not np.isnan(set_[0])
+    assert not np.isnan(rise[3]) and np.isnan(set_[3])
+    assert table.covers(Time(meridian[0], format='jd'))
+
+    # Only the given rows
+    events = table.rise_set_meridian(30 * u.degree, np.array([3, 0]))
+    for event, expected in zip(events, [rise, set_, meridian]):
+        np.testing.assert_array_equal(event, expected[[3, 0]])
+
+
+def test_add_remove_fields(table, coords):
+    assert len(table) == 4
+    assert table.get_indices(['M42']) is None
+
+    with pytest.raises(AssertionError):
+        table.add_fields(names[:1], coords[:1])
+
+    table.remove_fields(['HD 209458', 'M42'])
+    assert len(table) == 3
+    assert table.get_indices(['HD 209458']) is None
+    assert list(table.get_indices(['Wasp 33'])) == [2]
+    assert table.altitudes.shape[0] == table.hour_angles.shape[0] == 3
+
+
+def test_save_load(table, observer, tmpdir):
+    fn = str(tmpdir.join('visibility.npz'))
+    table.save(fn)
+
+    table2 = VisibilityTable.load(fn, observer)
+    assert table2.names == table.names
+    assert np.array_equal(table2.altitudes, table.altitudes)
+    assert table2.covers(table.start_time)
+
+    other = Observer(location=EarthLocation(lon=0 * u.deg, lat=0 * u.deg, height=0 * u.m))
+    assert VisibilityTable.load(fn, other) is None
+    assert VisibilityTable.load(str(tmpdir.join('missing.npz')), observer) is None
@@ -10,21 +10,27 @@ from astropy.coordinates import SkyCoord
 from astropy.time import Time
 from astropy.utils import resolve_name
 
+from . import clock
+
 
 def current_time(flatten=False, datetime=False, pretty=False):
     """ Convenience method to return the "current" time according to the system
 
     If the system is running in a simulator mode this returns the "current" now for the
-    system, which does not necessarily reflect now in the real world. If not in a simulator
-    mode, this simply returns `current_time()`
+    system, which does not necessarily reflect now in the real world: the time of the
+    `~pocs.utils.clock.VirtualClock` if one is set, otherwise the fixed `POCSTIME`. If
+    not in a simulator mode, this simply returns `current_time()`
 
     Returns:
         (astropy.time.Time):    `Time` object representing now.
     """
 
     pocs_time = os.getenv('POCSTIME')
+    virtual_clock = clock.get_virtual_clock()
 
-    if pocs_time is not None and pocs_time > '':
+    if virtual_clock is not None:
+        _time = virtual_clock.now()
+    elif pocs_time is not None and pocs_time > '':
         _time = Time(os.getenv('POCSTIME'))
     else:
         _time = Time.now()
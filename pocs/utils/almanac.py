@@ -0,0 +1,221 @@
+import numpy as np
+
+from astroplan import moon_illumination
+from astropy import units as u
+from astropy.coordinates import AltAz
+from astropy.coordinates import ICRS
+from astropy.coordinates import SkyCoord
+from astropy.coordinates import UnitSphericalRepresentation
+from astropy.coordinates import get_moon
+from astropy.coordinates import get_sun
+from astropy.time import Time
+
+
+class Almanac(object):
+
+    @u.quantity_input(twilight_horizon=u.degree, resolution=u.second)
+    def __init__(self, observer, twilight_horizon=-18 * u.degree, resolution=10 * u.minute):
+        """ Cached Sun and Moon ephemeris for an observer
+
+        The positions of the Sun and Moon, the Moon illumination and phase are
+        computed once on a regular time grid covering the previous day and the
+        next two days. Values in between are interpolated and the times of
+        sunset, sunrise and twilight are found from the crossings of the Sun's
+        altitude. The grid is rebuilt when asked about a time more than a day
+        after it was created (or before it), so in normal operation this is
+        done once a day.
+
+        Args:
+            observer (`astroplan.Observer`): The observer
+            twilight_horizon (u.degree, optional): Altitude of the Sun that marks
+                the start and end of the night, defaults to -18 degrees
+            resolution (u.second, optional): Spacing of the time grid, defaults
+                to 10 minutes. Linear interpolation on this grid is accurate to
+                a few arcseconds for the Sun and Moon positions.
+        """
+        self.observer = observer
+        self.twilight_horizon = twilight_horizon
+        self.resolution = resolution
+
+        self._jd = None
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def is_night(self, time):
+        """ If the Sun is below `twilight_horizon` at `time` """
+        return bool(self.sun_alt(time) < self.twilight_horizon)
+
+    def sun_alt(self, time):
+        """ Altitude of the Sun at `time` """
+        return self._interpolate(time, '_sun_alt') * u.degree
+
+    def moon_alt(self, time):
+        """ Altitude of the Moon at `time` """
+        return self._interpolate(time, '_moon_alt') * u.degree
+
+    def moon_illumination(self, time):
+        """ Fraction of the Moon illuminated at `time` """
+        return float(self._interpolate(time, '_moon_illumination'))
+
+    def moon_phase(self, time):
+        """ Phase angle of the Moon at `time`, 0 is full and pi is new """
+        return self._interpolate(time, '_moon_phase') * u.radian
+
+    def moon(self, time):
+        """ Position of the Moon at `time`
+
+        Returns:
+            astropy.coordinates.SkyCoord: The direction of the (topocentric) Moon
+                in ICRS, for separations from fields
+        """
+        xyz = self._interpolate(time, '_moon_xyz')
+        xyz = xyz / np.sqrt((xyz ** 2).sum())
+
+        ra = np.degrees(np.arctan2(xyz[1], xyz[0])) % 360
+        dec = np.degrees(np.arcsin(xyz[2]))
+
+        return SkyCoord(ra=ra * u.degree, dec=dec * u.degree, frame='icrs')
+
+    def sun_set_time(self, time, which='nearest'):
+        """ Time the Sun sets below the horizon, see `get_event` """
+        return self.get_event(time, '_sun_set', which=which)
+
+    def sun_rise_time(self, time, which='nearest'):
+        """ Time the Sun rises above the horizon, see `get_event` """
+        return self.get_event(time, '_sun_rise', which=which)
+
+    def twilight_evening(self, time, which='nearest'):
+        """ Time the Sun sets below `twilight_horizon`, see `get_event` """
+        return self.get_event(time, '_twilight_evening', which=which)
+
+    def twilight_morning(self, time, which='nearest'):
+        """ Time the Sun rises above `twilight_horizon`, see `get_event` """
+        return self.get_event(time, '_twilight_morning', which=which)
+
+    def tonight(self, time):
+        """ Start and end of the night
+
+        Equivalent to `astroplan.Observer.tonight` with `horizon=twilight_horizon`:
+        if it is night at `time` the night starts at `time`, otherwise at the
+        next evening twilight.
+
+        Returns:
+            tuple: `astropy.time.Time` of the start and end of the night
+        """
+        if self.is_night(time):
+            start = time
+        else:
+            start = self.twilight_evening(time, which='next')
+
+        return start, self.twilight_morning(start, which='next')
+
+    def get_event(self, time, event, which='nearest'):
+        """ Time of a Sun event relative to `time`
+
+        Args:
+            time (astropy.time.Time): Reference time
+            event (str): Name of the event array, e.g. '_sun_set'
+            which (str, optional): 'next', 'previous' or 'nearest' (default)
+
+        Returns:
+            astropy.time.Time: Time of the event
+
+        Raises:
+            ValueError: If there is no such event within the grid, i.e. from a
+                day before to a day after the day of `time` (e.g. the Sun
+                doesn't set at the site)
+        """
+        if which not in ['next', 'previous', 'nearest']:
+            raise ValueError('which must be next, previous or nearest')
+
+        self._check_grid(time)
+
+        events = getattr(self, event)
+        k = np.searchsorted(events, time.jd)
+
+        candidates = list()
+        if which in ['previous', 'nearest'] and k > 0:
+            candidates.append(events[k - 1])
+        if which in ['next', 'nearest'] and k < len(events):
+            candidates.append(events[k])
+
+        if len(candidates) == 0:
+            raise ValueError("No {} {} within a day of {}".format(
+                which, event.strip('_').replace('_', ' '), time.isot))
+
+        jd = min(candidates, key=lambda x: abs(x - time.jd))
+
+        return Time(jd, format='jd')
+
+    def status(self, time):
+        """ Almanac information for `time` as used in the observatory status """
+        return {
+            'local_evening_astro_time': self.twilight_evening(time, which='next'),
+            'local_morning_astro_time': self.twilight_morning(time, which='next'),
+            'local_sun_set_time': self.sun_set_time(time),
+            'local_sun_rise_time': self.sun_rise_time(time),
+            'local_moon_alt': self.moon_alt(time),
+            'local_moon_illumination': self.moon_illumination(time),
+            'local_moon_phase': self.moon_phase(time),
+        }
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _check_grid(self, time):
+        """ Rebuild the grid unless `time` is on the middle day of it """
+        if self._jd is None or not (self._jd[0] + 1 <= time.jd <= self._jd[0] + 2):
+            self._build_grid(time)
+
+    def _build_grid(self, time):
+        num_points = int(np.ceil((3 * u.day / self.resolution).decompose().value)) + 1
+        self._jd = np.linspace(time.jd - 1, time.jd + 2, num_points)
+
+        times = Time(self._jd, format='jd')
+        altaz_frame = AltAz(obstime=times, location=self.observer.location)
+
+        sun = get_sun(times)
+        moon = get_moon(times, location=self.observer.location)
+
+        self._sun_alt = sun.transform_to(altaz_frame).alt.degree
+        self._moon_alt = moon.transform_to(altaz_frame).alt.degree
+        self._moon_illumination = moon_illumination(times)
+        self._moon_phase = self.observer.moon_phase(times).to(u.radian).value
+
+        # Direction of the Moon, without distance so the ICRS direction stays topocentric
+        moon_icrs = SkyCoord(moon.frame.realize_frame(
+            moon.represent_as(UnitSphericalRepresentation))).transform_to(ICRS())
+        self._moon_xyz = moon_icrs.cartesian.xyz.value
+
+        self._sun_rise, self._sun_set = self._crossings(0.)
+        self._twilight_morning, self._twilight_evening = self._crossings(
+            self.twilight_horizon.to(u.degree).value)
+
+    def _crossings(self, horizon):
+        """ Julian dates the Sun crosses `horizon` going up and going down """
+        above = self._sun_alt > horizon
+        k = np.flatnonzero(above[1:] != above[:-1])
+
+        alt0 = self._sun_alt[k]
+        alt1 = self._sun_alt[k + 1]
+        jd = self._jd[k] + (horizon - alt0) / (alt1 - alt0) * (self._jd[k + 1] - self._jd[k])
+
+        rising = above[k + 1]
+
+        return jd[rising], jd[~rising]
+
+    def _interpolate(self, time, name):
+        self._check_grid(time)
+
+        values = getattr(self, name)
+
+        k = np.searchsorted(self._jd, time.jd, side='right') - 1
+        frac = (time.jd - self._jd[k]) / (self._jd[k + 1] - self._jd[k])
+
+        return values[..., k] + frac * (values[..., k + 1] - values[..., k])
+
+    def __str__(self):
+        return "Almanac for {}".format(self.observer.name)
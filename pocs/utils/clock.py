@@ -0,0 +1,89 @@
+""" Clock used by POCS for the current time, sleeps and timers
+
+By default this is the real clock. For simulations a `VirtualClock` that runs
+faster than real time can be set with `set_virtual_clock`, after which
+`~pocs.utils.current_time` reports the virtual time and `sleep` and `Timer`
+take virtual seconds, so that a whole night of observing with the simulators
+runs in minutes:
+
+    from pocs.utils import clock
+    clock.set_virtual_clock('2016-08-13 05:00:00', speedup=120)
+
+The virtual clock is shared by all threads and by processes forked after it is
+set, since it only relates the real time to the virtual time.
+"""
+import threading
+import time
+
+from astropy import units as u
+from astropy.time import Time
+
+_clock = None
+
+
+class VirtualClock(object):
+
+    def __init__(self, start_time, speedup=60.):
+        """ A clock that starts at `start_time` and runs `speedup` times faster than real time
+
+        Args:
+            start_time (astropy.time.Time or str): Virtual time when the clock is created
+            speedup (float, optional): Virtual seconds per real second, defaults to 60
+        """
+        assert speedup > 0, "speedup must be positive"
+
+        self.start_time = Time(start_time)
+        self.speedup = float(speedup)
+
+        self._real_start = time.monotonic()
+
+    def now(self):
+        """ The current virtual time """
+        elapsed = (time.monotonic() - self._real_start) * self.speedup
+        return self.start_time + elapsed * u.second
+
+    def real_seconds(self, seconds):
+        """ Real seconds corresponding to `seconds` of virtual time """
+        return seconds / self.speedup
+
+    def __str__(self):
+        return "Virtual clock at {} ({}x)".format(self.now().isot, self.speedup)
+
+
+def set_virtual_clock(start_time, speedup=60.):
+    """ Use a `VirtualClock` for the current time, sleeps and timers
+
+    Returns:
+        VirtualClock: The new clock
+    """
+    global _clock
+    _clock = VirtualClock(start_time, speedup=speedup)
+
+    return _clock
+
+
+def clear_virtual_clock():
+    """ Go back to the real clock """
+    global _clock
+    _clock = None
+
+
+def get_virtual_clock():
+    """ The `VirtualClock` in use, or None when using the real clock """
+    return _clock
+
+
+def sleep(seconds):
+    """ Sleep for `seconds` of (virtual) time """
+    if _clock is not None:
+        seconds = _clock.real_seconds(seconds)
+
+    time.sleep(seconds)
+
+
+def Timer(interval, function, args=None, kwargs=None):
+    """ A `threading.Timer` that fires after `interval` seconds of (virtual) time """
+    if _clock is not None:
+        interval = _clock.real_seconds(interval)
+
+    return threading.Timer(interval, function, args=args, kwargs=kwargs)
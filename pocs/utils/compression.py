@@ -0,0 +1,192 @@
+""" In-process tile compression of FITS files
+
+Files are compressed with astropy's `~astropy.io.fits.CompImageHDU` instead of
+running `fpack` for each file. The output is the same as `fpack -D`: a
+`.fits.fz` file with an empty primary HDU and the compressed image (with its
+header) in the first extension, and the original file is removed once the
+compressed file has been checked. Directories are compressed with a pool of
+worker processes, and the throughput is reported so that the housekeeping time
+can be predicted:
+
+    from pocs.utils import compression
+    stats = compression.compress_dir('/var/panoptes/images/fields/Wasp33/')
+    print(stats['mb_per_second'])
+"""
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+
+import numpy as np
+
+from astropy.io import fits
+
+from pocs.utils import error
+
+COMPRESSION_TYPES = ['RICE_1', 'HCOMPRESS_1', 'GZIP_1', 'GZIP_2', 'PLIO_1']
+
+
+def compress(fits_fname, compression_type='RICE_1', quantize_level=16., hcomp_scale=0,
+             verify=True, remove=True):
+    """ Compress a FITS file to a `.fits.fz` file
+
+    Integer images are compressed losslessly (unless `hcomp_scale` is used with
+    HCOMPRESS), floating point images are quantized as with `fpack`.
+
+    Args:
+        fits_fname (str): Name of the FITS file
+        compression_type (str, optional): One of `COMPRESSION_TYPES`, defaults
+            to 'RICE_1' as with `fpack`
+        quantize_level (float, optional): Quantization of floating point images,
+            defaults to 16
+        hcomp_scale (float, optional): Scale for HCOMPRESS, defaults to 0 (lossless)
+        verify (bool, optional): Read the compressed file back and check the
+            data, defaults to True
+        remove (bool, optional): Remove the original file, defaults to True
+
+    Returns:
+        str: Name of the compressed file
+
+    Raises:
+        error.PanError: If the round trip of the data failed
+    """
+    assert compression_type in COMPRESSION_TYPES, \
+        "compression_type must be one of {}".format(COMPRESSION_TYPES)
+
+    out_file = fits_fname.replace('.fits', '.fits.fz')
+    tmp_file = out_file + '.tmp'
+
+    with fits.open(fits_fname) as hdu_list:
+        hdu = _get_image_hdu(hdu_list)
+        data = hdu.data
+        header = hdu.header.copy()
+
+        # Structural and scaling keywords are set by `CompImageHDU`
+        for keyword in ['SIMPLE', 'EXTEND', 'XTENSION', 'PCOUNT', 'GCOUNT', 'BZERO', 'BSCALE']:
+            header.remove(keyword, ignore_missing=True)
+
+        comp_hdu = fits.CompImageHDU(data=data, header=header,
+                                     compression_type=compression_type,
+                                     quantize_level=quantize_level,
+                                     hcomp_scale=hcomp_scale)
+
+        fits.HDUList([fits.PrimaryHDU(), comp_hdu]).writeto(tmp_file, overwrite=True)
+
+        if verify:
+            try:
+                _verify(data, tmp_file)
+            except error.PanError:
+                os.remove(tmp_file)
+                raise
+
+    os.replace(tmp_file, out_file)
+
+    if remove:
+        os.remove(fits_fname)
+
+    return out_file
+
+
+def decompress(fz_fname, remove=True):
+    """ Decompress a `.fits.fz` file made by `compress` or `fpack`
+
+    Args:
+        fz_fname (str): Name of the compressed file
+        remove (bool, optional): Remove the compressed file, defaults to True
+
+    Returns:
+        str: Name of the FITS file
+    """
+    out_file = fz_fname.replace('.fz', '')
+
+    with fits.open(fz_fname) as hdu_list:
+        hdu = _get_image_hdu(hdu_list)
+        fits.PrimaryHDU(data=hdu.data, header=hdu.header).writeto(out_file, overwrite=True)
+
+    if remove:
+        os.remove(fz_fname)
+
+    return out_file
+
+
+def compress_files(fits_files, max_workers=None, use_processes=True, **kwargs):
+    """ Compress FITS files in parallel
+
+    Args:
+        fits_files (list): Names of the FITS files
+        max_workers (int, optional): Number of workers, defaults to the number
+            of CPUs
+        use_processes (bool, optional): Use processes rather than threads,
+            defaults to True
+        **kwargs: Options passed to `compress`
+
+    Returns:
+        dict: The `compressed` files, the `failed` files (with their errors),
+            the total `bytes_in` and `bytes_out`, the `seconds` taken, the
+            `mb_per_second` and the compression `ratio` of the files that were
+            compressed
+    """
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+
+    sizes = {f: os.path.getsize(f) for f in fits_files}
+    bytes_in = sum(sizes.values())
+
+    compressed = list()
+    failed = dict()
+
+    t0 = time.perf_counter()
+    with executor_class(max_workers=max_workers) as executor:
+        futures = {executor.submit(compress, f, **kwargs): f for f in fits_files}
+
+        for future, fname in futures.items():
+            try:
+                compressed.append(future.result())
+            except Exception as e:
+                failed[fname] = str(e)
+    seconds = time.perf_counter() - t0
+
+    bytes_out = sum(os.path.getsize(f) for f in compressed)
+    bytes_compressed = sum(size for f, size in sizes.items() if f not in failed)
+
+    return {
+        'compressed': compressed,
+        'failed': failed,
+        'bytes_in': bytes_in,
+        'bytes_out': bytes_out,
+        'seconds': seconds,
+        'mb_per_second': bytes_compressed / 1e6 / seconds if seconds > 0 else 0.,
+        'ratio': bytes_compressed / bytes_out if bytes_out > 0 else 0.,
+    }
+
+
+def compress_dir(dir_name, pattern='*.fits', **kwargs):
+    """ Compress the FITS files of a directory in parallel, see `compress_files` """
+    return compress_files(sorted(glob(os.path.join(dir_name, pattern))), **kwargs)
+
+
+def _get_image_hdu(hdu_list):
+    """ The first HDU with image data """
+    for hdu in hdu_list:
+        if hdu.data is not None:
+            return hdu
+
+    raise error.PanError("No image data in {}".format(hdu_list.filename()))
+
+
+def _verify(data, fz_fname):
+    with fits.open(fz_fname) as hdu_list:
+        restored = hdu_list[1].data
+
+        if restored.shape != data.shape:
+            raise error.PanError("Compressed data has the wrong shape: {}".format(fz_fname))
+
+        if np.issubdtype(data.dtype, np.integer):
+            ok = np.array_equal(restored, data)
+        else:
+            # Quantized, so only check that the data is close relative to the noise
+            ok = np.allclose(restored, data, equal_nan=True, atol=np.nanstd(data))
+
+        if not ok:
+            raise error.PanError("Compressed data differs from the original: {}".format(fz_fname))
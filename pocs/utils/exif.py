@@ -0,0 +1,168 @@
+import atexit
+import os
+import subprocess
+import threading
+
+from json import loads
+
+from pocs.utils import error
+from pocs.utils import listify
+
+_sessions = dict()
+_sessions_lock = threading.Lock()
+
+
+class ExifTool(object):
+
+    def __init__(self, executable='exiftool'):
+        """ A persistent `exiftool` process for reading metadata
+
+        Starting `exiftool` (a Perl program) costs much more than reading the
+        metadata of one file, so this keeps a single `exiftool -stay_open`
+        process that is sent one request per batch of files. The process is
+        started on the first request (and again if it stopped or if the
+        session is used from a forked process). Requests from several threads
+        are serialized.
+
+        Args:
+            executable (str, optional): Path to `exiftool`, defaults to 'exiftool'
+        """
+        self.executable = executable
+
+        self._lock = threading.Lock()
+        self._proc = None
+        self._pid = None
+        self._num_requests = 0
+
+##########################################################################
+# Properties
+##########################################################################
+
+    @property
+    def is_running(self):
+        return self._proc is not None and self._proc.poll() is None and self._pid == os.getpid()
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def get_metadata(self, fnames):
+        """ Read the metadata of one or more files
+
+        Args:
+            fnames (str or list): Name(s) of the files
+
+        Returns:
+            dict or list: The metadata of the file (as with `exiftool -j`), or a
+                list of them if a list of files was given
+        """
+        single = isinstance(fnames, str)
+        fnames = listify(fnames)
+
+        for fname in fnames:
+            assert os.path.exists(fname), "File does not exist: {}".format(fname)
+
+        if len(fnames) == 0:
+            return []
+
+        output = self.execute('-j', *fnames)
+
+        try:
+            metadata = loads(output)
+        except ValueError:
+            raise error.InvalidSystemCommand(msg="Bad output from exiftool: {}".format(output))
+
+        if len(metadata) != len(fnames):
+            raise error.InvalidSystemCommand(
+                msg="exiftool read {} of {} files".format(len(metadata), len(fnames)))
+
+        return metadata[0] if single else metadata
+
+    def execute(self, *args):
+        """ Run `exiftool` with the given arguments
+
+        Returns:
+            str: The output of `exiftool`
+        """
+        with self._lock:
+            if not self.is_running:
+                self._start()
+
+            self._num_requests += 1
+            ready = '{{ready{}}}'.format(self._num_requests)
+
+            command = list(args) + ['-execute{}'.format(self._num_requests)]
+            try:
+                self._proc.stdin.write(('\n'.join(command) + '\n').encode('utf-8'))
+                self._proc.stdin.flush()
+            except BrokenPipeError:
+                self._proc = None
+                raise error.InvalidSystemCommand(msg="exiftool has stopped")
+
+            lines = list()
+            while True:
+                line = self._proc.stdout.readline()
+                if not line:
+                    self._proc = None
+                    raise error.InvalidSystemCommand(msg="exiftool has stopped")
+
+                line = line.decode('utf-8')
+                if line.strip() == ready:
+                    break
+
+                lines.append(line)
+
+        return ''.join(lines)
+
+    def close(self):
+        """ Stop the `exiftool` process """
+        with self._lock:
+            if self.is_running:
+                try:
+                    self._proc.stdin.write(b'-stay_open\nFalse\n')
+                    self._proc.stdin.flush()
+                    self._proc.wait(timeout=5)
+                except (BrokenPipeError, subprocess.TimeoutExpired):
+                    self._proc.kill()
+
+            self._proc = None
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _start(self):
+        try:
+            self._proc = subprocess.Popen([self.executable, '-stay_open', 'True', '-@', '-'],
+                                          stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL)
+        except OSError as e:
+            raise error.InvalidSystemCommand(msg="Can't start exiftool: {}".format(e))
+
+        self._pid = os.getpid()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __str__(self):
+        return "ExifTool {} ({})".format(self.executable,
+                                         'running' if self.is_running else 'stopped')
+
+
+def get_exiftool(executable='exiftool'):
+    """ The `ExifTool` session shared by the process, created on first use """
+    with _sessions_lock:
+        if executable not in _sessions:
+            _sessions[executable] = ExifTool(executable)
+
+        return _sessions[executable]
+
+
+@atexit.register
+def _close_sessions():
+    for session in list(_sessions.values()):
+        session.close()
@@ -0,0 +1,143 @@
+""" Read only the parts of a FITS file that are used
+
+`FitsFile` memory-maps the file and reads the header of the image without its
+data, and crops or other sections of the image through the `section` of the
+HDU, which only reads the rows (or, for tile compressed files, the tiles) of
+the section and applies the scaling to them alone. Reading the data with
+`fits.getdata` instead reads and scales the whole image, e.g. 32 MB for a
+500x500 thumbnail of a large CCD frame.
+"""
+import numpy as np
+
+from astropy.io import fits
+
+from pocs.utils import error
+
+
+class FitsFile(object):
+
+    def __init__(self, fname):
+        """ A FITS file opened for windowed reads
+
+        The first HDU with an image is used, i.e. the primary HDU or the first
+        extension of a `.fz` file. The file stays open (memory-mapped) until
+        `close` is called, or at the end of a `with` block:
+
+            with FitsFile('image.fits') as f:
+                thumbnail = f.crop(box_width=500)
+
+        Args:
+            fname (str): Name of the FITS file (can be .fz)
+        """
+        self.fname = fname
+
+        # Not `memmap=True`, which refuses to read scaled (BZERO/BSCALE) images,
+        # i.e. the unsigned 16-bit frames of the cameras. The raw data is still
+        # memory-mapped by default and only the slices used are scaled.
+        self._hdu_list = fits.open(fname)
+
+        self._hdu = None
+        for hdu in self._hdu_list:
+            if hdu.header.get('NAXIS', 0) >= 2 or hdu.header.get('ZNAXIS', 0) >= 2:
+                self._hdu = hdu
+                break
+
+        if self._hdu is None:
+            self._hdu_list.close()
+            raise error.PanError("No image in FITS file: {}".format(fname))
+
+##########################################################################
+# Properties
+##########################################################################
+
+    @property
+    def header(self):
+        """ Header of the image, read without the data """
+        return self._hdu.header
+
+    @property
+    def shape(self):
+        """ Shape of the image (rows, columns) from the header """
+        return self._hdu.shape
+
+    @property
+    def section(self):
+        """ Lazy view of the image, only the pixels that are sliced are read """
+        return self._hdu.section
+
+    @property
+    def data(self):
+        """ All of the image data """
+        return self._hdu.data
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def crop(self, box_width=200, center=None):
+        """ A box of the image, as with `~pocs.utils.images.crop_data`
+
+        Only the pixels in the box are read from the file.
+
+        Args:
+            box_width (int, optional): Size of box width in pixels, defaults to 200
+            center (tuple(int), optional): Crop around set of coords, defaults to
+                image center.
+
+        Returns:
+            numpy.array: The cropped data
+        """
+        rows, columns = get_crop_slices(self.shape, box_width=box_width, center=center)
+
+        return np.array(self.section[rows, columns])
+
+    def close(self):
+        self._hdu_list.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __str__(self):
+        return "FITS file {} {}".format(self.fname, self.shape)
+
+
+def get_crop_slices(shape, box_width=200, center=None):
+    """ The row and column slices of a box of an image of the given shape
+
+    See `~pocs.utils.images.crop_data` for the arguments.
+
+    Returns:
+        tuple(slice): The row and column slices
+    """
+    assert shape[0] >= box_width, "Can't clip data, it's smaller than {} ({})".format(
+        box_width, shape)
+
+    if center is None:
+        row_center = int(shape[0] / 2)
+        column_center = int(shape[1] / 2)
+    else:
+        column_center = int(center[0])
+        row_center = int(center[1])
+
+    box_width = int(box_width / 2)
+
+    return (slice(row_center - box_width, row_center + box_width),
+            slice(column_center - box_width, column_center + box_width))
+
+
+def read_header(fname):
+    """ Header of the image of a FITS file, without reading the data """
+    with FitsFile(fname) as fits_file:
+        return fits_file.header.copy()
+
+
+def read_crop(fname, box_width=200, center=None):
+    """ A box of the image of a FITS file, reading only its pixels
+
+    See `FitsFile.crop` for the arguments.
+    """
+    with FitsFile(fname) as fits_file:
+        return fits_file.crop(box_width=box_width, center=center)
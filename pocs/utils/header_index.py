@@ -0,0 +1,300 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from pocs.utils import fits_access
+
+FITS_EXTENSIONS = ('.fits', '.fits.fz')
+
+# Columns of the index, with the header keyword they come from
+COLUMNS = [
+    ('seqid', 'SEQID'),
+    ('imageid', 'IMAGEID'),
+    ('imagetyp', 'IMAGETYP'),
+    ('date_obs', 'DATE-OBS'),
+    ('exptime', 'EXPTIME'),
+]
+
+
+class HeaderIndex(object):
+
+    def __init__(self, filename=None, root=None):
+        """ Searchable index of the headers of the image archive
+
+        The header of every FITS file (including `.fz` files, whose pixels
+        aren't decompressed) under `root` is stored in an SQLite file, along
+        with the field, camera and sequence time from its path
+        (`<root>/<field>/<camera>/<sequence time>/<file>`). `update` only reads
+        the headers of the files that are new or changed (by mtime and size)
+        since the last update and drops the files that are gone, and `query`
+        finds files by field, camera, `SEQID`, `IMAGETYP` and `DATE-OBS` range
+        from the indexed columns, without touching the file system:
+
+            index = HeaderIndex()
+            index.update()
+            frames = index.query(field='Wasp33', start='2018-01-01T12:00:00',
+                                 end='2018-01-02T12:00:00')
+
+        Args:
+            filename (str, optional): SQLite file for the index, created if
+                needed, defaults to `$PANDIR/data/header_index.sqlite`
+            root (str, optional): Directory of the archive, defaults to
+                `$PANDIR/images/fields`
+        """
+        pandir = os.getenv('PANDIR', '/var/panoptes')
+
+        if filename is None:
+            filename = os.path.join(pandir, 'data', 'header_index.sqlite')
+        if root is None:
+            root = os.path.join(pandir, 'images', 'fields')
+
+        self.filename = filename
+        self.root = os.path.normpath(root)
+
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS headers (
+                            path TEXT PRIMARY KEY,
+                            mtime REAL,
+                            size INTEGER,
+                            field TEXT,
+                            camera TEXT,
+                            seq_time TEXT,
+                            seqid TEXT,
+                            imageid TEXT,
+                            imagetyp TEXT,
+                            date_obs TEXT,
+                            exptime REAL,
+                            header TEXT)""")
+        for column in ['field', 'camera', 'seqid', 'imagetyp', 'date_obs']:
+            self._db.execute("CREATE INDEX IF NOT EXISTS headers_{0} ON headers ({0})".format(
+                column))
+        self._db.commit()
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def update(self, directory=None, max_workers=4):
+        """ Index the new and changed files under a directory
+
+        Args:
+            directory (str, optional): Directory to scan, defaults to `root`
+            max_workers (int, optional): Number of headers read at once,
+                defaults to 4
+
+        Returns:
+            dict: Numbers of files `added`, `updated`, `removed` and `unchanged`,
+                the `failed` files with their errors and the `seconds` taken
+        """
+        t0 = time.perf_counter()
+        directory = os.path.normpath(directory or self.root)
+
+        found = _scan(directory)
+
+        with self._lock:
+            indexed = {path: (mtime, size) for path, mtime, size in self._db.execute(
+                "SELECT path, mtime, size FROM headers WHERE path >= ? AND path < ?",
+                (directory + os.sep, directory + chr(ord(os.sep) + 1)))}
+
+        changed = [path for path, stat in found.items() if indexed.get(path) != stat]
+        removed = [path for path in indexed if path not in found]
+
+        failed = dict()
+        rows = list()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {path: executor.submit(fits_access.read_header, path) for path in changed}
+            for path, future in futures.items():
+                try:
+                    header = future.result()
+                except Exception as e:
+                    failed[path] = str(e)
+                else:
+                    rows.append(self._get_row(path, found[path], header))
+
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO headers VALUES "
+                                 "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.executemany("DELETE FROM headers WHERE path = ?",
+                                 [(path,) for path in removed])
+            self._db.commit()
+
+        num_updated = len([row for row in rows if row[0] in indexed])
+
+        return {
+            'added': len(rows) - num_updated,
+            'updated': num_updated,
+            'removed': len(removed),
+            'unchanged': len(found) - len(changed),
+            'failed': failed,
+            'seconds': time.perf_counter() - t0,
+        }
+
+    def query(self, field=None, camera=None, seqid=None, imagetyp=None, start=None, end=None,
+              limit=None):
+        """ Find the indexed files
+
+        Args:
+            field (str, optional): Field name
+            camera (str, optional): Camera uid
+            seqid (str, optional): Sequence id (`SEQID`)
+            imagetyp (str, optional): Image type (`IMAGETYP`), e.g. 'Light Frame'
+            start (optional): Earliest `DATE-OBS`, as a string, `datetime` or
+                `astropy.time.Time`
+            end (optional): Latest `DATE-OBS`, as for `start`
+            limit (int, optional): Maximum number of files
+
+        Returns:
+            list: A dict for each file, ordered by `DATE-OBS`, with the `path`,
+                `field`, `camera`, `seq_time`, `seqid`, `imageid`, `imagetyp`,
+                `date_obs`, `exptime` and `header` (a dict of the keywords)
+        """
+        where, params = _get_where(field=field, camera=camera, seqid=seqid, imagetyp=imagetyp,
+                                   start=start, end=end)
+
+        sql = "SELECT * FROM headers" + where + " ORDER BY date_obs, path"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            names = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+
+        results = list()
+        for row in rows:
+            result = dict(zip(names, row))
+            result['header'] = json.loads(result['header'])
+            del result['mtime']
+            del result['size']
+            results.append(result)
+
+        return results
+
+    def distinct(self, column, **kwargs):
+        """ The distinct values of a column (e.g. 'field' or 'seqid')
+
+        Args:
+            column (str): Name of the column
+            **kwargs: Conditions as for `query`
+
+        Returns:
+            list: The sorted values
+        """
+        assert column in ['field', 'camera', 'seq_time'] + [c for c, _ in COLUMNS], \
+            "Not an indexed column: {}".format(column)
+
+        where, params = _get_where(**kwargs)
+        sql = "SELECT DISTINCT {0} FROM headers{1} ORDER BY {0}".format(column, where)
+
+        with self._lock:
+            return [row[0] for row in self._db.execute(sql, params) if row[0] is not None]
+
+    def clear(self):
+        """ Remove all the files from the index """
+        with self._lock:
+            self._db.execute("DELETE FROM headers")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _get_row(self, path, stat, header):
+        parts = os.path.relpath(path, self.root).split(os.sep)
+        if len(parts) == 4 and parts[0] != '..':
+            field, camera, seq_time = parts[:3]
+        else:
+            field, camera, seq_time = header.get('FIELD'), header.get('INSTRUME'), None
+
+        keywords = dict()
+        for card in header.cards:
+            if card.keyword in ['', 'COMMENT', 'HISTORY']:
+                continue
+            value = card.value
+            if not isinstance(value, (bool, int, float, str)):
+                value = None if value is None else str(value)
+            keywords[card.keyword] = value
+
+        values = [keywords.get(keyword) for _, keyword in COLUMNS]
+
+        return tuple([path, stat[0], stat[1], field, camera, seq_time] + values +
+                     [json.dumps(keywords)])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM headers").fetchone()[0]
+
+    def __str__(self):
+        return "Header index {} ({} files)".format(self.filename, len(self))
+
+
+def _scan(directory):
+    """ The (mtime, size) of the FITS files under a directory, keyed by path """
+    found = dict()
+
+    for dir_name, _, fnames in os.walk(directory):
+        for fname in fnames:
+            if fname.endswith(FITS_EXTENSIONS):
+                path = os.path.join(dir_name, fname)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found[path] = (stat.st_mtime, stat.st_size)
+
+    return found
+
+
+def _get_where(field=None, camera=None, seqid=None, imagetyp=None, start=None, end=None):
+    """ The WHERE clause and its parameters for the conditions of `HeaderIndex.query` """
+    conditions = list()
+    params = list()
+
+    for column, value in [('field', field), ('camera', camera), ('seqid', seqid),
+                          ('imagetyp', imagetyp)]:
+        if value is not None:
+            conditions.append('{} = ?'.format(column))
+            params.append(value)
+
+    if start is not None:
+        conditions.append('date_obs >= ?')
+        params.append(_get_date_string(start))
+    if end is not None:
+        conditions.append('date_obs <= ?')
+        params.append(_get_date_string(end))
+
+    if not conditions:
+        return '', params
+
+    return ' WHERE ' + ' AND '.join(conditions), params
+
+
+def _get_date_string(date):
+    """ An ISO date string for comparing with `DATE-OBS` """
+    if hasattr(date, 'isot'):
+        return date.isot
+    if hasattr(date, 'isoformat'):
+        return date.isoformat()
+
+    return str(date)
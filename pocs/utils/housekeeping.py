@@ -0,0 +1,342 @@
+""" Parallel, resumable housekeeping of observation directories
+
+Each observation directory goes through the stages of `STAGES`: compressing
+the FITS files, removing the `.solved` files, finishing the timelapse and
+finally writing an index of the files. The stages of all the directories run
+on a pool of worker threads, each stage as soon as the stages it depends on
+are done. Every queued directory and finished or failed stage is appended to
+a journal file, so that a run that was interrupted is resumed by the next one
+without repeating the stages that were done. A stage that keeps failing is
+given up after `max_attempts` runs, and the journal is compacted to the last
+state of each stage at the end of every run.
+"""
+import json
+import os
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from pocs.utils import current_time
+from pocs.utils import fits_access
+from pocs.utils import images as img_utils
+
+# Stages and the stages they depend on
+STAGES = {
+    'compress': [],
+    'cleanup': [],
+    'timelapse': [],
+    'index': ['compress', 'cleanup', 'timelapse'],
+}
+
+INDEX_FILE = 'index.json'
+
+
+class Housekeeper(object):
+
+    def __init__(self, journal_file, max_workers=4, compress_workers=2, header_index=None,
+                 max_attempts=3, logger=None):
+        """ Run the housekeeping of observation directories
+
+        Args:
+            journal_file (str): File recording the finished stages, created if needed
+            max_workers (int, optional): Number of stages run at once, defaults to 4
+            compress_workers (int, optional): Processes used to compress the FITS
+                files of each directory, defaults to 2
+            header_index (`~pocs.utils.header_index.HeaderIndex`, optional): Index
+                updated with the headers of each directory by the index stage
+            max_attempts (int, optional): Number of runs in which a stage can
+                fail before it is given up, defaults to 3
+            logger (optional): Logger for the progress
+        """
+        self.journal_file = journal_file
+        self.max_workers = max_workers
+        self.compress_workers = compress_workers
+        self.header_index = header_index
+        self.max_attempts = max_attempts
+        self.logger = logger
+
+        dirname = os.path.dirname(journal_file)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self._lock = threading.Lock()
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def run(self, directories=None, progress=None):
+        """ Run the stages of the directories that aren't done yet
+
+        Args:
+            directories (list, optional): Observation directories, the directories
+                of the journal that aren't finished are always included
+            progress (callable, optional): Called with the number of stages
+                finished, the total number of stages and the (directory, stage)
+                after each stage
+
+        Returns:
+            dict: Numbers of stages `run` and `skipped` (done before), the
+                `failed` stages with their errors, the stages `given_up` after
+                failing `max_attempts` times, the total `seconds` of each stage
+                in `stage_seconds` and the `seconds` taken by the run
+        """
+        done = self.get_done()
+        given_up = self.get_given_up()
+
+        directories = [os.path.normpath(d) for d in (directories or [])]
+        for directory in self.pending_directories():
+            if directory not in directories:
+                directories.append(directory)
+
+        for directory in directories:
+            if directory not in done:
+                self._record(directory, None, 'queued')
+
+        tasks = [(directory, stage) for directory in directories for stage in STAGES
+                 if stage not in done.get(directory, set()) and
+                 (directory, stage) not in given_up]
+        num_skipped = sum(len(done.get(directory, set())) for directory in directories)
+
+        report = {
+            'run': 0,
+            'skipped': num_skipped,
+            'failed': dict(),
+            'given_up': sorted(task for task in given_up if task[0] in directories),
+            'stage_seconds': {stage: 0. for stage in STAGES},
+            'seconds': 0.,
+        }
+
+        t0 = time.perf_counter()
+        finished = {d: set(done.get(d, set())) for d in directories}
+        failed = set(given_up)
+        waiting = list(tasks)
+        running = dict()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while waiting or running:
+                for task in list(waiting):
+                    directory, stage = task
+                    dependencies = STAGES[stage]
+
+                    if any((directory, dep) in failed for dep in dependencies):
+                        waiting.remove(task)
+                        failed.add(task)
+                        report['failed'][task] = "Depends on a failed stage"
+                        self._record(directory, stage, 'failed', error=report['failed'][task])
+                    elif all(dep in finished[directory] for dep in dependencies):
+                        waiting.remove(task)
+                        running[executor.submit(self._run_stage, directory, stage)] = task
+
+                if not running:
+                    break
+
+                completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    task = running.pop(future)
+                    directory, stage = task
+
+                    try:
+                        seconds = future.result()
+                    except Exception as e:
+                        failed.add(task)
+                        report['failed'][task] = str(e)
+                        self._record(directory, stage, 'failed', error=str(e))
+                        self._log('warning', "Housekeeping {} of {} failed: {}".format(
+                            stage, directory, e))
+                    else:
+                        finished[directory].add(stage)
+                        report['run'] += 1
+                        report['stage_seconds'][stage] += seconds
+
+                    num_finished = report['run'] + len(report['failed'])
+                    self._log('debug', "Housekeeping: {}/{} stages ({} of {})".format(
+                        num_finished, len(tasks), stage, directory))
+                    if progress is not None:
+                        progress(num_finished, len(tasks), task)
+
+        self.compact()
+
+        for directory, stage in report['given_up']:
+            self._log('warning', "Housekeeping {} of {} given up after {} attempts".format(
+                stage, directory, self.max_attempts))
+
+        report['seconds'] = time.perf_counter() - t0
+
+        self._log('info', "Housekeeping: {} stages in {:.1f} s, {} skipped, {} failed ({})".format(
+            report['run'], report['seconds'], report['skipped'], len(report['failed']),
+            ', '.join('{} {:.1f} s'.format(stage, seconds)
+                      for stage, seconds in report['stage_seconds'].items())))
+
+        return report
+
+    def get_done(self):
+        """ The stages done for each directory, according to the journal
+
+        Returns:
+            dict: Set of the stages done, keyed by directory
+        """
+        done = dict()
+        for entry in self._read_journal():
+            stages = done.setdefault(entry['directory'], set())
+            if entry['status'] == 'done':
+                stages.add(entry['stage'])
+
+        return done
+
+    def get_given_up(self):
+        """ The stages that failed `max_attempts` times since they were last done
+
+        Returns:
+            set: The (directory, stage) given up
+        """
+        attempts = dict()
+        for entry in self._read_journal():
+            task = (entry['directory'], entry['stage'])
+            if entry['status'] == 'done':
+                attempts.pop(task, None)
+            elif entry['status'] == 'failed':
+                attempts[task] = attempts.get(task, 0) + entry.get('attempts', 1)
+
+        return {task for task, num_attempts in attempts.items()
+                if num_attempts >= self.max_attempts}
+
+    def pending_directories(self):
+        """ Directories of the journal with stages that are not done or given up """
+        given_up = {directory for directory, _ in self.get_given_up()}
+
+        return [directory for directory, stages in self.get_done().items()
+                if not set(STAGES).issubset(stages) and directory not in given_up]
+
+    def compact(self):
+        """ Rewrite the journal with the last state of each stage
+
+        The `queued` entries of the directories with a finished or failed stage
+        are dropped, and the failures of a stage since it was last done are
+        merged into a single entry with their number of `attempts`.
+        """
+        last = dict()
+        for entry in self._read_journal():
+            key = (entry['directory'], entry['stage'])
+            if entry['status'] == 'failed' and last.get(key, {}).get('status') == 'failed':
+                entry['attempts'] = last[key].get('attempts', 1) + entry.get('attempts', 1)
+            last[key] = entry
+
+        started = {directory for directory, stage in last if stage is not None}
+        entries = [entry for (directory, stage), entry in last.items()
+                   if stage is not None or directory not in started]
+
+        with self._lock:
+            tmp_file = self.journal_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.journal_file)
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _run_stage(self, directory, stage):
+        t0 = time.perf_counter()
+
+        if stage == 'compress':
+            # Raises if any file couldn't be compressed, so the stage isn't done
+            img_utils.compress_observation_dir(directory, max_workers=self.compress_workers)
+        elif stage == 'cleanup':
+            img_utils.remove_solved_files(directory)
+        elif stage == 'timelapse':
+            img_utils.finish_timelapse(directory)
+        elif stage == 'index':
+            write_dir_index(directory)
+            if self.header_index is not None and os.path.isdir(directory):
+                self.header_index.update(directory)
+
+        seconds = time.perf_counter() - t0
+        self._record(directory, stage, 'done', seconds=seconds)
+
+        return seconds
+
+    def _record(self, directory, stage, status, seconds=None, error=None):
+        entry = {
+            'directory': directory,
+            'stage': stage,
+            'status': status,
+            'seconds': seconds,
+            'time': current_time().isot,
+        }
+        if error is not None:
+            entry['error'] = error
+
+        with self._lock:
+            with open(self.journal_file, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_file):
+            return []
+
+        entries = list()
+        with self._lock:
+            with open(self.journal_file) as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # A line cut short by an interruption
+                        pass
+
+        return entries
+
+    def _log(self, level, msg):
+        if self.logger is not None:
+            getattr(self.logger, level)(msg)
+
+    def __str__(self):
+        return "Housekeeper ({})".format(self.journal_file)
+
+
+def write_dir_index(directory):
+    """ Write an index of the files of an observation directory
+
+    The index (`INDEX_FILE` in the directory) lists the size of each file and,
+    for the FITS files, a few of their header keywords.
+
+    Returns:
+        str: Name of the index file, or None if the directory doesn't exist
+    """
+    if not os.path.isdir(directory):
+        return None
+
+    files = dict()
+    for fname in sorted(os.listdir(directory)):
+        path = os.path.join(directory, fname)
+        if fname == INDEX_FILE or not os.path.isfile(path):
+            continue
+
+        info = {'size': os.path.getsize(path)}
+
+        if fname.endswith(('.fits', '.fits.fz')):
+            try:
+                header = fits_access.read_header(path)
+            except Exception:
+                pass
+            else:
+                for keyword in ['IMAGEID', 'SEQID', 'FIELD', 'DATE-OBS', 'EXPTIME']:
+                    if keyword in header:
+                        info[keyword] = header[keyword]
+
+        files[fname] = info
+
+    index_file = os.path.join(directory, INDEX_FILE)
+    with open(index_file, 'w') as f:
+        json.dump({'directory': directory, 'files': files}, f, indent=2, default=str)
+
+    return index_file
@@ -1,9 +1,11 @@
 import os
 import shutil
 import subprocess
+import threading
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from dateutil import parser as date_parser
-from json import loads
 
 import matplotlib
 matplotlib.use('Agg')
@@ -19,10 +21,17 @@ from astropy import units as u
 from astropy.io import fits
 from astropy.wcs import WCS
 
+from pocs.utils import compression
 from pocs.utils import current_time
 from pocs.utils import error
+from pocs.utils import exif
+from pocs.utils import fits_access
+from pocs.utils import timelapse
+from pocs.utils import listify
 from pocs.utils.config import load_config
 
+CALIBRATION_TYPES = ('bias', 'dark', 'flat')
+
 
 def solve_field(fname, timeout=15, solve_opts=[], **kwargs):
     """ Plate solves an image.
@@ -34,6 +43,10 @@ def solve_field(fname, timeout=15, solve_opts=[], **kwargs):
                                     defaults to 60 seconds.
         solve_opts(list, optional): List of options for solve-field.
         verbose(bool, optional):    Show output, defaults to False.
+        scale_low, scale_high(float, optional): Range of the pixel scale in
+                                    arcsec/pixel, the scale is guessed
+                                    otherwise. See `get_solve_hints`.
+        parity(str, optional):      Parity of the solution, 'pos' or 'neg'.
     """
     verbose = kwargs.get('verbose', False)
     if verbose:
@@ -51,7 +64,6 @@ def solve_field(fname, timeout=15, solve_opts=[], **kwargs):
         options = solve_opts
     else:
         options = [
-            '--guess-scale',
             '--cpulimit', str(timeout),
             '--no-verify',
             '--no-plots',
@@ -67,6 +79,16 @@ def solve_field(fname, timeout=15, solve_opts=[], **kwargs):
         if kwargs.get('skip_solved', True):
             options.append('--skip-solved')
 
+        if 'scale_low' in kwargs and 'scale_high' in kwargs:
+            options.extend(['--scale-units', 'arcsecperpix',
+                            '--scale-low', str(kwargs.get('scale_low')),
+                            '--scale-high', str(kwargs.get('scale_high'))])
+        else:
+            options.append('--guess-scale')
+        if 'parity' in kwargs:
+            options.append('--parity')
+            options.append(str(kwargs.get('parity')))
+
         if 'ra' in kwargs:
             options.append('--ra')
             options.append(str(kwargs.get('ra')))
@@ -111,7 +133,11 @@ def get_solve_field(fname, replace=True, remove_extras=True, **kwargs):
         fname ({str}): Name of file to be solved, either a FITS or CR2
         replace (bool, optional): Replace fname the solved file
         remove_extras (bool, optional): Remove the files generated by solver
-        **kwargs ({dict}): Options to pass to `solve_field`
+        **kwargs ({dict}): Options to pass to `solve_field`. Can also include
+            `on_start`, a function that is called with the `subprocess.Popen`
+            object once the solver is started (e.g. to be able to kill it), and
+            `cache`, a `~pocs.utils.solve_cache.SolveCache` that is checked
+            before solving and updated after a successful solve.
 
     Returns:
         dict: Keyword information from the solved field
@@ -138,7 +164,31 @@ def get_solve_field(fname, replace=True, remove_extras=True, **kwargs):
     # Set a default radius of 15
     kwargs.setdefault('radius', 15)
 
+    cache = kwargs.get('cache')
+    data_hash = None
+    if cache is not None and fname.endswith('.fits'):
+        data_hash = cache.get_data_hash(fname)
+
+        cached = None
+        if data_hash is not None:
+            cached = cache.get(fname, data_hash=data_hash, **kwargs)
+
+        if cached is not None:
+            if verbose:
+                print("Using cached solution for:", fname)
+
+            solved_fits_file = _apply_cached_solve(fname, cached[0], replace=replace)
+
+            out_dict['solved_fits_file'] = solved_fits_file
+            out_dict.update(fits.getheader(solved_fits_file))
+            return out_dict
+
+    solve_start = current_time()
     proc = solve_field(fname, **kwargs)
+
+    if kwargs.get('on_start') is not None:
+        kwargs['on_start'](proc)
+
     try:
         output, errs = proc.communicate(timeout=kwargs.get('timeout', 30))
     except subprocess.TimeoutExpired:
@@ -194,9 +244,94 @@ def get_solve_field(fname, replace=True, remove_extras=True, **kwargs):
             if verbose:
                 print("Can't read fits header for:", fname)
 
+        if data_hash is not None:
+            try:
+                cache.put(fname, fits.getheader(out_dict['solved_fits_file']),
+                          metadata={'solve_time': (current_time() - solve_start).sec,
+                                    'solved_at': solve_start.isot},
+                          data_hash=data_hash, **kwargs)
+            except Exception as e:
+                warn("Can't cache solution: {}".format(e))
+
     return out_dict
 
 
+def get_solve_hints(header=None, pixel_scale=None, scale_tolerance=0.05, radius=None):
+    """ Options for `solve_field` that narrow the search to a known solution
+
+    Without hints `solve_field` guesses the scale and searches 15 degrees
+    around the given position. With the pixel scale of the camera the scale is
+    only searched within `scale_tolerance` of it, and with the solution of an
+    earlier frame of the same sequence the parity, the position and a smaller
+    search radius are known too, which makes the solve of tracking frames much
+    faster.
+
+    Args:
+        header (astropy.io.fits.Header, optional): Solved header of an earlier
+            frame of the sequence
+        pixel_scale (float, optional): Pixel scale in arcsec/pixel, taken from
+            `header` if given
+        scale_tolerance (float, optional): Fraction of the pixel scale searched
+            either side of it, defaults to 0.05
+        radius (float, optional): Search radius in degrees, defaults to half of
+            the radius of the field of `header`
+
+    Returns:
+        dict: The `scale_low` and `scale_high` options if the scale is known, and
+            the `parity`, `ra`, `dec` and `radius` of the solution of `header`
+    """
+    hints = dict()
+
+    if header is not None:
+        header_wcs = WCS(header)
+        if header_wcs.is_celestial:
+            header_wcs = header_wcs.celestial
+
+            # Degrees per pixel
+            det = np.linalg.det(header_wcs.pixel_scale_matrix)
+            pixel_scale = np.sqrt(abs(det)) * 3600
+
+            # As with astrometry.net, a negative determinant is positive parity
+            hints['parity'] = 'pos' if det < 0 else 'neg'
+
+            hints['ra'], hints['dec'] = [float(v) for v in header_wcs.wcs.crval]
+
+            width = header.get('NAXIS1', header.get('IMAGEW'))
+            height = header.get('NAXIS2', header.get('IMAGEH'))
+            if radius is None and width and height:
+                radius = np.hypot(width, height) / 4 * pixel_scale / 3600
+            if radius is not None:
+                hints['radius'] = float(radius)
+
+    if pixel_scale:
+        hints['scale_low'] = float(pixel_scale) * (1 - scale_tolerance)
+        hints['scale_high'] = float(pixel_scale) * (1 + scale_tolerance)
+
+    return hints
+
+
+def _apply_cached_solve(fname, header, replace=True):
+    """ Write a cached WCS `header` into `fname`, or a `.new` copy of it
+
+    The `.solved` file is written too, as by the solver.
+
+    Returns:
+        str: Name of the file with the solution
+    """
+    solved_fits_file = fname
+    if not replace:
+        solved_fits_file = fname.replace('.fits', '.new')
+        shutil.copyfile(fname, solved_fits_file)
+
+    with fits.open(solved_fits_file, mode='update') as hdu_list:
+        hdu_list[0].header.update(header)
+
+    with open(fname.replace('.fits', '.solved'), 'w'):
+        pass
+
+    return solved_fits_file
+
+
 def improve_wcs(fname, remove_extras=True, replace=True, **kwargs):
     verbose = kwargs.get('verbose', False)
     out_dict = {}
@@ -278,33 +413,113 @@ def crop_data(data, box_width=200, center=None, verbose=False):
         box_width(int):     Size of box width in pixels, defaults to 200px
         center(tuple(int)): Crop around set of coords, defaults to image center.
 
+    Note:
+        To crop an image in a FITS file, `pocs.utils.fits_access.read_crop`
+        only reads the pixels of the box.
+
     Returns:
         np.array:           A clipped (thumbnailed) version of the data
     """
-    assert data.shape[0] >= box_width, "Can't clip data, it's smaller than {} ({})".format(
-        box_width, data.shape)
-    # Get the center
     if verbose:
         print("Data to crop: {}".format(data.shape))
 
-    if center is None:
-        x_len, y_len = data.shape
-        x_center = int(x_len / 2)
-        y_center = int(y_len / 2)
-    else:
-        y_center = int(center[0])
-        x_center = int(center[1])
-
-    box_width = int(box_width / 2)
+    rows, columns = fits_access.get_crop_slices(data.shape, box_width=box_width, center=center)
 
     if verbose:
-        print("Using center: {} {}".format(x_center, y_center))
-        print("Box width: {}".format(box_width))
+        print("Using rows: {} columns: {}".format(rows, columns))
+
+    return data[rows, columns]
+
+
+def get_registration_fft(data, bin_factor=2):
+    """ FFT of an image prepared for `register_images`
+
+    The image is binned by `bin_factor` (2 by default, which removes the Bayer
+    pattern of the DSLR frames), the background is subtracted and it is
+    multiplied by a Hann window so that the edges don't dominate the correlation.
+
+    Args:
+        data (numpy.array): 2D image data
+        bin_factor (int, optional): Binning of the image, defaults to 2
+
+    Returns:
+        numpy.array: The (complex) FFT of the prepared image
+    """
+    data = np.asarray(data, dtype=np.float32)
+
+    if bin_factor > 1:
+        ny = data.shape[0] // bin_factor * bin_factor
+        nx = data.shape[1] // bin_factor * bin_factor
+        data = data[:ny, :nx].reshape(ny // bin_factor, bin_factor,
+                                      nx // bin_factor, bin_factor).sum(axis=(1, 3))
+
+    data = data - np.median(data)
+    np.clip(data, 0, None, out=data)
+
+    window = np.outer(np.hanning(data.shape[0]), np.hanning(data.shape[1])).astype(np.float32)
 
-    center = data[x_center - box_width: x_center + box_width,
-                  y_center - box_width: y_center + box_width]
+    return np.fft.fft2(data * window)
 
-    return center
+
+def register_images(data, ref_data, bin_factor=2, ref_fft=None):
+    """ Shift between an image and a reference image by phase correlation
+
+    This is much faster than plate-solving both images when only the offset
+    between them is needed, e.g. to measure the drift between the frames of
+    an observation.
+
+    Args:
+        data (numpy.array): 2D image data
+        ref_data (numpy.array): 2D reference image data of the same shape, can
+            be None if `ref_fft` is given
+        bin_factor (int, optional): Binning of the images, defaults to 2
+        ref_fft (numpy.array, optional): `get_registration_fft` of the reference,
+            to avoid computing it for every image
+
+    Returns:
+        tuple: The (dx, dy) shift in (unbinned) pixels of the image with respect
+            to the reference, i.e. a star at (x, y) in the reference is at
+            (x + dx, y + dy) in the image, and the confidence of the
+            registration, which is the height of the correlation peak in
+            standard deviations of the correlation (above ~10 is reliable).
+    """
+    fft = get_registration_fft(data, bin_factor=bin_factor)
+    if ref_fft is None:
+        ref_fft = get_registration_fft(ref_data, bin_factor=bin_factor)
+
+    if fft.shape != ref_fft.shape:
+        raise ValueError("Image and reference have different shapes")
+
+    cross_power = fft * np.conj(ref_fft)
+    cross_power /= np.abs(cross_power) + 1e-12
+
+    correlation = np.fft.ifft2(cross_power).real
+
+    peak_y, peak_x = np.unravel_index(np.argmax(correlation), correlation.shape)
+    peak = correlation[peak_y, peak_x]
+
+    std = correlation.std()
+    confidence = (peak - correlation.mean()) / std if std > 0 else 0.
+
+    def subpixel(values, i):
+        # Parabola through the peak and its neighbours (wrapping at the edges)
+        left, centre, right = values[i - 1], values[i], values[(i + 1) % len(values)]
+        denominator = left - 2 * centre + right
+        if denominator == 0:
+            return float(i)
+        return i + 0.5 * (left - right) / denominator
+
+    shift_y = subpixel(correlation[:, peak_x], peak_y)
+    shift_x = subpixel(correlation[peak_y, :], peak_x)
+
+    # Shifts past half the image are negative
+    ny, nx = correlation.shape
+    if shift_y > ny / 2:
+        shift_y -= ny
+    if shift_x > nx / 2:
+        shift_x -= nx
+
+    return shift_x * bin_factor, shift_y * bin_factor, float(confidence)
 
 
 def get_wcsinfo(fits_fname, verbose=False):
@@ -490,9 +705,11 @@ def _make_pretty_from_fits(fname, timeout=15, **kwargs):
 
     ln_fn = '{}/latest.jpg'.format(image_dir)
 
+    # Copy rather than link, the image may be removed once added to a timelapse
     try:
-        os.remove(ln_fn)
-        os.symlink(new_filename, ln_fn)
+        if os.path.lexists(ln_fn):
+            os.remove(ln_fn)
+        shutil.copyfile(new_filename, ln_fn)
     except Exception:
         pass
 
@@ -546,14 +763,32 @@ def focus_metric(data, merit_function='vollath_F4', **kwargs):
     Returns:
         scalar: result of calling merit function on data
     """
-    if isinstance(merit_function, str):
-        try:
-            merit_function = globals()[merit_function]
-        except KeyError:
-            raise KeyError(
-                "Focus merit function '{}' not found in pocs.utils.images!".format(merit_function))
+    return _get_merit_function(merit_function)(data, **kwargs)
+
 
-    return merit_function(data, **kwargs)
+def focus_metric_batch(thumbnails, merit_function='vollath_F4', **kwargs):
+    """Compute the focus metric of a stack of thumbnails.
+
+    The merit functions of `FOCUS_METRICS` work on the whole stack at once,
+    other merit functions are called for each thumbnail.
+
+    Args:
+        thumbnails (numpy array) -- 3D array (or list of 2D arrays of the same
+            shape) of thumbnails.
+        merit_function (str/callable) -- Name of merit function (if in
+            pocs.utils.images) or a callable object.
+
+    Returns:
+        numpy array: the focus metric of each thumbnail
+    """
+    thumbnails = np.asarray(thumbnails)
+    assert thumbnails.ndim == 3, "thumbnails must be a 3D array"
+
+    if merit_function in FOCUS_METRICS:
+        return np.asarray(_get_merit_function(merit_function)(thumbnails, **kwargs))
+
+    merit_function = _get_merit_function(merit_function)
+    return np.array([merit_function(thumbnail, **kwargs) for thumbnail in thumbnails])
 
 
 def vollath_F4(data, axis=None):
@@ -561,30 +796,147 @@ def vollath_F4(data, axis=None):
 
     Computes the F_4 focus metric as defined by Vollath (1998) for the given 2D
     numpy array. The metric can be computed in the y axis, x axis, or the mean of
-    the two (default).
+    the two (default). Saturated pixels (see `mask_saturated`) are ignored.
+
+    Float data is summed in float64: F4 is the difference of two means of
+    products that are much larger than it, so float32 sums would lose it.
 
     Arguments:
-        data (numpy array) -- 2D array to calculate F4 on.
+        data (numpy array) -- 2D array to calculate F4 on, or a 3D stack of them.
         axis (str, optional, default None) -- Which axis to calculate F4 in. Can
             be 'Y'/'y', 'X'/'x' or None, which will the F4 value for both axes.
 
     Returns:
-        float64: Calculated F4 value for y, x axis or both
+        float64: Calculated F4 value for y, x axis or both (an array for a stack)
     """
-    data = mask_saturated(data)
+    if axis not in ('Y', 'y', 'X', 'x', None, ''):
+        raise ValueError(
+            "axis must be one of 'Y', 'y', 'X', 'x' or None, got {}!".format(axis))
+
+    data, valid = _get_focus_data(data, dtype=np.float64)
 
     if axis == 'Y' or axis == 'y':
-        return _vollath_F4_y(data)
+        return _vollath_F4_y(data, valid)
     elif axis == 'X' or axis == 'x':
-        return _vollath_F4_x(data)
-    elif not axis:
-        return (_vollath_F4_y(data) + _vollath_F4_x(data)) / 2
+        return _vollath_F4_x(data, valid)
     else:
+        return (_vollath_F4_y(data, valid) + _vollath_F4_x(data, valid)) / 2
+
+
+def brenner(data, axis=None):
+    """Compute the Brenner focus metric
+
+    The mean squared difference between pixels two apart, in the y axis, x axis
+    or the mean of the two (default). Saturated pixels are ignored.
+
+    Arguments:
+        data (numpy array) -- 2D array, or a 3D stack of them.
+        axis (str, optional, default None) -- 'Y'/'y', 'X'/'x' or None.
+
+    Returns:
+        float64: Brenner focus metric (an array for a stack)
+    """
+    if axis not in ('Y', 'y', 'X', 'x', None, ''):
         raise ValueError(
             "axis must be one of 'Y', 'y', 'X', 'x' or None, got {}!".format(axis))
 
+    data, valid = _get_focus_data(data)
+
+    def brenner_axis(image_axis):
+        a, b = _shifted_pair(data, 2, image_axis)
+        diff = a - b
+        if valid is not None:
+            valid_a, valid_b = _shifted_pair(valid, 2, image_axis)
+            diff[~(valid_a & valid_b)] = 0
+
+        count = _pair_count(valid, 2, image_axis, a.shape)
+        return _product_sum(diff, diff) / count
+
+    if axis == 'Y' or axis == 'y':
+        return brenner_axis(-2)
+    elif axis == 'X' or axis == 'x':
+        return brenner_axis(-1)
+    else:
+        return (brenner_axis(-2) + brenner_axis(-1)) / 2
+
+
+def laplacian_variance(data):
+    """Compute the variance of the Laplacian focus metric
+
+    The variance of the 4-neighbour Laplacian of the image, ignoring the pixels
+    next to saturated pixels.
+
+    Arguments:
+        data (numpy array) -- 2D array, or a 3D stack of them.
+
+    Returns:
+        float64: Variance of the Laplacian (an array for a stack)
+    """
+    data, valid = _get_focus_data(data)
+
+    centre = (Ellipsis, slice(1, -1), slice(1, -1))
+    neighbours = [(Ellipsis, slice(None, -2), slice(1, -1)),
+                  (Ellipsis, slice(2, None), slice(1, -1)),
+                  (Ellipsis, slice(1, -1), slice(None, -2)),
+                  (Ellipsis, slice(1, -1), slice(2, None))]
+
+    laplacian = 4 * data[centre]
+    for neighbour in neighbours:
+        laplacian -= data[neighbour]
+
+    if valid is None:
+        count = laplacian.shape[-2] * laplacian.shape[-1]
+    else:
+        lap_valid = valid[centre].copy()
+        for neighbour in neighbours:
+            lap_valid &= valid[neighbour]
+        laplacian[~lap_valid] = 0
+        count = np.count_nonzero(lap_valid, axis=(-2, -1))
+
+    mean = _sum(laplacian) / count
+    return _product_sum(laplacian, laplacian) / count - mean ** 2
+
+
+def half_flux_diameter(data):
+    """Compute the half flux diameter
+
+    The flux-weighted mean distance from the centroid, times two, of the
+    background subtracted image, which approximates the diameter containing
+    half of the flux of a star in the thumbnail. Unlike the other metrics this
+    is smallest at best focus.
+
+    Arguments:
+        data (numpy array) -- 2D array, or a 3D stack of them.
+
+    Returns:
+        float64: Half flux diameter in pixels (an array for a stack)
+    """
+    data = np.asarray(data)
+    data = data.astype(np.result_type(data.dtype, np.float32), copy=False)
+
+    flux = data - np.median(data, axis=(-2, -1), keepdims=True)
+    np.clip(flux, 0, None, out=flux)
+
+    total = flux.sum(axis=(-2, -1), keepdims=True)
+    total[total == 0] = np.nan
+
+    y, x = np.indices(data.shape[-2:])
+    y_centre = (flux * y).sum(axis=(-2, -1), keepdims=True) / total
+    x_centre = (flux * x).sum(axis=(-2, -1), keepdims=True) / total
+
+    radius = np.hypot(y - y_centre, x - x_centre)
+
+    return 2 * (flux * radius).sum(axis=(-2, -1)) / total[..., 0, 0]
+
 
 def mask_saturated(data, saturation_level=None, threshold=0.9, dtype=np.float64):
+    saturation_level = _get_saturation_level(data, saturation_level, threshold)
+
+    # Convert data to masked array of requested dtype, mask values above saturation level
+    return np.ma.array(data, mask=(data > saturation_level), dtype=dtype)
+
+
+def _get_saturation_level(data, saturation_level=None, threshold=0.9):
     if not saturation_level:
         try:
             # If data is an integer type use iinfo to compute machine limits
@@ -597,20 +949,101 @@ def mask_saturated(data, saturation_level=None, threshold=0.9, dtype=np.float64)
             # max value for the type
             saturation_level = threshold * dtype_info.max
 
-    # Convert data to masked array of requested dtype, mask values above saturation level
-    return np.ma.array(data, mask=(data > saturation_level), dtype=dtype)
+    return saturation_level
+
+
+def _get_merit_function(merit_function):
+    if isinstance(merit_function, str):
+        try:
+            merit_function = globals()[merit_function]
+        except KeyError:
+            raise KeyError(
+                "Focus merit function '{}' not found in pocs.utils.images!".format(merit_function))
+
+    return merit_function
+
+
+def _get_focus_data(data, dtype=np.float32):
+    """ Data for the focus metrics and the mask of the pixels that aren't saturated
 
+    Rather than a masked array, the saturated pixels are set to zero so that they
+    don't add to the sums, and the mask (None if no pixel is saturated) is used to
+    count the pixels. Integer data is converted to int64, so the sums are exact.
+    Float data is kept in its own type, or promoted to at least `dtype`, and only
+    copied if it is promoted or pixels are saturated.
+    """
+    data = np.asarray(data)
+    saturated = data > _get_saturation_level(data)
+
+    if np.issubdtype(data.dtype, np.integer):
+        data = data.astype(np.int64)
+    else:
+        data = data.astype(np.result_type(data.dtype, dtype), copy=saturated.any())
 
-def _vollath_F4_y(data):
-    A1 = (data[1:] * data[:-1]).mean()
-    A2 = (data[2:] * data[:-2]).mean()
-    return A1 - A2
+    if not saturated.any():
+        return data, None
 
+    data[saturated] = 0
+    return data, ~saturated
 
-def _vollath_F4_x(data):
-    A1 = (data[:, 1:] * data[:, :-1]).mean()
-    A2 = (data[:, 2:] * data[:, :-2]).mean()
-    return A1 - A2
+
+def _shifted_pair(data, shift, axis):
+    """ The pairs of pixels `shift` apart along `axis` (-2 for y, -1 for x) """
+    if axis == -2:
+        return data[..., shift:, :], data[..., :-shift, :]
+    else:
+        return data[..., :, shift:], data[..., :, :-shift]
+
+
+def _pair_count(valid, shift, axis, shape):
+    """ Number of pairs of pixels `shift` apart along `axis` that aren't saturated """
+    if valid is None:
+        return shape[-2] * shape[-1]
+
+    a, b = _shifted_pair(valid, shift, axis)
+    return np.count_nonzero(a & b, axis=(-2, -1))
+
+
+def _shifted_mean(data, valid, shift, axis):
+    """ Mean of the products of the pixels `shift` apart along `axis` """
+    a, b = _shifted_pair(data, shift, axis)
+    return _product_sum(a, b) / _pair_count(valid, shift, axis, a.shape)
+
+
+def _sum(data):
+    """ Sum of `data` over the last two axes
+
+    Float data is summed a row at a time in its own type, and the rows in
+    float64, which is as fast as a float32 sum and about as accurate as a
+    float64 one. Integer (int64) sums are exact.
+    """
+    if np.issubdtype(data.dtype, np.floating):
+        return data.sum(axis=-1).sum(axis=-1, dtype=np.float64)
+
+    return data.sum(axis=(-2, -1))
+
+
+def _product_sum(a, b):
+    """ Sum of the products of `a` and `b` over the last two axes, without temporaries
+
+    As for `_sum`, float products are summed by rows and the rows in float64.
+    """
+    if np.issubdtype(a.dtype, np.floating):
+        return np.einsum('...ij,...ij->...i', a, b).sum(axis=-1, dtype=np.float64)
+
+    return np.einsum('...ij,...ij->...', a, b)
+
+
+def _vollath_F4_y(data, valid=None):
+    return _shifted_mean(data, valid, 1, -2) - _shifted_mean(data, valid, 2, -2)
+
+
+def _vollath_F4_x(data, valid=None):
+    return _shifted_mean(data, valid, 1, -1) - _shifted_mean(data, valid, 2, -1)
+
+
+# Merit functions that can score a stack of thumbnails at once
+FOCUS_METRICS = ['vollath_F4', 'brenner', 'laplacian_variance', 'half_flux_diameter']
 
 #######################################################################
 # IO Functions
@@ -624,14 +1057,12 @@ def cr2_to_fits(
         headers={},
         fits_headers={},
         remove_cr2=False,
+        exif_info=None,
         **kwargs):  # pragma: no cover
     """ Convert a CR2 file to FITS
 
-    This is a convenience function that first converts the CR2 to PGM via `cr2_to_pgm`.
-    Also adds keyword headers to the FITS file.
-
-    Note:
-        The intermediate PGM file is automatically removed
+    The raw data is streamed from `dcraw` with `read_cr2_data`, without an
+    intermediate PGM file. Also adds keyword headers to the FITS file.
 
     Arguments:
         cr2_fname {str} -- Name of CR2 file to be converted
@@ -644,6 +1075,8 @@ def cr2_to_fits(
         headers {dict} -- Header data that is filtered and added to the FITS header.
         fits_headers {dict} -- Header data that is added to the FITS header without filtering.
         remove_cr2 {bool} -- A bool indicating if the CR2 should be removed (default: {False})
+        exif_info {dict} -- EXIF information of the CR2 if already read, e.g. in a
+            batch with `read_exif` (default: {None})
 
     """
 
@@ -656,43 +1089,43 @@ def cr2_to_fits(
 
     if not os.path.exists(fits_fname) or clobber:
         if verbose:
-            print("Converting CR2 to PGM: {}".format(cr2_fname))
+            print("Reading CR2 data: {}".format(cr2_fname))
 
-        # Convert the CR2 to a PGM file then delete PGM
-        pgm = read_pgm(cr2_to_pgm(cr2_fname), remove_after=True)
+        data = read_cr2_data(cr2_fname, dcraw=kwargs.get('dcraw', 'dcraw'))
 
         # Add the EXIF information from the CR2 file
-        exif = read_exif(cr2_fname)
+        if exif_info is None:
+            exif_info = read_exif(cr2_fname)
 
-        # Set the PGM as the primary data for the FITS file
-        hdu = fits.PrimaryHDU(pgm)
+        # Set the raw data as the primary data for the FITS file
+        hdu = fits.PrimaryHDU(data)
 
         obs_date = date_parser.parse(
-            exif.get('DateTimeOriginal', '').replace(':', '-', 2)).isoformat()
+            exif_info.get('DateTimeOriginal', '').replace(':', '-', 2)).isoformat()
 
         # Set some default headers
         hdu.header.set('FILTER', 'RGGB')
-        hdu.header.set('ISO', exif.get('ISO', ''))
-        hdu.header.set('EXPTIME', exif.get('ExposureTime', 'Seconds'))
-        hdu.header.set('CAMTEMP', exif.get(
+        hdu.header.set('ISO', exif_info.get('ISO', ''))
+        hdu.header.set('EXPTIME', exif_info.get('ExposureTime', 'Seconds'))
+        hdu.header.set('CAMTEMP', exif_info.get(
             'CameraTemperature', ''), 'Celsius - From CR2')
-        hdu.header.set('CIRCCONF', exif.get(
+        hdu.header.set('CIRCCONF', exif_info.get(
             'CircleOfConfusion', ''), 'From CR2')
-        hdu.header.set('COLORTMP', exif.get(
+        hdu.header.set('COLORTMP', exif_info.get(
             'ColorTempMeasured', ''), 'From CR2')
-        hdu.header.set('FILENAME', exif.get('FileName', ''), 'From CR2')
-        hdu.header.set('INTSN', exif.get(
+        hdu.header.set('FILENAME', exif_info.get('FileName', ''), 'From CR2')
+        hdu.header.set('INTSN', exif_info.get(
             'InternalSerialNumber', ''), 'From CR2')
-        hdu.header.set('CAMSN', exif.get('SerialNumber', ''), 'From CR2')
-        hdu.header.set('MEASEV', exif.get('MeasuredEV', ''), 'From CR2')
-        hdu.header.set('MEASEV2', exif.get('MeasuredEV2', ''), 'From CR2')
-        hdu.header.set('MEASRGGB', exif.get('MeasuredRGGB', ''), 'From CR2')
-        hdu.header.set('WHTLVLN', exif.get('NormalWhiteLevel', ''), 'From CR2')
-        hdu.header.set('WHTLVLS', exif.get(
+        hdu.header.set('CAMSN', exif_info.get('SerialNumber', ''), 'From CR2')
+        hdu.header.set('MEASEV', exif_info.get('MeasuredEV', ''), 'From CR2')
+        hdu.header.set('MEASEV2', exif_info.get('MeasuredEV2', ''), 'From CR2')
+        hdu.header.set('MEASRGGB', exif_info.get('MeasuredRGGB', ''), 'From CR2')
+        hdu.header.set('WHTLVLN', exif_info.get('NormalWhiteLevel', ''), 'From CR2')
+        hdu.header.set('WHTLVLS', exif_info.get(
             'SpecularWhiteLevel', ''), 'From CR2')
-        hdu.header.set('REDBAL', exif.get('RedBalance', ''), 'From CR2')
-        hdu.header.set('BLUEBAL', exif.get('BlueBalance', ''), 'From CR2')
-        hdu.header.set('WBRGGB', exif.get(
+        hdu.header.set('REDBAL', exif_info.get('RedBalance', ''), 'From CR2')
+        hdu.header.set('BLUEBAL', exif_info.get('BlueBalance', ''), 'From CR2')
+        hdu.header.set('WBRGGB', exif_info.get(
             'WB RGGBLevelAsShot', ''), 'From CR2')
         hdu.header.set('DATE-OBS', obs_date)
 
@@ -743,6 +1176,97 @@ def cr2_to_fits(
     return fits_fname
 
 
+def convert_cr2_dir(directory, max_workers=4, pattern='*.cr2', **kwargs):  # pragma: no cover
+    """ Convert all the CR2 files of a directory to FITS in parallel
+
+    Each file is converted with `cr2_to_fits`. The work is mostly done by the
+    `dcraw` processes and by writing the files, so threads are used. The EXIF
+    information of all the files is read first in one batch.
+
+    Args:
+        directory (str): Directory of the CR2 files
+        max_workers (int, optional): Number of files converted at once, defaults to 4
+        pattern (str, optional): Pattern of the files to convert, defaults to '*.cr2'
+        **kwargs: Options passed to `cr2_to_fits`, e.g. `remove_cr2`
+
+    Returns:
+        dict: The `converted` FITS files, the `failed` CR2 files (with their
+            errors) and the `seconds` taken
+    """
+    cr2_files = sorted(glob(os.path.join(directory, pattern)))
+
+    converted = list()
+    failed = dict()
+
+    t0 = time.perf_counter()
+    exif_infos = read_exif(cr2_files, exiftool=kwargs.pop('exiftool', 'exiftool'))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(cr2_to_fits, f, exif_info=exif_info, **kwargs): f
+                   for f, exif_info in zip(cr2_files, exif_infos)}
+
+        for future, cr2_fname in futures.items():
+            try:
+                converted.append(future.result())
+            except Exception as e:
+                failed[cr2_fname] = str(e)
+
+    return {
+        'converted': converted,
+        'failed': failed,
+        'seconds': time.perf_counter() - t0,
+    }
+
+
+def read_cr2_data(cr2_fname, dcraw='dcraw'):
+    """ Read the raw data of a CR2 file
+
+    The 16-bit PGM written by `dcraw -c` is read straight from its output into
+    the array, without a temporary file. The rows are read bottom up so that
+    the image has the FITS orientation, as with `read_pgm`, without a copy.
+
+    Arguments:
+        cr2_fname {str} -- Name of CR2 file to read
+
+    Keyword Arguments:
+        dcraw {str} -- Path to installed `dcraw` (default: {'dcraw'})
+
+    Returns:
+        numpy.array -- The raw (Bayer) data, as big endian unsigned 16-bit integers
+    """
+    assert os.path.exists(cr2_fname), "cr2 file does not exist at {}".format(cr2_fname)
+
+    cmd_list = [dcraw, '-c', '-t', '0', '-D', '-4', cr2_fname]
+
+    try:
+        proc = subprocess.Popen(cmd_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as err:
+        raise error.InvalidSystemCommand(msg="Can't run dcraw: {}".format(err))
+
+    try:
+        # The header is "P5\n<width> <height>\n<max value>\n"
+        img_type = proc.stdout.readline().strip()
+        width, height = [int(n) for n in proc.stdout.readline().split()]
+        proc.stdout.readline()
+
+        if img_type != b'P5':
+            raise error.InvalidSystemCommand(msg="Not a PGM from dcraw: {}".format(cr2_fname))
+
+        data = np.empty((height, width), dtype='>u2')
+        for row in range(height - 1, -1, -1):
+            if proc.stdout.readinto(data[row].view(np.uint8)) != 2 * width:
+                raise error.InvalidSystemCommand(msg="Short read from dcraw: {}".format(cr2_fname))
+    except ValueError as err:
+        raise error.InvalidSystemCommand(msg="File: {} \n err: {}".format(cr2_fname, err))
+    finally:
+        _, errs = proc.communicate()
+
+    if proc.returncode != 0:
+        raise error.InvalidSystemCommand(msg="File: {} \n err: {}".format(cr2_fname, errs))
+
+    return data
+
+
 def cr2_to_pgm(
         cr2_fname,
         pgm_fname=None,
@@ -810,36 +1334,28 @@ def cr2_to_pgm(
 def read_exif(fname, exiftool='exiftool'):  # pragma: no cover
     """ Read the EXIF information
 
-    Gets the EXIF information using exiftool
+    Gets the EXIF information using the `exiftool` session shared by the
+    process (see `pocs.utils.exif.get_exiftool`), so that `exiftool` is only
+    started once.
 
     Note:
         Assumes the `exiftool` is installed
 
     Args:
-        fname {str} -- Name of file (CR2) to read
+        fname {str or list} -- Name of file (CR2) to read, or a list of names
+            to read in one batch
 
     Keyword Args:
-        exiftool {str} -- Location of exiftool (default: {'/usr/bin/exiftool'})
+        exiftool {str} -- Location of exiftool (default: {'exiftool'})
 
     Returns:
-        dict -- Dictonary of EXIF information
+        dict -- Dictonary of EXIF information, or a list of them for a list of files
 
     """
-    assert os.path.exists(fname), warn("File does not exist: {}".format(fname))
-    exif = {}
+    for f in listify(fname):
+        assert os.path.exists(f), warn("File does not exist: {}".format(f))
 
-    try:
-        # Build the command for this file
-        command = '{} -j {}'.format(exiftool, fname)
-        cmd_list = command.split()
-
-        # Run the command
-        exif = loads(subprocess.check_output(cmd_list).decode('utf-8'))
-    except subprocess.CalledProcessError as err:
-        raise error.InvalidSystemCommand(
-            msg="File: {} \n err: {}".format(fname, err))
-
-    return exif[0]
+    return exif.get_exiftool(exiftool).get_metadata(fname)
 
 
 def read_pgm(fname, byteorder='>', remove_after=False):  # pragma: no cover
@@ -892,7 +1408,8 @@ def read_pgm(fname, byteorder='>', remove_after=False):  # pragma: no cover
 def create_timelapse(directory, fn_out=None, **kwargs):  # pragma: no cover
     """Create a timelapse
 
-    A timelapse is created from all the jpg images in a given `directory`
+    A timelapse is created from all the jpg images in a given `directory`. See
+    `pocs.utils.timelapse` to encode the images as they are taken instead.
 
     Args:
         directory (str): Directory containing jpg files
@@ -904,14 +1421,7 @@ def create_timelapse(directory, fn_out=None, **kwargs):  # pragma: no cover
         str: Name of output file
     """
     if fn_out is None:
-        head, tail = os.path.split(directory)
-        if tail is '':
-            head, tail = os.path.split(head)
-
-        field_name = head.split('/')[-2]
-        cam_name = head.split('/')[-1]
-        fn_out = '{}/images/timelapse/{}_{}_{}.mp4'.format(
-            os.getenv('PANDIR'), field_name, cam_name, tail)
+        fn_out = timelapse.get_timelapse_name(directory)
 
     try:
         ff = FFmpeg(
@@ -942,9 +1452,14 @@ def clean_observation_dir(dir_name, *args, **kwargs):
     For the given `dir_name`, will:
         * Compress FITS files
         * Remove `.solved` files
-        * Create timelapse from JPG files if present
+        * Finish the timelapse if the JPG files were encoded as they were taken,
+          otherwise create timelapse from JPG files if present
         * Remove JPG files
 
+    Note:
+        `pocs.utils.housekeeping.Housekeeper` runs these steps for many
+        directories in parallel and can resume them.
+
     Args:
         dir_name (str): Full path to observation directory
         *args: Description
@@ -958,34 +1473,83 @@ def clean_observation_dir(dir_name, *args, **kwargs):
     # Pack the fits filts
     try:
         print("Packing FITS files")
-        for f in glob('{}/*.fits'.format(dir_name)):
-            try:
-                fpack(f)
-            except Exception as e:
-                warn(
-                    'Could not compress fits file: {}'.format(e))
+        compress_observation_dir(dir_name)
     except Exception as e:
         warn(
-            'Problem with cleanup cleaning FITS:'.format(e))
+            'Problem with cleanup cleaning FITS: {}'.format(e))
 
     try:
         # Remove .solved files
         print('Removing .solved files')
-        for f in glob('{}/*.solved'.format(dir_name)):
-            try:
-                os.remove(f)
-            except OSError as e:
-                warn(
-                    'Could not delete file: {}'.format(e))
+        remove_solved_files(dir_name)
     except Exception as e:
         warn(
-            'Problem with cleanup removing solved:'.format(e))
+            'Problem with cleanup removing solved: {}'.format(e))
 
     try:
-        jpg_list = glob('{}/*.jpg'.format(dir_name))
+        finish_timelapse(dir_name)
+    except Exception as e:
+        warn(
+            'Problem with cleanup creating timelapse: {}'.format(e))
+
+
+def compress_observation_dir(dir_name, **kwargs):
+    """ Compress the FITS files of an observation directory
 
-        if len(jpg_list) > 0:
+    Args:
+        dir_name (str): Full path to observation directory
+        **kwargs: Options passed to `pocs.utils.compression.compress_dir`
 
+    Returns:
+        dict: The compression statistics
+
+    Raises:
+        error.PanError: If any of the files couldn't be compressed, once the
+            others are
+    """
+    stats = compression.compress_dir(dir_name, **kwargs)
+    for f, e in stats['failed'].items():
+        warn(
+            'Could not compress fits file {}: {}'.format(f, e))
+    print("Packed {} FITS files in {:.1f} s ({:.1f} MB/s, ratio {:.2f})".format(
+        len(stats['compressed']), stats['seconds'], stats['mb_per_second'], stats['ratio']))
+
+    if stats['failed']:
+        raise error.PanError("Could not compress {} FITS files of {}".format(
+            len(stats['failed']), dir_name))
+
+    return stats
+
+
+def remove_solved_files(dir_name):
+    """ Remove the `.solved` files of an observation directory """
+    for f in glob('{}/*.solved'.format(dir_name)):
+        try:
+            os.remove(f)
+        except OSError as e:
+            warn(
+                'Could not delete file: {}'.format(e))
+
+
+def finish_timelapse(dir_name):
+    """ Finish the timelapse of an observation directory and remove the JPG files
+
+    The timelapse being encoded as the images were taken is closed, if any,
+    otherwise one is created from the JPG files.
+
+    Returns:
+        str: Name of the timelapse, or None if there wasn't one
+    """
+    # Finish the timelapse being encoded, if any
+    video_file = timelapse.close_writer(dir_name)
+    if video_file is not None:
+        print('Timelapse finished: {}'.format(video_file))
+
+    jpg_list = glob('{}/*.jpg'.format(dir_name))
+
+    if len(jpg_list) > 0:
+
+        if video_file is None:
             # Create timelapse
             print(
                 'Creating timelapse for {}'.format(dir_name))
@@ -993,14 +1557,184 @@ def clean_observation_dir(dir_name, *args, **kwargs):
             print(
                 'Timelapse created: {}'.format(video_file))
 
-            # Remove jpgs
-            print('Removing jpgs')
-            for f in jpg_list:
-                try:
-                    os.remove(f)
-                except OSError as e:
-                    warn(
-                        'Could not delete file: {}'.format(e))
-    except Exception as e:
-        warn(
-            'Problem with cleanup creating timelapse:'.format(e))
+        # Remove jpgs
+        print('Removing jpgs')
+        for f in jpg_list:
+            try:
+                os.remove(f)
+            except OSError as e:
+                warn(
+                    'Could not delete file: {}'.format(e))
+
+    return video_file
+
+
+def make_master_frame(fnames, out_file, frame_type='dark', combine='median', sigma=3.,
+                      bias=None, dark=None, max_memory=512, max_workers=2):
+    """ Combine calibration frames into a master frame
+
+    The frames are not all read into memory: they are memory-mapped (or read
+    by tiles if compressed) and combined a block of rows at a time, with the
+    blocks sized so that the `max_workers` blocks being combined at once use
+    about `max_memory` MB. At each pixel, values more than `sigma` times the
+    median absolute deviation from the median are rejected before combining.
+
+    Flat frames are each divided by the median of a central box of at most
+    500 x 500 pixels (after the bias and dark are subtracted), which avoids
+    reading every frame twice and the vignetted corners, so the master flat is
+    normalized to one at the center.
+
+    The header of the master is the header of the first frame with the type
+    of master (`IMAGETYP`), the number of frames (`NCOMBINE`), the method
+    (`COMBINE`, `SIGCLIP`), the masters subtracted (`MASTBIAS`, `MASTDARK`),
+    the mean `EXPTIME` and `CCD-TEMP` and the time range (`DATE-BEG`,
+    `DATE-END`) of the frames, and a HISTORY line for each frame.
+
+    Args:
+        fnames (list): Names of the FITS files (can be .fz) of the frames
+        out_file (str): Name of the master file
+        frame_type (str, optional): One of `CALIBRATION_TYPES`, defaults to 'dark'
+        combine (str, optional): 'median' (default) or 'mean' of the values kept
+        sigma (float, optional): Clipping threshold, defaults to 3, None to
+            not clip
+        bias (str, optional): Master bias subtracted from each frame
+        dark (str, optional): Master dark (of the same exposure time, with the
+            bias subtracted) subtracted from each frame
+        max_memory (float, optional): Memory in MB used by the blocks, defaults
+            to 512
+        max_workers (int, optional): Number of blocks combined at once, defaults
+            to 2
+
+    Returns:
+        str: Name of the master file
+
+    Raises:
+        error.PanError: If the frames are not all the same shape, or a flat
+            has no signal left after calibration
+    """
+    assert frame_type in CALIBRATION_TYPES, \
+        "frame_type must be one of {}".format(CALIBRATION_TYPES)
+    assert combine in ('median', 'mean'), "combine must be 'median' or 'mean'"
+    assert len(fnames) > 0, "No frames to combine"
+
+    fnames = sorted(fnames)
+
+    frames = [fits_access.FitsFile(fname) for fname in fnames]
+    try:
+        shape = frames[0].shape
+        for frame in frames:
+            if frame.shape != shape:
+                raise error.PanError("{} is {}, not {}".format(frame.fname, frame.shape, shape))
+
+        calibration = np.zeros(shape, dtype=np.float32)
+        for master in (bias, dark):
+            if master is not None:
+                with fits_access.FitsFile(master) as master_file:
+                    calibration += master_file.data
+
+        scales = np.ones(len(frames), dtype=np.float32)
+        if frame_type == 'flat':
+            box_width = min(min(shape), 500)
+            calibration_crop = crop_data(calibration, box_width=box_width)
+            for i, frame in enumerate(frames):
+                scales[i] = np.median(frame.crop(box_width=box_width) - calibration_crop)
+                if not scales[i] > 0:
+                    raise error.PanError("{} has a median level of {} after calibration, "
+                                         "cannot normalize it".format(frame.fname, scales[i]))
+
+        # Each block needs the stack of frames and about twice that while combining
+        bytes_per_row = len(frames) * shape[1] * 4 * 3
+        block_rows = max(1, int(max_memory * 1e6 / (bytes_per_row * max_workers)))
+
+        master_data = np.empty(shape, dtype=np.float32)
+        locks = [threading.Lock() for _ in frames]
+
+        def combine_block(start):
+            rows = slice(start, min(start + block_rows, shape[0]))
+
+            stack = np.empty((len(frames), rows.stop - rows.start, shape[1]), dtype=np.float32)
+            for i, frame in enumerate(frames):
+                with locks[i]:
+                    stack[i] = frame.section[rows, :]
+
+            stack -= calibration[rows]
+            stack /= scales[:, None, None]
+
+            master_data[rows] = _combine_stack(stack, combine=combine, sigma=sigma)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(combine_block, start)
+                           for start in range(0, shape[0], block_rows)]:
+                future.result()
+
+        header = _get_master_header([frame.header for frame in frames], fnames,
+                                    frame_type=frame_type, combine=combine, sigma=sigma,
+                                    bias=bias, dark=dark)
+    finally:
+        for frame in frames:
+            frame.close()
+
+    os.makedirs(os.path.dirname(out_file) or '.', exist_ok=True)
+
+    tmp_file = out_file + '.tmp'
+    fits.PrimaryHDU(data=master_data, header=header).writeto(tmp_file, overwrite=True)
+    os.replace(tmp_file, out_file)
+
+    return out_file
+
+
+def _combine_stack(stack, combine='median', sigma=3.):
+    """ Sigma clipped median or mean along the first axis, overwrites `stack` """
+    center = np.median(stack, axis=0)
+
+    if not sigma:
+        return center if combine == 'median' else stack.mean(axis=0)
+
+    deviation = np.abs(stack - center)
+    mad = 1.4826 * np.median(deviation, axis=0)
+
+    # The median is always kept, nothing is clipped where the deviation is zero
+    stack[(deviation > sigma * mad) & (mad > 0)] = np.nan
+    del deviation
+
+    if combine == 'median':
+        return np.nanmedian(stack, axis=0)
+    else:
+        return np.nanmean(stack, axis=0)
+
+
+def _get_master_header(headers, fnames, frame_type='dark', combine='median', sigma=3.,
+                       bias=None, dark=None):
+    header = headers[0].copy()
+
+    # Structural and scaling keywords are set for the master's data
+    for keyword in ['XTENSION', 'PCOUNT', 'GCOUNT', 'EXTNAME', 'BZERO', 'BSCALE']:
+        header.remove(keyword, ignore_missing=True)
+    header.remove('HISTORY', ignore_missing=True, remove_all=True)
+
+    header.set('IMAGETYP', 'Master {}'.format(frame_type.title()))
+    header.set('NCOMBINE', len(fnames), 'Number of frames combined')
+    header.set('COMBINE', combine, 'Combination of the frames')
+    header.set('SIGCLIP', sigma or 0, 'Clipping threshold in sigma, 0 for none')
+    if bias is not None:
+        header.set('MASTBIAS', os.path.basename(bias), 'Master bias subtracted')
+    if dark is not None:
+        header.set('MASTDARK', os.path.basename(dark), 'Master dark subtracted')
+
+    for keyword, comment in [('EXPTIME', 'Mean of the frames, seconds'),
+                             ('CCD-TEMP', 'Mean of the frames, degrees C')]:
+        values = [h[keyword] for h in headers if isinstance(h.get(keyword), (int, float))]
+        if values:
+            header.set(keyword, float(np.mean(values)), comment)
+
+    dates = sorted(h['DATE-OBS'] for h in headers if h.get('DATE-OBS'))
+    if dates:
+        header.set('DATE-BEG', dates[0], 'Start of the first frame')
+        header.set('DATE-END', dates[-1], 'Start of the last frame')
+
+    header.set('DATE', current_time().isot, 'Time the master was made')
+
+    for fname in fnames:
+        header.add_history('Frame: {}'.format(os.path.basename(fname)))
+
+    return header
@@ -0,0 +1,203 @@
+""" Image quality metrics measured as the frames are taken
+
+`measure_quality` estimates the background, the number of stars, their median
+FWHM and ellipticity from an image with `pocs.utils.sources` (no SExtractor),
+so that bad focus or clouds show up while observing. `QualityService` measures
+the frames on a pool of worker threads, so that the cameras only queue their
+files and carry on:
+
+    from pocs.utils import quality
+    future = quality.get_service().submit('image.fits', box_width=1000)
+    print(future.result()['fwhm'])
+"""
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pocs.utils import fits_access
+from pocs.utils import sources
+
+# Converts the standard deviation of a gaussian to its FWHM
+SIGMA_TO_FWHM = 2 * np.sqrt(2 * np.log(2))
+
+_service = None
+_service_lock = threading.Lock()
+
+
+class QualityService(object):
+
+    def __init__(self, max_workers=2, logger=None):
+        """ A pool of workers measuring the quality of images
+
+        Args:
+            max_workers (int, optional): Number of images measured at once,
+                defaults to 2
+            logger (optional): Logger for the failed measurements
+        """
+        self.max_workers = max_workers
+        self.logger = logger
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def submit(self, fname, callback=None, **kwargs):
+        """ Queue a FITS file to be measured
+
+        Args:
+            fname (str): Name of the FITS file (can be .fz)
+            callback (callable, optional): Function applied by the worker to the
+                metrics, the future is given its return value
+            **kwargs: Options passed to `measure_file`
+
+        Returns:
+            concurrent.futures.Future: Future for the dict of the metrics
+        """
+        return self._executor.submit(self._measure, fname, callback, kwargs)
+
+    def shutdown(self, wait=True):
+        """ Stop the workers once the queued images have been measured """
+        self._executor.shutdown(wait=wait)
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _measure(self, fname, callback, kwargs):
+        try:
+            metrics = measure_file(fname, **kwargs)
+            if callback is not None:
+                metrics = callback(metrics)
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.warning("Problem measuring quality of {}: {}".format(fname, e))
+            raise
+
+        return metrics
+
+    def __str__(self):
+        return "Quality service ({} workers)".format(self.max_workers)
+
+
+def get_service(max_workers=2, logger=None):
+    """ The `QualityService` shared by the process, created on first use
+
+    The arguments are only used to create the service.
+    """
+    global _service
+
+    with _service_lock:
+        if _service is None:
+            _service = QualityService(max_workers=max_workers, logger=logger)
+
+        return _service
+
+
+def measure_file(fname, box_width=None, **kwargs):
+    """ Measure the quality of a FITS file
+
+    Args:
+        fname (str): Name of the FITS file (can be .fz)
+        box_width (int, optional): Only measure a box of this width at the
+            center of the image, reading only its pixels, defaults to the full
+            frame
+        **kwargs: Options passed to `measure_quality`
+
+    Returns:
+        dict: The metrics of `measure_quality`, with the `file_path`, the
+            `box_width` used and the `seconds` taken
+    """
+    t0 = time.perf_counter()
+
+    with fits_access.FitsFile(fname) as fits_file:
+        if box_width is not None and min(fits_file.shape) > box_width:
+            data = fits_file.crop(box_width=box_width)
+        else:
+            box_width = None
+            data = fits_file.data
+
+        metrics = measure_quality(data, **kwargs)
+
+    metrics['file_path'] = fname
+    metrics['box_width'] = box_width
+    metrics['seconds'] = time.perf_counter() - t0
+
+    return metrics
+
+
+def measure_quality(data, threshold=5., bin_factor=2, mesh_size=64, max_stars=500,
+                    saturation=None):
+    """ Measure the background and stars of an image
+
+    The stars are found and measured with `pocs.utils.sources.detect_sources`
+    on the binned image. The FWHM is measured from the area above half the
+    peak of each of the `max_stars` brightest stars and the ellipticity from
+    their second moments.
+
+    Args:
+        data (numpy.array): The image data
+        threshold (float, optional): Detection threshold in units of the
+            background noise, defaults to 5
+        bin_factor (int, optional): Sum blocks of this size first, the default
+            of 2 removes the Bayer pattern of colour cameras
+        mesh_size (int, optional): Size of the boxes of the background mesh in
+            binned pixels, defaults to 64
+        max_stars (int, optional): Number of stars measured, defaults to 500
+        saturation (float, optional): Stars with an unbinned pixel at this
+            level or above are not measured, defaults to no limit
+
+    Returns:
+        dict: The `background` level and noise (`background_std`) per pixel,
+            the number of stars (`num_stars`) and their median `fwhm` (in
+            unbinned pixels) and `ellipticity` (1 - b/a), which are None if
+            no stars were found
+    """
+    data = np.asarray(data, dtype=np.float32)
+
+    # The level applies to the unbinned pixels, so flag the binned pixels that
+    # contain a saturated one
+    if saturation is not None and bin_factor != 1:
+        saturation = _bin(data >= saturation, bin_factor) > 0
+
+    data = _bin(data, bin_factor)
+
+    background, rms = sources.estimate_background(data, mesh_size=mesh_size)
+
+    stars = sources.detect_sources(data, threshold=threshold, saturation=saturation,
+                                   background=background, rms=rms)
+
+    metrics = {
+        'background': float(np.median(background)) / bin_factor ** 2,
+        'background_std': float(np.median(rms)) / bin_factor,
+        'num_stars': len(stars),
+        'fwhm': None,
+        'ellipticity': None,
+    }
+
+    stars = stars[~stars['saturated']][:max_stars]
+    stars = stars[stars['a'] > 0]
+
+    if len(stars) == 0:
+        return metrics
+
+    metrics['fwhm'] = float(np.median(stars['fwhm'])) * bin_factor
+    metrics['ellipticity'] = float(np.median(stars['ellipticity']))
+
+    return metrics
+
+
+def _bin(data, bin_factor):
+    """ Sum blocks of `bin_factor` x `bin_factor` pixels, trimming the edges """
+    if bin_factor == 1:
+        return data
+
+    rows = data.shape[0] // bin_factor * bin_factor
+    columns = data.shape[1] // bin_factor * bin_factor
+
+    return data[:rows, :columns].reshape(rows // bin_factor, bin_factor,
+                                         columns // bin_factor, bin_factor).sum(axis=(1, 3))
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from astropy.io import fits
+
+# Options of `solve_field` that don't change the solution
+IGNORED_OPTIONS = ['cache', 'clobber', 'on_start', 'parity', 'remove_extras', 'replace',
+                   'scale_high', 'scale_low', 'skip_solved', 'timeout', 'verbose']
+
+_caches = dict()
+_caches_lock = threading.Lock()
+
+
+class SolveCache(object):
+
+    def __init__(self, filename, max_entries=10000, max_age=30 * 86400):
+        """ Persistent cache of plate-solve results
+
+        Solutions are stored in an SQLite file, keyed by a hash of the image
+        data (not the header, which the solver rewrites) together with the
+        options given to the solver. For each solution the WCS keywords of the
+        solved header are kept along with some metadata (file name, time taken
+        and when it was solved), so that `~pocs.utils.images.get_solve_field`
+        can apply a previous solution to a frame in milliseconds.
+
+        Eviction: entries older than `max_age` are dropped and, beyond
+        `max_entries`, the least recently used entries are dropped. This is done
+        by `prune`, which is called every time a solution is stored. Entries can
+        also be removed explicitly with `invalidate` or `clear`.
+
+        Args:
+            filename (str): SQLite file for the cache, created if needed
+            max_entries (int, optional): Maximum number of solutions to keep,
+                defaults to 10000
+            max_age (float, optional): Seconds after which a solution is
+                dropped, defaults to 30 days
+        """
+        self.filename = filename
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS solutions (
+                            key TEXT PRIMARY KEY,
+                            data_hash TEXT,
+                            header TEXT,
+                            metadata TEXT,
+                            created REAL,
+                            accessed REAL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS solutions_hash ON solutions (data_hash)")
+        self._db.commit()
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def get(self, fname, data_hash=None, **options):
+        """ The cached solution for a file
+
+        Args:
+            fname (str): FITS file
+            data_hash (str, optional): Hash of the image data from `get_data_hash`,
+                if already known
+            **options: Options given to the solver
+
+        Returns:
+            tuple or None: The WCS `astropy.io.fits.Header` and the metadata dict,
+                or None if there is no (recent enough) solution
+        """
+        if data_hash is None:
+            data_hash = self.get_data_hash(fname)
+        if data_hash is None:
+            return None
+
+        key = self._get_key(data_hash, options)
+        now = time.time()
+
+        with self._lock:
+            row = self._db.execute("SELECT header, metadata, created FROM solutions WHERE key = ?",
+                                   (key,)).fetchone()
+
+            if row is None:
+                return None
+
+            if self.max_age is not None and now - row[2] > self.max_age:
+                self._db.execute("DELETE FROM solutions WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+
+            self._db.execute("UPDATE solutions SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+
+        return fits.Header.fromstring(row[0]), json.loads(row[1])
+
+    def put(self, fname, header, metadata=None, data_hash=None, **options):
+        """ Store the solution of a file
+
+        Args:
+            fname (str): The FITS file that was solved, as it was before solving
+                (only the image data is used)
+            header (astropy.io.fits.Header): Solved header, only the WCS
+                keywords are kept
+            metadata (dict, optional): Extra information about the solve
+            data_hash (str, optional): Hash of the image data from `get_data_hash`,
+                if the file has changed since (e.g. been replaced by the solved file)
+            **options: Options given to the solver
+        """
+        if data_hash is None:
+            data_hash = self.get_data_hash(fname)
+
+        if data_hash is None:
+            return
+
+        metadata = dict(metadata or {})
+        metadata.setdefault('fname', fname)
+
+        wcs_header = _get_wcs_header(header)
+        now = time.time()
+
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?)",
+                             (self._get_key(data_hash, options), data_hash,
+                              wcs_header.tostring(), json.dumps(metadata, default=str), now, now))
+            self._db.commit()
+
+        self.prune()
+
+    def invalidate(self, fname):
+        """ Remove all the solutions of a file, whatever the options """
+        data_hash = self.get_data_hash(fname)
+        if data_hash is None:
+            return
+
+        with self._lock:
+            self._db.execute("DELETE FROM solutions WHERE data_hash = ?", (data_hash,))
+            self._db.commit()
+
+    def prune(self):
+        """ Drop solutions older than `max_age` and all but the `max_entries` most recently used """
+        with self._lock:
+            if self.max_age is not None:
+                self._db.execute("DELETE FROM solutions WHERE created < ?",
+                                 (time.time() - self.max_age,))
+
+            if self.max_entries is not None:
+                self._db.execute("""DELETE FROM solutions WHERE key NOT IN (
+                                    SELECT key FROM solutions ORDER BY accessed DESC LIMIT ?)""",
+                                 (self.max_entries,))
+            self._db.commit()
+
+    def clear(self):
+        """ Remove all solutions """
+        with self._lock:
+            self._db.execute("DELETE FROM solutions")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def get_data_hash(fname):
+        """ SHA1 of the image data of a FITS file, or None if it can't be read """
+        try:
+            with fits.open(fname) as hdu_list:
+                for hdu in hdu_list:
+                    if hdu.data is not None:
+                        return hashlib.sha1(hdu.data.tobytes()).hexdigest()
+        except (OSError, ValueError):
+            pass
+
+        return None
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _get_key(self, data_hash, options):
+        options = {k: v for k, v in options.items() if k not in IGNORED_OPTIONS}
+        options = json.dumps(options, sort_keys=True, default=str)
+
+        return hashlib.sha1('{}:{}'.format(data_hash, options).encode()).hexdigest()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+    def __str__(self):
+        return "Solve cache {} ({} solutions)".format(self.filename, len(self))
+
+
+def get_cache(filename=None, **kwargs):
+    """ The `SolveCache` of a file shared by the process, opened on first use
+
+    Args:
+        filename (str, optional): SQLite file for the cache, defaults to
+            `$PANDIR/data/solve_cache.sqlite`
+        **kwargs: Options of `SolveCache`, only used to open the cache
+    """
+    if filename is None:
+        filename = os.path.join(os.getenv('PANDIR', '/var/panoptes'), 'data', 'solve_cache.sqlite')
+
+    with _caches_lock:
+        if filename not in _caches:
+            _caches[filename] = SolveCache(filename, **kwargs)
+
+        return _caches[filename]
+
+
+def _get_wcs_header(header):
+    """ The WCS keywords of a solved header """
+    wcs_header = fits.Header()
+
+    for card in header.cards:
+        keyword = card.keyword
+        if keyword in ['WCSAXES', 'EQUINOX', 'LONPOLE', 'LATPOLE', 'RADESYS', 'RADECSYS',
+                       'IMAGEW', 'IMAGEH', 'A_ORDER', 'B_ORDER', 'AP_ORDER', 'BP_ORDER'] or \
+                keyword.startswith(('CTYPE', 'CUNIT', 'CRVAL', 'CRPIX', 'CD1_', 'CD2_',
+                                    'CDELT', 'PC1_', 'PC2_', 'A_', 'B_', 'AP_', 'BP_')):
+            wcs_header.append(card)
+
+    return wcs_header
@@ -0,0 +1,293 @@
+import itertools
+import queue
+import threading
+
+from concurrent.futures import Future
+
+from pocs.utils import error
+from pocs.utils import fits_access
+from pocs.utils import images as img_utils
+
+# Job priorities, lower values are solved first
+PRIORITY_POINTING = 0
+PRIORITY_ANALYSIS = 1
+PRIORITY_BACKFILL = 2
+
+# Number of sequences whose last solution is kept for hints
+MAX_HINTED_SEQUENCES = 100
+
+# Hints dropped to retry a hinted solve that failed
+SEARCH_HINTS = ('radius', 'parity')
+
+
+class SolveService(object):
+
+    def __init__(self, max_workers=2, timeout=30, cache=None, hinted=True, pixel_scales=None,
+                 logger=None):
+        """ A bounded pool of plate-solve workers
+
+        Solves are submitted with `submit`, which returns a
+        `concurrent.futures.Future` straight away, so that the solves of the
+        frames of all cameras can run at the same time without blocking the
+        caller. At most `max_workers` `solve-field` processes run at once, the
+        other jobs wait in a queue ordered by priority (pointing, then analysis,
+        then backfill) and then by submission.
+
+        A job that is still waiting can be cancelled with `Future.cancel`, a
+        running job with `cancel`, which kills its solver process.
+
+        If a `cache` is given it is used by all the jobs that don't pass their
+        own, so that frames that were already solved are not solved again.
+
+        If `hinted`, the last solution of each sequence (the `SEQID` of the
+        header) is kept and the following frames of the sequence are solved
+        with its scale, parity and position, and frames of cameras with a known
+        pixel scale (`pixel_scales`, keyed by the `INSTRUME` of the header) with
+        that scale, see `~pocs.utils.images.get_solve_hints`. Options passed to
+        `submit` take precedence over the hints. The search radius is centred on
+        the position of the job, which can be further off than the radius (e.g.
+        after a slew), so a hinted solve that fails is retried without the
+        `SEARCH_HINTS`.
+
+        Args:
+            max_workers (int, optional): Maximum number of solver processes,
+                defaults to 2
+            timeout (int, optional): Default seconds allowed for each solve,
+                defaults to 30
+            cache (`~pocs.utils.solve_cache.SolveCache`, optional): Cache of the
+                solutions, defaults to no cache
+            hinted (bool, optional): Use the hints of earlier solutions, defaults
+                to True
+            pixel_scales (dict, optional): Pixel scale in arcsec/pixel of each
+                camera uid
+            logger (optional): Logger for the service
+        """
+        assert max_workers > 0, "Need at least one worker"
+
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = cache
+        self.hinted = hinted
+        self.pixel_scales = pixel_scales or dict()
+        self.logger = logger
+
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._running = dict()
+        self._killed = set()
+        self._hints = dict()
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+        self._workers = list()
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._work, name='SolveWorker{:02d}'.format(i),
+                                      daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def submit(self, fname, priority=PRIORITY_ANALYSIS, timeout=None, callback=None, **kwargs):
+        """ Queue a file to be solved
+
+        Args:
+            fname (str): Name of the file to solve
+            priority (int, optional): One of `PRIORITY_POINTING`, `PRIORITY_ANALYSIS`
+                (default) or `PRIORITY_BACKFILL`
+            timeout (int, optional): Seconds allowed for the solve once started,
+                defaults to the `timeout` of the service
+            callback (callable, optional): Function applied by the worker to the
+                result of `get_solve_field`, the future is given its return value
+            **kwargs: Options passed to `~pocs.utils.images.get_solve_field`, and
+                `pixel_scale` (arcsec/pixel) for a hint of the scale
+
+        Returns:
+            concurrent.futures.Future: Future for the dict returned by
+                `get_solve_field`. It raises `~pocs.utils.error.Timeout` if the
+                solve took too long and `~pocs.utils.error.SolveError` if the
+                field couldn't be solved or the solve was cancelled.
+        """
+        if self._shutdown:
+            raise error.PanError("Solve service has been shut down")
+
+        kwargs['timeout'] = timeout or kwargs.get('timeout', self.timeout)
+        if self.cache is not None:
+            kwargs.setdefault('cache', self.cache)
+
+        future = Future()
+        self._queue.put((priority, next(self._counter), (future, fname, callback, kwargs)))
+
+        return future
+
+    def cancel(self, future):
+        """ Cancel a job, killing its solver process if it is running
+
+        Returns:
+            bool: True if the job was cancelled or its solver was killed
+        """
+        if future.cancel():
+            return True
+
+        with self._lock:
+            proc = self._running.get(future)
+
+        if proc is not None and proc.poll() is None:
+            with self._lock:
+                self._killed.add(future)
+            proc.kill()
+            return True
+
+        return False
+
+    def shutdown(self, wait=True):
+        """ Stop the workers, cancelling the jobs that haven't started
+
+        Args:
+            wait (bool, optional): Wait for the running jobs to finish, defaults
+                to True
+        """
+        self._shutdown = True
+
+        while True:
+            try:
+                _, _, (future, _, _, _) = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            future.cancel()
+
+        for _ in self._workers:
+            self._queue.put((float('inf'), next(self._counter), None))
+
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+            if self.cache is not None:
+                self.cache.close()
+
+    def get_hints(self, seq_id):
+        """ The hints from the last solution of a sequence, if any """
+        with self._lock:
+            return dict(self._hints.get(seq_id, {}))
+
+    @property
+    def num_queued(self):
+        """ Number of jobs waiting for a worker """
+        return self._queue.qsize()
+
+    @property
+    def num_running(self):
+        """ Number of jobs being solved """
+        with self._lock:
+            return len(self._running)
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                break
+
+            future, fname, callback, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            def on_start(proc):
+                with self._lock:
+                    self._running[future] = proc
+
+            try:
+                result = self._solve(future, fname, kwargs, on_start)
+
+                if self.hinted:
+                    self._save_hints(result['solved_fits_file'])
+
+                if callback is not None:
+                    result = callback(result)
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.debug("Problem solving {}: {}".format(fname, e))
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self._lock:
+                    self._running.pop(future, None)
+                    self._killed.discard(future)
+
+    def _solve(self, future, fname, kwargs, on_start):
+        """ Solve a file with the hints, and without the search hints if that fails """
+        if not self.hinted:
+            kwargs.pop('pixel_scale', None)
+            return img_utils.get_solve_field(fname, on_start=on_start, **kwargs)
+
+        options = self._add_hints(fname, kwargs)
+
+        try:
+            return img_utils.get_solve_field(fname, on_start=on_start, **options)
+        except error.SolveError:
+            retry_options = {key: value for key, value in options.items()
+                             if key not in SEARCH_HINTS or key in kwargs}
+
+            with self._lock:
+                killed = future in self._killed
+
+            if killed or retry_options == options:
+                raise
+
+            if self.logger is not None:
+                self.logger.debug("Hinted solve of {} failed, retrying without {}".format(
+                    fname, ', '.join(key for key in SEARCH_HINTS if key not in retry_options)))
+
+        return img_utils.get_solve_field(fname, on_start=on_start, **retry_options)
+
+    def _add_hints(self, fname, kwargs):
+        """ The options of a job with the hints for its sequence and camera """
+        pixel_scale = kwargs.pop('pixel_scale', None)
+
+        try:
+            header = fits_access.read_header(fname)
+        except Exception:
+            return kwargs
+
+        with self._lock:
+            hints = dict(self._hints.get(header.get('SEQID'), {}))
+
+        if 'scale_low' not in hints:
+            pixel_scale = pixel_scale or self.pixel_scales.get(header.get('INSTRUME'))
+            hints.update(img_utils.get_solve_hints(pixel_scale=pixel_scale))
+
+        if hints and self.logger is not None:
+            self.logger.debug("Solve hints for {}: {}".format(fname, hints))
+
+        hints.update(kwargs)
+
+        return hints
+
+    def _save_hints(self, solved_fits_file):
+        """ Keep the hints of a solution for the next frames of its sequence """
+        try:
+            header = fits_access.read_header(solved_fits_file)
+            seq_id = header.get('SEQID')
+            hints = img_utils.get_solve_hints(header=header)
+        except Exception:
+            return
+
+        if seq_id is None or 'parity' not in hints:
+            return
+
+        with self._lock:
+            self._hints.pop(seq_id, None)
+            self._hints[seq_id] = hints
+
+            while len(self._hints) > MAX_HINTED_SEQUENCES:
+                self._hints.pop(next(iter(self._hints)))
+
+    def __str__(self):
+        return "Solve service: {} running, {} queued".format(self.num_running, self.num_queued)
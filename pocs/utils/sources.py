@@ -0,0 +1,263 @@
+""" Detection and measurement of the stars of an image
+
+`detect_sources` finds the sources of an image without SExtractor: the
+background and its noise are estimated on a mesh of boxes and interpolated, the
+pixels above the threshold are labelled as connected components, and the
+flux-weighted centroid, second moments, FWHM and ellipticity of all the
+components are computed at once with `numpy.bincount`. The result is a
+structured array (one row per source, see `SOURCE_DTYPE`) for registration,
+FWHM, focus and guiding, e.g.:
+
+    from pocs.utils import sources
+    stars = sources.detect_sources(fits.getdata('image.fits'))
+    print(len(stars), np.median(stars['fwhm']))
+
+A full 16-bit SBIG frame is measured in a fraction of a second, see
+`scripts/benchmark_sources.py`.
+"""
+import numpy as np
+
+from scipy import ndimage
+
+# Standard deviation of a gaussian from its interquartile range and its median
+# absolute deviation
+IQR_TO_SIGMA = 1.349
+MAD_TO_SIGMA = 1.4826
+
+SOURCE_DTYPE = [
+    ('x', 'f8'),            # Centroid, pixels from the first column
+    ('y', 'f8'),            # Centroid, pixels from the first row
+    ('flux', 'f8'),         # Isophotal flux above the background
+    ('peak', 'f8'),         # Highest pixel above the background
+    ('npix', 'i8'),         # Number of pixels above the threshold
+    ('x2', 'f8'),           # Second moments, pixels^2
+    ('y2', 'f8'),
+    ('xy', 'f8'),
+    ('a', 'f8'),            # Standard deviation along the major axis, pixels
+    ('b', 'f8'),            # Standard deviation along the minor axis, pixels
+    ('theta', 'f8'),        # Angle of the major axis from the x axis, radians
+    ('fwhm', 'f8'),         # From the area above half the peak, pixels
+    ('ellipticity', 'f8'),  # 1 - b/a
+    ('saturated', '?'),     # A pixel is at or above the saturation level
+]
+
+
+def detect_sources(data, threshold=5., min_pixels=5, mesh_size=64, saturation=None,
+                   background=None, rms=None, max_sources=None):
+    """ Find and measure the sources of an image
+
+    Args:
+        data (numpy.array): The image data
+        threshold (float, optional): Detection threshold in units of the
+            background noise, defaults to 5
+        min_pixels (int, optional): Minimum number of connected pixels above
+            the threshold, which rejects hot pixels and cosmic rays, defaults to 5
+        mesh_size (int, optional): Size of the boxes of the background mesh,
+            defaults to 64
+        saturation (float or numpy.array, optional): Sources with a pixel at
+            this level, or set in this boolean mask of the saturated pixels,
+            are flagged as `saturated`, defaults to none
+        background (numpy.array, optional): Background of the image, estimated
+            with `estimate_background` if not given
+        rms (numpy.array, optional): Noise of the background, as for `background`
+        max_sources (int, optional): Only return the brightest sources
+
+    Returns:
+        numpy.array: Structured array of the sources (see `SOURCE_DTYPE`),
+            brightest first
+    """
+    if background is None or rms is None:
+        background, rms = estimate_background(data, mesh_size=mesh_size)
+
+    residual = np.asarray(data, dtype=np.float32) - background
+
+    labels, num_labels = ndimage.label(residual > threshold * rms,
+                                       structure=np.ones((3, 3), dtype=bool))
+
+    if num_labels == 0:
+        return np.zeros(0, dtype=SOURCE_DTYPE)
+
+    ys, xs = np.nonzero(labels)
+    label = labels[ys, xs] - 1
+    weights = residual[ys, xs].astype(np.float64)
+
+    npix = np.bincount(label, minlength=num_labels)
+    flux = np.bincount(label, weights, minlength=num_labels)
+
+    # Moments relative to a pixel of each source, for precision
+    x_ref = np.zeros(num_labels)
+    y_ref = np.zeros(num_labels)
+    x_ref[label] = xs
+    y_ref[label] = ys
+    dx = xs - x_ref[label]
+    dy = ys - y_ref[label]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.bincount(label, weights * dx, minlength=num_labels) / flux
+        y_mean = np.bincount(label, weights * dy, minlength=num_labels) / flux
+        x2 = np.bincount(label, weights * dx ** 2, minlength=num_labels) / flux - x_mean ** 2
+        y2 = np.bincount(label, weights * dy ** 2, minlength=num_labels) / flux - y_mean ** 2
+        xy = np.bincount(label, weights * dx * dy, minlength=num_labels) / flux - \
+            x_mean * y_mean
+
+    # Every label has at least a pixel, so the pixels grouped by label start at
+    # the cumulative counts
+    order = np.argsort(label, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(npix)[:-1]])
+    peak = np.maximum.reduceat(weights[order], starts)
+
+    # FWHM from the area of the pixels above half the peak
+    half_area = np.bincount(label[weights > peak[label] / 2], minlength=num_labels)
+
+    sources = np.zeros(num_labels, dtype=SOURCE_DTYPE)
+    sources['x'] = x_ref + x_mean
+    sources['y'] = y_ref + y_mean
+    sources['flux'] = flux
+    sources['peak'] = peak
+    sources['npix'] = npix
+    sources['x2'] = x2
+    sources['y2'] = y2
+    sources['xy'] = xy
+    sources['fwhm'] = 2 * np.sqrt(half_area / np.pi)
+
+    mean = (x2 + y2) / 2
+    diff = np.sqrt(((x2 - y2) / 2) ** 2 + xy ** 2)
+    sources['a'] = np.sqrt(np.clip(mean + diff, 0, None))
+    sources['b'] = np.sqrt(np.clip(mean - diff, 0, None))
+    sources['theta'] = 0.5 * np.arctan2(2 * xy, x2 - y2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sources['ellipticity'] = 1 - sources['b'] / sources['a']
+
+    if saturation is not None:
+        if np.ndim(saturation) == 0:
+            is_saturated = np.asarray(data)[ys, xs] >= saturation
+        else:
+            is_saturated = np.asarray(saturation, dtype=bool)[ys, xs]
+        sources['saturated'] = np.bincount(label, is_saturated, minlength=num_labels) > 0
+
+    sources = sources[(npix >= min_pixels) & (flux > 0)]
+    sources = sources[np.argsort(sources['flux'])[::-1]]
+
+    if max_sources is not None:
+        sources = sources[:max_sources]
+
+    return sources
+
+
+def estimate_background(data, mesh_size=64, sigma=3., num_iterations=3, step=2,
+                        filter_size=3):
+    """ Background level and noise of an image, estimated on a mesh
+
+    The image is divided in boxes of `mesh_size` pixels, the sigma clipped
+    median and noise of each box are median filtered over the neighbouring
+    boxes, which removes the boxes affected by bright stars, and interpolated
+    bilinearly over the image. The noise is measured from the differences
+    between neighbouring (sampled) pixels, so that a gradient of the
+    background across a box doesn't add to it.
+
+    Args:
+        data (numpy.array): The image data
+        mesh_size (int, optional): Size of the boxes, defaults to 64
+        sigma (float, optional): Clipping threshold, defaults to 3
+        num_iterations (int, optional): Number of clipping iterations,
+            defaults to 3
+        step (int, optional): Only use every `step` rows and columns of each
+            box, defaults to 2
+        filter_size (int, optional): Size of the median filter of the mesh,
+            defaults to 3
+
+    Returns:
+        tuple(numpy.array): The background and its noise, of the same shape
+            as `data`
+    """
+    assert mesh_size % step == 0, "mesh_size must be a multiple of step"
+
+    rows, columns = data.shape
+    mesh_rows = -(-rows // mesh_size)
+    mesh_columns = -(-columns // mesh_size)
+
+    padded = np.full((mesh_rows * mesh_size, mesh_columns * mesh_size), np.nan,
+                     dtype=np.float32)
+    padded[:rows, :columns] = data
+
+    size = mesh_size // step
+    boxes = padded[::step, ::step].reshape(mesh_rows, size, mesh_columns, size)
+    boxes = boxes.transpose(0, 2, 1, 3).reshape(mesh_rows, mesh_columns, size * size)
+
+    # The difference of two pixels has sqrt(2) times their noise
+    differences = np.diff(boxes.reshape(mesh_rows, mesh_columns, size, size), axis=3)
+    differences = differences.reshape(mesh_rows, mesh_columns, -1)
+
+    # The clipped statistics are read off the sorted pixels of each box (NaNs
+    # last), which avoids the slow per-box loop of `numpy.nanmedian`
+    pixels = np.sort(boxes, axis=2)
+    low = np.zeros((mesh_rows, mesh_columns), dtype=int)
+    high = np.count_nonzero(~np.isnan(pixels), axis=2)
+    lower = np.full((mesh_rows, mesh_columns, 1), -np.inf)
+    upper = np.full((mesh_rows, mesh_columns, 1), np.inf)
+
+    with np.errstate(invalid='ignore'):
+        for _ in range(num_iterations):
+            median = _sorted_quantile(pixels, low, high, 0.5)
+            std = (_sorted_quantile(pixels, low, high, 0.75) -
+                   _sorted_quantile(pixels, low, high, 0.25)) / IQR_TO_SIGMA
+            lower = (median - sigma * std)[:, :, None]
+            upper = (median + sigma * std)[:, :, None]
+            low = np.count_nonzero(pixels < lower, axis=2)
+            high = np.count_nonzero(pixels <= upper, axis=2)
+
+        median = _sorted_quantile(pixels, low, high, 0.5)
+
+        # Only the differences of pixels that were kept by the clipping
+        kept = (boxes >= lower) & (boxes <= upper)
+        kept = kept.reshape(mesh_rows, mesh_columns, size, size)
+        kept = (kept[:, :, :, 1:] & kept[:, :, :, :-1]).reshape(mesh_rows, mesh_columns, -1)
+        differences = np.sort(np.where(kept, np.abs(differences), np.nan), axis=2)
+        num_kept = np.count_nonzero(kept, axis=2)
+        std = MAD_TO_SIGMA * _sorted_quantile(differences, 0, num_kept, 0.5) / np.sqrt(2)
+
+    meshes = list()
+    for mesh in (median, std):
+        mesh = np.where(np.isfinite(mesh), mesh, np.nanmedian(mesh))
+        if filter_size > 1:
+            mesh = ndimage.median_filter(mesh, size=filter_size, mode='nearest')
+        meshes.append(_interpolate_mesh(mesh, data.shape, mesh_size))
+
+    return meshes[0], meshes[1]
+
+
+def _sorted_quantile(values, low, high, quantile):
+    """ Quantile of `values[..., low:high]` along the last axis of sorted `values`
+
+    Returns NaN where `high <= low`.
+    """
+    low = np.broadcast_to(low, values.shape[:-1])
+    high = np.broadcast_to(high, values.shape[:-1])
+
+    position = low + quantile * (high - low - 1)
+    below = np.clip(np.floor(position).astype(int), 0, values.shape[-1] - 1)
+    above = np.clip(below + 1, 0, np.maximum(high - 1, 0))
+    fraction = position - below
+
+    value_below = np.take_along_axis(values, below[..., None], axis=-1)[..., 0]
+    value_above = np.take_along_axis(values, above[..., None], axis=-1)[..., 0]
+
+    return np.where(high > low, value_below + (value_above - value_below) * fraction, np.nan)
+
+
+def _interpolate_mesh(mesh, shape, mesh_size):
+    """ Bilinear interpolation of a mesh, whose values are at the box centres """
+    def weights(num_pixels, num_boxes):
+        position = np.clip((np.arange(num_pixels) + 0.5) / mesh_size - 0.5, 0, num_boxes - 1)
+        low = np.floor(position).astype(int)
+        high = np.minimum(low + 1, num_boxes - 1)
+        return low, high, (position - low).astype(np.float32)
+
+    y_low, y_high, y_weight = weights(shape[0], mesh.shape[0])
+    x_low, x_high, x_weight = weights(shape[1], mesh.shape[1])
+
+    mesh = mesh.astype(np.float32)
+    columns = mesh[:, x_low] * (1 - x_weight) + mesh[:, x_high] * x_weight
+
+    return columns[y_low] * (1 - y_weight[:, None]) + columns[y_high] * y_weight[:, None]
@@ -0,0 +1,249 @@
+""" Timelapses encoded while the frames are taken
+
+A `TimelapseWriter` keeps an `ffmpeg` process open and pipes each JPEG frame
+to it as soon as it is added, removing the frame once it has been encoded, so
+that neither the frames nor a long encode are left for the end of the night.
+The writers are shared by directory (one per observation directory or webcam
+day) with `get_writer` and finished with `close_writer`, after which the
+directory can't be given a new writer (which would overwrite the video):
+
+    from pocs.utils import timelapse
+    timelapse.get_writer(directory).add_frame(jpg_fname)
+    ...
+    video_file = timelapse.close_writer(directory)
+"""
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from warnings import warn
+
+# Number of closed directories remembered, see `close_writer`
+MAX_CLOSED_DIRECTORIES = 100
+
+_writers = dict()
+_writers_lock = threading.Lock()
+
+# Video (or None) of each directory whose writer has been closed, oldest first
+_closed = dict()
+
+
+class TimelapseWriter(object):
+
+    def __init__(self, fn_out, fps=3, size='hd1080', remove_frames=True, frame_timeout=60,
+                 ffmpeg='ffmpeg'):
+        """ Encode a timelapse one frame at a time
+
+        Frames are added with `add_frame` and encoded by a background thread,
+        which waits for each file to be completely written (the pretty images
+        are made by a separate process) before piping it to `ffmpeg`.
+
+        Args:
+            fn_out (str): Name of the video file
+            fps (int, optional): Frames per second, defaults to 3
+            size (str, optional): Size of the video, defaults to 'hd1080'
+            remove_frames (bool, optional): Remove each frame once it has been
+                encoded, defaults to True
+            frame_timeout (float, optional): Seconds to wait for a frame to be
+                written, defaults to 60
+            ffmpeg (str, optional): Path to `ffmpeg`, defaults to 'ffmpeg'
+        """
+        self.fn_out = fn_out
+        self.fps = fps
+        self.size = size
+        self.remove_frames = remove_frames
+        self.frame_timeout = frame_timeout
+        self.ffmpeg = ffmpeg
+
+        self.num_frames = 0
+
+        self._proc = None
+        self._frames = queue.Queue()
+        self._worker = None
+        self._closed = False
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def add_frame(self, fname):
+        """ Queue a JPEG file to be added to the timelapse """
+        assert not self._closed, "Timelapse has been closed: {}".format(self.fn_out)
+
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._encode_frames, daemon=True,
+                                            name='TimelapseWriter')
+            self._worker.start()
+
+        self._frames.put(fname)
+
+    def close(self, timeout=None):
+        """ Encode the remaining frames and finish the video
+
+        Returns:
+            str: Name of the video file, or None if there were no frames
+        """
+        if self._closed:
+            return self.fn_out if self.num_frames > 0 else None
+
+        self._closed = True
+
+        if self._worker is not None:
+            self._frames.put(None)
+            self._worker.join(timeout=timeout)
+
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            self._proc.wait()
+
+            if self._proc.returncode != 0:
+                warn("Problem creating timelapse: {}".format(self.fn_out))
+                return None
+
+        return self.fn_out if self.num_frames > 0 else None
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _start(self):
+        ffmpeg = shutil.which(self.ffmpeg)
+        assert ffmpeg is not None, "ffmpeg not found"
+
+        os.makedirs(os.path.dirname(self.fn_out) or '.', exist_ok=True)
+
+        cmd = [ffmpeg, '-y',
+               '-f', 'image2pipe', '-framerate', str(self.fps), '-c:v', 'mjpeg', '-i', '-',
+               '-s', self.size, '-vcodec', 'libx264', '-pix_fmt', 'yuv420p',
+               self.fn_out]
+
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def _encode_frames(self):
+        while True:
+            fname = self._frames.get()
+            if fname is None:
+                break
+
+            try:
+                self._encode_frame(fname)
+            except Exception as e:
+                warn("Can't add frame {} to timelapse: {}".format(fname, e))
+
+    def _encode_frame(self, fname):
+        if not _wait_for_file(fname, self.frame_timeout):
+            raise OSError("Frame was not written")
+
+        with open(fname, 'rb') as f:
+            frame = f.read()
+
+        if self._proc is None:
+            self._start()
+
+        self._proc.stdin.write(frame)
+        self._proc.stdin.flush()
+        self.num_frames += 1
+
+        if self.remove_frames:
+            os.remove(fname)
+
+    def __str__(self):
+        return "Timelapse {} ({} frames)".format(self.fn_out, self.num_frames)
+
+
+def get_writer(directory, fn_out=None, **kwargs):
+    """ The `TimelapseWriter` for a directory, created on first use
+
+    Args:
+        directory (str): Directory of the frames
+        fn_out (str, optional): Name of the video, defaults to the name used by
+            `~pocs.utils.images.create_timelapse` for the directory
+        **kwargs: Options for a new `TimelapseWriter`
+
+    Raises:
+        AssertionError: If the writer of the directory has been closed, so
+            that late frames don't start a new video over the finished one
+    """
+    directory = os.path.normpath(directory)
+
+    with _writers_lock:
+        assert directory not in _closed, "Timelapse has been closed: {}".format(directory)
+
+        if directory not in _writers:
+            if fn_out is None:
+                fn_out = get_timelapse_name(directory)
+            _writers[directory] = TimelapseWriter(fn_out, **kwargs)
+
+        return _writers[directory]
+
+
+def close_writer(directory, timeout=None):
+    """ Finish the timelapse of a directory
+
+    The last `MAX_CLOSED_DIRECTORIES` directories are remembered as closed,
+    see `get_writer`.
+
+    Returns:
+        str: Name of the video file, or None if there was no writer or no frames
+    """
+    directory = os.path.normpath(directory)
+
+    with _writers_lock:
+        writer = _writers.pop(directory, None)
+        if writer is None:
+            return _closed.get(directory)
+        _closed[directory] = None
+        while len(_closed) > MAX_CLOSED_DIRECTORIES:
+            _closed.pop(next(iter(_closed)))
+
+    video_file = writer.close(timeout=timeout)
+
+    with _writers_lock:
+        _closed[directory] = video_file
+
+    return video_file
+
+
+def has_writer(directory):
+    """ Whether frames of the directory are being encoded """
+    with _writers_lock:
+        return os.path.normpath(directory) in _writers
+
+
+def get_timelapse_name(directory):
+    """ Name of the timelapse of an observation directory
+
+    For `.../<field>/<camera>/<sequence time>/` this is
+    `$PANDIR/images/timelapse/<field>_<camera>_<sequence time>.mp4`.
+    """
+    head, tail = os.path.split(os.path.normpath(directory))
+
+    field_name = head.split('/')[-2]
+    cam_name = head.split('/')[-1]
+
+    return '{}/images/timelapse/{}_{}_{}.mp4'.format(os.getenv('PANDIR'), field_name,
+                                                     cam_name, tail)
+
+
+def _wait_for_file(fname, timeout):
+    """ Wait for a file to exist and stop growing """
+    end_time = time.monotonic() + timeout
+    last_size = -1
+
+    while time.monotonic() < end_time:
+        if os.path.exists(fname):
+            size = os.path.getsize(fname)
+            if size > 0 and size == last_size:
+                return True
+            last_size = size
+
+        time.sleep(0.5)
+
+    return False
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+""" Benchmark the construction of `Field` and `Observation` objects
+
+Compares the time and memory per object of the default construction, where
+every object sets up its own `PanBase` (including a new database client), with
+the lean path that shares the context of an existing object and optionally
+creates the `SkyCoord` of the field lazily, e.g.:
+
+    $ python scripts/benchmark_fields.py --num 1000
+"""
+import json
+import time
+import tracemalloc
+
+from pocs import PanBase
+from pocs.scheduler.field import Field
+from pocs.scheduler.observation import Observation
+
+
+def make_positions(num):
+    return ['{:02d}h{:02d}m00s {:+03d}d00m00s'.format(i % 24, i % 60, (i % 170) - 85)
+            for i in range(num)]
+
+
+def construct(positions, context=None, lazy=False):
+    """ Create an `Observation` for each of `positions`
+
+    Returns:
+        dict: Seconds and bytes of memory per object
+    """
+    tracemalloc.start()
+    t0 = time.perf_counter()
+
+    observations = list()
+    for i, position in enumerate(positions):
+        field = Field('Field {}'.format(i), position, context=context, lazy=lazy)
+        observations.append(Observation(field, context=context))
+
+    seconds = time.perf_counter() - t0
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return {
+        'seconds_per_object': seconds / len(positions),
+        'bytes_per_object': memory / len(positions),
+    }
+
+
+def main(num=1000, output=None):
+    positions = make_positions(num)
+    context = PanBase()
+
+    results = {
+        'num': num,
+        'default': construct(positions),
+        'context': construct(positions, context=context),
+        'context_lazy': construct(positions, context=context, lazy=True),
+    }
+
+    for name in ['default', 'context', 'context_lazy']:
+        print("{:>12s}: {:8.3f} ms {:10.0f} bytes per object".format(
+            name, results[name]['seconds_per_object'] * 1e3, results[name]['bytes_per_object']))
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark Field and Observation construction.")
+
+    parser.add_argument('--num', type=int, default=1000,
+                        help="Number of objects, defaults to 1000.")
+    parser.add_argument('-o', '--output', type=str, default=None, help="JSON file for the results.")
+
+    args = parser.parse_args()
+
+    main(**vars(args))
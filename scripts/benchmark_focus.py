@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+""" Benchmark the focus metrics
+
+Times the Vollath F4 metric of `pocs.utils.images` against the previous masked
+array implementation, the other metrics, and the batch evaluation of a stack of
+thumbnails against scoring them one by one, e.g.:
+
+    $ python scripts/benchmark_focus.py --size 500 --num 20
+"""
+import json
+import time
+
+import numpy as np
+
+from pocs.utils import images
+
+
+def masked_vollath_F4(data):
+    """ The masked array implementation that `vollath_F4` replaced """
+    data = images.mask_saturated(data)
+
+    def f4(a1, a2, b1, b2):
+        return (a1 * a2).mean() - (b1 * b2).mean()
+
+    return (f4(data[1:], data[:-1], data[2:], data[:-2]) +
+            f4(data[:, 1:], data[:, :-1], data[:, 2:], data[:, :-2])) / 2
+
+
+def make_thumbnails(num, size, seed=0):
+    """ Stack of thumbnails of a star with increasing blur and a few saturated pixels """
+    rng = np.random.RandomState(seed)
+    y, x = np.indices((size, size))
+
+    thumbnails = np.empty((num, size, size), dtype=np.uint16)
+    for i, sigma in enumerate(np.linspace(1, 10, num)):
+        star = 30000 * np.exp(-((x - size / 2) ** 2 + (y - size / 2) ** 2) / (2 * sigma ** 2))
+        thumbnails[i] = np.clip(rng.normal(1000, 30, (size, size)) + star, 0, 65535)
+        thumbnails[i, 0, :5] = 65535
+
+    return thumbnails
+
+
+def time_function(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - t0)
+
+    return best
+
+
+def main(size=500, num=20, output=None):
+    thumbnails = make_thumbnails(num, size)
+    thumbnail = thumbnails[0]
+
+    results = {
+        'size': size,
+        'num': num,
+        'masked_vollath_F4': time_function(lambda: masked_vollath_F4(thumbnail)),
+    }
+
+    for name in images.FOCUS_METRICS:
+        results[name] = time_function(lambda: images.focus_metric(thumbnail, name))
+        results[name + '_loop'] = time_function(
+            lambda: [images.focus_metric(t, name) for t in thumbnails])
+        results[name + '_batch'] = time_function(
+            lambda: images.focus_metric_batch(thumbnails, name))
+
+    assert np.isclose(masked_vollath_F4(thumbnail), images.vollath_F4(thumbnail))
+
+    print("{:>20s}: {:8.3f} ms".format('masked_vollath_F4', results['masked_vollath_F4'] * 1e3))
+    for name in images.FOCUS_METRICS:
+        print("{:>20s}: {:8.3f} ms, {} thumbnails: {:8.3f} ms looped, {:8.3f} ms batched".format(
+            name, results[name] * 1e3, num,
+            results[name + '_loop'] * 1e3, results[name + '_batch'] * 1e3))
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the focus metrics.")
+
+    parser.add_argument('--size', type=int, default=500, help="Thumbnail size, defaults to 500.")
+    parser.add_argument('--num', type=int, default=20,
+                        help="Number of thumbnails in the stack, defaults to 20.")
+    parser.add_argument('-o', '--output', type=str, default=None, help="JSON file for the results.")
+
+    args = parser.parse_args()
+
+    main(**vars(args))
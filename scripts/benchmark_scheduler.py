@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+""" Benchmark the scheduler over synthetic field catalogs
+
+For each catalog size a random catalog of fields spread uniformly over the sky
+is written to a fields file and a scheduler is created with the standard
+`Altitude`, `Duration` and `MoonAvoidance` constraints. The time taken to create
+the scheduler, to read the fields file and to call `get_observation(show_all=True)`
+at regular steps through a night (simulated with `POCSTIME`) is recorded and
+written as JSON, e.g.:
+
+    $ python scripts/benchmark_scheduler.py --sizes 10 100 1000 -o benchmark.json
+"""
+import json
+import os
+import tempfile
+import time
+import yaml
+
+import numpy as np
+
+from astroplan import Observer
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from astropy.time import Time
+
+from pocs.scheduler.constraint import Altitude
+from pocs.scheduler.constraint import Duration
+from pocs.scheduler.constraint import MoonAvoidance
+from pocs.utils import load_module
+from pocs.utils.config import load_config
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+
+
+def make_catalog(num_fields, seed=None):
+    """ Field configurations for `num_fields` random positions on the sky
+
+    Args:
+        num_fields (int): Number of fields
+        seed (int, optional): Seed for the random positions
+
+    Returns:
+        list: Field configuration items as found in a fields file
+    """
+    rng = np.random.RandomState(seed)
+
+    ra = rng.uniform(0, 360, num_fields)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, num_fields)))
+    priority = rng.randint(1, 101, num_fields)
+
+    return [{
+        'name': 'Field {:06d}'.format(i),
+        'position': '{:.5f}d {:+.5f}d'.format(ra[i], dec[i]),
+        'priority': int(priority[i]),
+    } for i in range(num_fields)]
+
+
+def get_observer(config):
+    loc = config['location']
+    location = EarthLocation(lon=loc['longitude'], lat=loc['latitude'], height=loc['elevation'])
+    return Observer(location=location, name=loc['name'], timezone=loc['timezone'])
+
+
+def benchmark(num_fields, observer, night, num_steps, scheduler_type='dispatch', seed=None):
+    """ Time the scheduler for one catalog size
+
+    Args:
+        num_fields (int): Number of fields in the catalog
+        observer (`astroplan.Observer`): Location of the observatory
+        night (astropy.time.Time): Time in the night to simulate, the steps
+            cover the night containing (or following) this time
+        num_steps (int): Number of `get_observation` calls through the night
+        scheduler_type (str, optional): Module in `pocs.scheduler`, defaults to
+            'dispatch'
+        seed (int, optional): Seed for the catalog
+
+    Returns:
+        dict: Timings in seconds
+    """
+    module = load_module('pocs.scheduler.{}'.format(scheduler_type))
+    constraints = [Altitude(30 * u.deg), MoonAvoidance(), Duration(30 * u.deg)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fields_file = os.path.join(tmp_dir, 'fields.yaml')
+        with open(fields_file, 'w') as f:
+            f.write(yaml.dump(make_catalog(num_fields, seed=seed)))
+
+        t0 = time.perf_counter()
+        scheduler = module.Scheduler(observer, constraints=constraints)
+        construction = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        scheduler.fields_file = fields_file
+        read_field_list = time.perf_counter() - t0
+
+    start_of_night, end_of_night = scheduler.almanac.tonight(night)
+    fractions = np.linspace(0, 1, num_steps + 2)[1:-1]
+    steps = start_of_night + (end_of_night - start_of_night) * fractions
+
+    get_observation = list()
+    num_valid = list()
+    for step in steps:
+        os.environ['POCSTIME'] = step.isot
+
+        t0 = time.perf_counter()
+        best = scheduler.get_observation(show_all=True)
+        get_observation.append(time.perf_counter() - t0)
+
+        num_valid.append(len(best))
+
+    del os.environ['POCSTIME']
+
+    return {
+        'num_fields': num_fields,
+        'scheduler': scheduler_type,
+        'construction': construction,
+        'read_field_list': read_field_list,
+        'get_observation': {
+            'times': [step.isot for step in steps],
+            'seconds': get_observation,
+            'num_valid': num_valid,
+            'first': get_observation[0] if len(get_observation) > 0 else None,
+            'median': float(np.median(get_observation)) if len(get_observation) > 0 else None,
+            'max': max(get_observation) if len(get_observation) > 0 else None,
+        },
+    }
+
+
+def main(sizes=None, night='2016-08-13 10:00:00', steps=10, scheduler='dispatch',
+         seed=42, output=None, verbose=False):
+    config = load_config(ignore_local=True, simulator=['all'])
+    observer = get_observer(config)
+
+    results = {
+        'night': night,
+        'location': config['location']['name'],
+        'benchmarks': list(),
+    }
+
+    for num_fields in sizes or DEFAULT_SIZES:
+        result = benchmark(num_fields, observer, Time(night), steps,
+                           scheduler_type=scheduler, seed=seed)
+        results['benchmarks'].append(result)
+
+        if verbose:
+            print("{:>7d} fields: construction {:.3f}s  read_field_list {:.3f}s  "
+                  "get_observation first {:.3f}s median {:.3f}s".format(
+                      num_fields, result['construction'], result['read_field_list'],
+                      result['get_observation']['first'], result['get_observation']['median']))
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the scheduler over synthetic catalogs.")
+
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Numbers of fields in the catalogs, defaults to 10 to 100000.")
+    parser.add_argument('--night', type=str, default='2016-08-13 10:00:00',
+                        help="A time in the night to simulate, defaults to '2016-08-13 10:00:00'.")
+    parser.add_argument('--steps', type=int, default=10,
+                        help="Number of get_observation calls through the night, defaults to 10.")
+    parser.add_argument('--scheduler', type=str, default='dispatch',
+                        help="Scheduler type, i.e. module in pocs.scheduler, "
+                        "defaults to 'dispatch'.")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for the catalogs.")
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help="JSON file for the results, printed if not given.")
+    parser.add_argument('-v', '--verbose', action='store_true', default=False,
+                        help="Print a summary for each catalog size.")
+
+    args = parser.parse_args()
+
+    main(**vars(args))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+""" Benchmark the detection of sources
+
+Times `pocs.utils.sources.detect_sources` (background, detection and
+measurement) on the FITS files of `pocs/tests/data` and on synthetic 16-bit
+frames of the size read out by `sbigudrv` (an SBIG STF-8300 by default), e.g.:
+
+    $ python scripts/benchmark_sources.py --width 3326 --height 2504 --num-stars 2000
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from astropy.io import fits
+
+from pocs.utils import sources
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'pocs', 'tests', 'data')
+
+
+def make_frame(width, height, num_stars, seed=0):
+    """ A uint16 frame with a sloped background, noise and gaussian stars """
+    rng = np.random.RandomState(seed)
+    y, x = np.indices((height, width))
+
+    data = rng.normal(1000, 15, (height, width)) + 100 * x / width + 50 * y / height
+
+    size = 15
+    offsets = np.arange(-size, size + 1)
+    for x0, y0, flux in zip(rng.uniform(size, width - size - 1, num_stars),
+                            rng.uniform(size, height - size - 1, num_stars),
+                            rng.lognormal(10, 1, num_stars)):
+        ys = int(y0) + offsets[:, None]
+        xs = int(x0) + offsets[None, :]
+        data[ys, xs] += flux / (2 * np.pi * 2.5 ** 2) * np.exp(
+            -((xs - x0) ** 2 + (ys - y0) ** 2) / (2 * 2.5 ** 2))
+
+    return np.clip(data, 0, 65535).astype(np.uint16)
+
+
+def time_function(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - t0)
+
+    return best, result
+
+
+def main(width=3326, height=2504, num_stars=2000, output=None):
+    frames = dict()
+    for fname in ['solved.fits', 'unsolved.fits']:
+        frames[fname] = fits.getdata(os.path.join(DATA_DIR, fname))
+    frames['synthetic {}x{}'.format(width, height)] = make_frame(width, height, num_stars)
+
+    results = dict()
+    for name, data in frames.items():
+        background_seconds, (background, rms) = time_function(
+            lambda: sources.estimate_background(data))
+        seconds, stars = time_function(
+            lambda: sources.detect_sources(data, saturation=65535))
+
+        results[name] = {
+            'shape': list(data.shape),
+            'background_seconds': background_seconds,
+            'seconds': seconds,
+            'num_sources': len(stars),
+            'median_fwhm': float(np.median(stars['fwhm'])) if len(stars) else None,
+        }
+
+        print("{:>24s}: {:5d}x{:<5d} {:8.1f} ms ({:6.1f} ms background), {:5d} sources".format(
+            name, data.shape[1], data.shape[0], seconds * 1e3, background_seconds * 1e3,
+            len(stars)))
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the detection of sources.")
+
+    parser.add_argument('--width', type=int, default=3326,
+                        help="Width of the synthetic frame, defaults to 3326.")
+    parser.add_argument('--height', type=int, default=2504,
+                        help="Height of the synthetic frame, defaults to 2504.")
+    parser.add_argument('--num-stars', type=int, default=2000, dest='num_stars',
+                        help="Number of stars of the synthetic frame, defaults to 2000.")
+    parser.add_argument('-o', '--output', type=str, default=None, help="JSON file for the results.")
+
+    args = parser.parse_args()
+
+    main(**vars(args))
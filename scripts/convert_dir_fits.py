@@ -1,32 +1,29 @@
 #!/usr/bin/env python
 
 import argparse
-import glob
 
-from astropy.utils import console
-
-from panoptes.utils import images
+from pocs.utils import images
 
 
 parser = argparse.ArgumentParser(description='Convert Canon .cr2 file(s) to a FITS')
 parser.add_argument('--directory', help="Convert all .cr2 files in directory.")
+parser.add_argument('--num-workers', type=int, default=4, help="Files converted at once.")
+parser.add_argument('--remove-cr2', action='store_true', default=False,
+                    help="Remove the CR2 files once converted.")
 parser.add_argument('-v', '--verbose', action='store_true', default=False, help='Verbose mode')
 
-
-def out(msg):
-    if args.verbose:
-        console.color_print(msg)
-
-
 args = parser.parse_args()
 
 if args.directory:
-    out("Converting all files in {}".format(args.directory))
-    cr2_files = glob.glob("{}/*.cr2".format(args.directory))
+    if args.verbose:
+        print("Converting all files in {}".format(args.directory))
 
-    with console.ProgressBarOrSpinner(len(cr2_files), "CR2 to FITS") as bar:
-        for num, cr2 in enumerate(cr2_files):
+    results = images.convert_cr2_dir(args.directory,
+                                     max_workers=args.num_workers,
+                                     remove_cr2=args.remove_cr2,
+                                     verbose=args.verbose)
 
-            images.get_solve_field(cr2)
+    for cr2_fname, err in results['failed'].items():
+        print("Could not convert {}: {}".format(cr2_fname, err))
 
-            bar.update(num)
+    print("Converted {} files in {:.1f} s".format(len(results['converted']), results['seconds']))
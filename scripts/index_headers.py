@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Update the header index of the image archive and query it
+
+Only the headers of the files that are new or changed since the last update
+are read, e.g.:
+
+    $ python scripts/index_headers.py --field Wasp33 --start 2018-01-01T12:00:00 \\
+        --end 2018-01-02T12:00:00
+"""
+import time
+
+from pocs.utils.header_index import HeaderIndex
+
+
+def main(index=None, root=None, no_update=False, field=None, camera=None, seqid=None,
+         imagetyp=None, start=None, end=None, limit=None, verbose=False):
+    with HeaderIndex(index, root=root) as header_index:
+        if not no_update:
+            stats = header_index.update()
+            print("Indexed {} new and {} changed files, removed {}, {} unchanged "
+                  "({} failed) in {:.1f} s".format(stats['added'], stats['updated'],
+                                                   stats['removed'], stats['unchanged'],
+                                                   len(stats['failed']), stats['seconds']))
+            if verbose:
+                for fname, e in stats['failed'].items():
+                    print("Can't read {}: {}".format(fname, e))
+
+        t0 = time.perf_counter()
+        frames = header_index.query(field=field, camera=camera, seqid=seqid, imagetyp=imagetyp,
+                                    start=start, end=end, limit=limit)
+        seconds = time.perf_counter() - t0
+
+        for frame in frames:
+            print("{}\t{}\t{}\t{}".format(frame['date_obs'], frame['imagetyp'], frame['exptime'],
+                                          frame['path']))
+
+        print("{} files in {:.1f} ms".format(len(frames), seconds * 1e3))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Update and query the FITS header index.")
+
+    parser.add_argument('--index', type=str, default=None,
+                        help="Index file, defaults to $PANDIR/data/header_index.sqlite.")
+    parser.add_argument('--root', type=str, default=None,
+                        help="Image archive, defaults to $PANDIR/images/fields.")
+    parser.add_argument('--no-update', action='store_true', default=False,
+                        help="Query the index without updating it first.")
+    parser.add_argument('--field', type=str, default=None, help="Field name.")
+    parser.add_argument('--camera', type=str, default=None, help="Camera uid.")
+    parser.add_argument('--seqid', type=str, default=None, help="Sequence id (SEQID).")
+    parser.add_argument('--imagetyp', type=str, default=None,
+                        help="Image type (IMAGETYP), e.g. 'Light Frame'.")
+    parser.add_argument('--start', type=str, default=None, help="Earliest DATE-OBS.")
+    parser.add_argument('--end', type=str, default=None, help="Latest DATE-OBS.")
+    parser.add_argument('--limit', type=int, default=None, help="Maximum number of files.")
+    parser.add_argument('-v', '--verbose', action='store_true', default=False)
+
+    args = parser.parse_args()
+
+    main(**vars(args))
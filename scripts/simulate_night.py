@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+""" Run POCS with the simulators through a night on an accelerated virtual clock
+
+All hardware is simulated except for the night, so POCS waits for darkness and
+parks at the end of the night according to the virtual time, which runs
+`speedup` times faster than real time (see `pocs.utils.clock`). At the end the
+numbers of observations, exposures and state transitions are reported along
+with the real time taken, e.g.:
+
+    $ python scripts/simulate_night.py --start '2016-08-13 05:00:00' --speedup 200
+"""
+import json
+import threading
+import time
+
+from astropy import units as u
+
+from pocs import POCS
+from pocs.observatory import Observatory
+from pocs.utils import clock
+from pocs.utils import current_time
+
+
+def main(start='2016-08-13 05:00:00', hours=14., speedup=120., output=None):
+    virtual_clock = clock.set_virtual_clock(start, speedup=speedup)
+    end_time = virtual_clock.start_time + hours * u.hour
+
+    observatory = Observatory(simulator=['camera', 'dome', 'mount', 'weather'])
+    pocs = POCS(observatory, messaging=False)
+
+    transitions = list()
+
+    def record_state(event_data):
+        transitions.append((current_time().isot, event_data.state.name))
+
+    for state in pocs.states.values():
+        state.add_callback('enter', record_state)
+
+    def stop_at_end():
+        while current_time() < end_time:
+            time.sleep(1)
+        pocs.stop_states()
+
+    t0 = time.perf_counter()
+
+    pocs.initialize()
+    threading.Thread(target=stop_at_end, daemon=True).start()
+    pocs.run()
+
+    real_seconds = time.perf_counter() - t0
+    pocs.power_down()
+
+    observations = list(observatory.scheduler.observed_list.values())
+    results = {
+        'start': start,
+        'end': current_time().isot,
+        'speedup': speedup,
+        'real_seconds': real_seconds,
+        'num_transitions': len(transitions),
+        'num_observations': len(observations),
+        'num_exposures': sum(len(obs.exposure_list) for obs in observations),
+        'transitions': transitions,
+    }
+
+    clock.clear_virtual_clock()
+
+    print("{} transitions, {} observations and {} exposures in {:.0f} s".format(
+        results['num_transitions'], results['num_observations'],
+        results['num_exposures'], real_seconds))
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate a night with an accelerated clock.")
+
+    parser.add_argument('--start', type=str, default='2016-08-13 05:00:00',
+                        help="Virtual start time (UTC), defaults to '2016-08-13 05:00:00'.")
+    parser.add_argument('--hours', type=float, default=14.,
+                        help="Virtual hours to run for, defaults to 14.")
+    parser.add_argument('--speedup', type=float, default=120.,
+                        help="Virtual seconds per real second, defaults to 120.")
+    parser.add_argument('-o', '--output', type=str, default=None, help="JSON file for the results.")
+
+    args = parser.parse_args()
+
+    main(**vars(args))
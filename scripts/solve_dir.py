@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+""" Plate-solve all the FITS files in a directory, using the solve cache
+
+Files whose image data was solved before with the same options are not solved
+again, the cached WCS is written to them instead, e.g.:
+
+    $ python scripts/solve_dir.py /var/panoptes/images/fields/Wasp33/ \\
+        --cache /var/panoptes/data/solve_cache.sqlite
+"""
+import glob
+import os
+import time
+
+from pocs.utils import solver
+from pocs.utils.solve_cache import SolveCache
+
+
+def main(directory, cache=None, num_workers=2, timeout=60, verbose=False):
+    if cache is None:
+        cache = os.path.join(os.getenv('PANDIR', '/var/panoptes'), 'data', 'solve_cache.sqlite')
+
+    solve_cache = SolveCache(cache)
+    service = solver.SolveService(max_workers=num_workers, timeout=timeout, cache=solve_cache)
+
+    fits_files = sorted(glob.glob(os.path.join(directory, '**', '*.fits'), recursive=True))
+
+    t0 = time.perf_counter()
+    futures = {fname: service.submit(fname, priority=solver.PRIORITY_BACKFILL)
+               for fname in fits_files}
+
+    num_failed = 0
+    for fname, future in futures.items():
+        try:
+            future.result()
+        except Exception as e:
+            num_failed += 1
+            if verbose:
+                print("Can't solve {}: {}".format(fname, e))
+        else:
+            if verbose:
+                print("Solved {}".format(fname))
+
+    service.shutdown()
+
+    print("Solved {} of {} files in {:.1f} s".format(len(fits_files) - num_failed,
+                                                     len(fits_files),
+                                                     time.perf_counter() - t0))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Plate-solve a directory of FITS files.")
+
+    parser.add_argument('directory', type=str, help="Directory to solve, searched recursively.")
+    parser.add_argument('--cache', type=str, default=None,
+                        help="Solve cache file, defaults to $PANDIR/data/solve_cache.sqlite.")
+    parser.add_argument('--num-workers', type=int, default=2,
+                        help="Number of solver processes, defaults to 2.")
+    parser.add_argument('--timeout', type=int, default=60,
+                        help="Seconds allowed for each solve, defaults to 60.")
+    parser.add_argument('-v', '--verbose', action='store_true', default=False)
+
+    args = parser.parse_args()
+
+    main(**vars(args))
@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import os
 import subprocess
 
 from astropy.time import Time
@@ -7,19 +8,26 @@ from astropy.utils import console
 from pprint import pprint
 
 from pocs.utils.database import PanMongo
+from pocs.utils.header_index import HeaderIndex
 from pocs.utils import current_time
 
 
-def main(date, auto_confirm=False):
-    db = PanMongo()
+def main(date, auto_confirm=False, index=None):
+    if index is not None:
+        with HeaderIndex(index, root='/var/panoptes/images/fields/') as header_index:
+            header_index.update()
+            dirs = set(os.path.dirname(os.path.relpath(frame['path'], header_index.root))
+                       for frame in header_index.query(start=date))
+    else:
+        db = PanMongo()
 
-    seq_ids = db.observations.distinct(
-        'sequence_id', {'date': {'$gte': Time(date).datetime}})
-    imgs = [record['data']['file_path'] for record in db.observations.find(
-        {'sequence_id': {'$in': seq_ids}}, {'data.file_path': 1})]
+        seq_ids = db.observations.distinct(
+            'sequence_id', {'date': {'$gte': Time(date).datetime}})
+        imgs = [record['data']['file_path'] for record in db.observations.find(
+            {'sequence_id': {'$in': seq_ids}}, {'data.file_path': 1})]
 
-    dirs = set([img[0:img.rindex('/') - 1].replace('/var/panoptes/images/fields/', '')
-                for img in imgs])
+        dirs = set([img[0:img.rindex('/') - 1].replace('/var/panoptes/images/fields/', '')
+                    for img in imgs])
 
     if auto_confirm is False:
         print("Found the following dirs for {}:".format(date))
@@ -51,6 +59,8 @@ if __name__ == '__main__':
                         help='Export start date, e.g. 2016-01-01, defaults to yesterday')
     parser.add_argument('--auto-confirm', action='store_true', default=False,
                         help='Auto-confirm upload')
+    parser.add_argument('--index', default=None,
+                        help='Find the dirs with this header index file instead of the db')
 
     args = parser.parse_args()
     if args.date is None: